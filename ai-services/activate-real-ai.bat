@@ -26,7 +26,9 @@ pip install requests pillow numpy scikit-image
 echo.
 echo [2/3] Setting environment variables...
 set AI_MODE=real
+set INFERENCE_BACKEND=remote
 echo AI_MODE=real
+echo INFERENCE_BACKEND=remote
 
 echo.
 echo [3/3] Restarting AI services...
@@ -40,7 +42,7 @@ timeout /t 2 /nobreak >nul
 
 echo.
 echo Starting REAL AI services...
-start "MedSigLIP Real AI" cmd /k "set AI_MODE=real && python medsigclip_server.py"
+start "MedSigLIP Real AI" cmd /k "set AI_MODE=real && set INFERENCE_BACKEND=remote && python medsigclip_server.py"
 
 timeout /t 2 /nobreak >nul
 
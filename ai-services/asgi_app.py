@@ -0,0 +1,432 @@
+"""
+ASGI Server - asyncio serving mode for the unified AI service
+Remote/cloud calls share one pooled httpx.AsyncClient; decode, feature and model work runs in an executor
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5003
+or:
+    python asgi_app.py
+
+/health, /classify, /generate-report and /analyze are native async routes,
+so a request waiting on a remote API holds no thread. Every other route is
+served by the unified Flask app through a WSGI bridge.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import metrics
+import profiling_hook
+import structured_logging
+import unified_ai_service as unified
+import upstream
+from circuit_breaker import BreakerOpen
+from unified_ai_service import DecodedImage, medgemma, medsigclip
+from request_io import RequestError, image_from_json, merge_metadata_json, parse_metadata
+
+# Configuration
+PORT = int(os.getenv('PORT', 5003))
+MODE = os.getenv('AI_MODE', 'demo')  # 'real', 'cloud', or 'demo'
+CPU_WORKERS = int(os.getenv('ASGI_CPU_WORKERS', os.cpu_count() or 4))  # Decode/feature/model threads
+
+log = logging.getLogger('asgi')
+
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='ai-cpu')
+
+# Routes implemented natively here (the rest go to the Flask app)
+NATIVE_ROUTES = ('/health', '/classify', '/generate-report', '/analyze')
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSONResponse whose encoding is timed as the 'serialize' stage"""
+
+    def render(self, content):
+        with metrics.stage('serialize'):
+            return super().render(content)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run CPU-bound work on the executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context along so stage timings land on the right request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(CPU_EXECUTOR, context.run, partial(profiling_hook.call_profiled, fn, *args, **kwargs))
+
+
+async def call_remote_async(build, parse, fallback, breaker=None):
+    """Async counterpart of upstream.call_remote: only the HTTP wait happens on the event loop"""
+    permit = breaker.allow() if breaker is not None else None
+    if breaker is not None and not permit:
+        return await run_cpu(fallback, BreakerOpen(f"circuit '{breaker.name}' is open"))
+    try:
+        call = await run_cpu(build)
+    except Exception as e:
+        if breaker is not None:
+            breaker.release(permit)
+        return await run_cpu(fallback, e)
+
+    started = time.perf_counter()
+    try:
+        with metrics.stage('remote'):
+            response = await call.asend()
+    except Exception as e:
+        if breaker is not None:
+            breaker.record(True, upstream.elapsed_ms(started), permit)
+        return await run_cpu(fallback, e)
+    if breaker is not None:
+        breaker.record_response(response.status_code, upstream.elapsed_ms(started), permit)
+
+    try:
+        return await run_cpu(parse, response)
+    except Exception as e:
+        return await run_cpu(fallback, e)
+
+
+async def read_image_request(request):
+    """(image_bytes, params) from a Starlette request; same bodies as request_io.read_image_request"""
+    with metrics.stage('parse'):
+        image_bytes, params = await read_request_body(request)
+    metrics.note_modality(params.get('modality'))
+    return image_bytes, params
+
+
+async def read_request_body(request):
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+
+    if mimetype == 'multipart/form-data':
+        form = await request.form()
+        upload = form.get('image')
+        if upload is None or isinstance(upload, str):
+            raise RequestError("Missing 'image' file part")
+        image_bytes = await upload.read()
+        if not image_bytes:
+            raise RequestError("Empty 'image' file part")
+        params = parse_metadata(form, request.headers)
+        metadata = form.get('metadata')
+        if metadata is not None and not isinstance(metadata, str):
+            metadata = (await metadata.read()).decode('utf-8')
+        return image_bytes, merge_metadata_json(params, metadata)
+
+    if mimetype == 'application/json' or mimetype.endswith('+json'):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        return await run_cpu(image_from_json, data)
+
+    image_bytes = await request.body()
+    if not image_bytes:
+        raise RequestError('Empty request body')
+    return image_bytes, parse_metadata(request.query_params, request.headers)
+
+
+def error_response(error, where):
+    if isinstance(error, RequestError):
+        return JSONResponse({'error': str(error)}, status_code=400)
+    log.error(f'{where} failed', exc_info=error)
+    return JSONResponse({'error': str(error)}, status_code=500)
+
+
+async def classify_image_async(image, image_bytes, modality, slice_index, features=None):
+    """Async counterpart of medsigclip.classify_image"""
+    if medsigclip.use_real_model():
+        if medsigclip.INFERENCE_BACKEND == 'remote':
+            return await call_remote_async(
+                partial(medsigclip.remote_classify_call, image),
+                partial(medsigclip.parse_remote_classification, image=image, modality=modality),
+                partial(medsigclip.remote_classification_failed, image=image, modality=modality),
+                breaker=medsigclip.HF_BREAKER
+            )
+        # Await the micro-batcher's future instead of parking a thread on it
+        return await asyncio.wrap_future(medsigclip.MODEL_BATCHER.submit((image, modality)))
+
+    if MODE == 'cloud' and medsigclip.CLOUD_AVAILABLE:
+        data = await run_cpu(medsigclip.upstream_bytes, image_bytes, image)
+        return await call_remote_async(
+            partial(medsigclip.cloud_classify_call, data),
+            partial(medsigclip.parse_cloud_classification, image_bytes=data, modality=modality),
+            partial(medsigclip.cloud_classification_failed, image_bytes=data, modality=modality),
+            breaker=medsigclip.HF_BREAKER
+        )
+
+    return await run_cpu(medsigclip.classify_with_enhanced_demo, image, modality, slice_index, features=features)
+
+
+async def generate_report_async(image, modality, patient_context, start_time,
+                                classification=None, slice_index=0, features=None):
+    """Async counterpart of medgemma.generate_report_for_image"""
+    if MODE == 'real' or MODE == 'cloud':
+        if medgemma.use_local_model():
+            return await run_cpu(medgemma.generate_real_report, image, None, modality, patient_context, start_time)
+        return await call_remote_async(
+            partial(medgemma.remote_report_call, image, modality, patient_context),
+            partial(medgemma.parse_remote_report, image=image, modality=modality,
+                    patient_context=patient_context, start_time=start_time),
+            partial(medgemma.real_report_failed, image=image, modality=modality,
+                    patient_context=patient_context, start_time=start_time),
+            breaker=medgemma.HF_BREAKER
+        )
+
+    return await run_cpu(
+        medgemma.generate_demo_report, image, modality, patient_context, start_time,
+        classification, slice_index, features=features
+    )
+
+
+async def classify_stage(decoded, modality, slice_index):
+    """Async counterpart of unified_ai_service.classify_stage (same cache, same result)"""
+    start_time = time.time()
+    cache_key = medsigclip.make_cache_key(decoded.image_bytes, modality, slice_index, decoded.frame_index)
+    cached = medsigclip.RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        cached['processing_time'] = time.time() - start_time
+        cached['cached'] = True
+        return cached
+
+    async def compute():
+        image = await run_cpu(getattr, decoded, 'image')
+        features = await run_cpu(unified.shared_features, decoded)
+        result = await classify_image_async(image, decoded.image_bytes, modality, slice_index, features)
+        result['processing_time'] = time.time() - start_time
+        result['mode'] = MODE
+        medsigclip.cache_result(cache_key, result)
+        return result
+
+    result, shared = await medsigclip.CLASSIFY_FLIGHTS.do_async(cache_key, compute)
+    if shared:
+        result['processing_time'] = time.time() - start_time
+        result['coalesced'] = True
+    decoded.timings['classify'] = result['processing_time']
+    return result
+
+
+async def report_stage(decoded, modality, patient_context, classification, slice_index):
+    """Async counterpart of unified_ai_service.report_stage (same cache, same result)"""
+    start_time = time.time()
+    cache_key = medgemma.make_cache_key(
+        decoded.image_bytes, modality, slice_index, classification, patient_context, decoded.frame_index
+    )
+    cached = medgemma.RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        cached['processing_time'] = time.time() - start_time
+        cached['cached'] = True
+        return cached
+
+    async def compute():
+        image = await run_cpu(getattr, decoded, 'image')
+        features = await run_cpu(unified.shared_features, decoded)
+        result = await generate_report_async(
+            image, modality, patient_context, start_time, classification, slice_index, features
+        )
+        # Only cache real reports in real/cloud mode, never their demo fallbacks
+        if MODE == 'demo' or not result.get('demo_mode'):
+            medgemma.RESULT_CACHE.put(cache_key, result)
+        return result
+
+    result, shared = await medgemma.REPORT_FLIGHTS.do_async(cache_key, compute)
+    if shared:
+        result['processing_time'] = time.time() - start_time
+        result['coalesced'] = True
+    decoded.timings['report'] = time.time() - start_time
+    return result
+
+
+async def health(request):
+    with unified.app.app_context():
+        body = unified.health().get_json()
+    body['server'] = {
+        'type': 'asgi',
+        'cpu_workers': CPU_WORKERS,
+        'upstream_max_connections': upstream.MAX_CONNECTIONS
+    }
+    return JSONResponse(body)
+
+
+async def classify(request):
+    try:
+        image_bytes, data = await read_image_request(request)
+        modality = data.get('modality', 'unknown')
+        decoded = DecodedImage(image_bytes, data.get('frame_index', 0), modality)
+        return JSONResponse(await classify_stage(decoded, modality, data.get('slice_index', 0)))
+    except Exception as e:
+        return error_response(e, 'classify')
+
+
+async def generate_report(request):
+    try:
+        image_bytes, data = await read_image_request(request)
+        modality = data.get('modality', 'XR')
+        decoded = DecodedImage(image_bytes, data.get('frame_index', 0), modality)
+        report = await report_stage(
+            decoded, modality, data.get('patientContext', {}),
+            data.get('classification', None), data.get('slice_index', 0)
+        )
+        return JSONResponse(report)
+    except Exception as e:
+        return error_response(e, 'generate_report')
+
+
+async def analyze(request):
+    """Async /analyze: same body and response as the unified Flask service"""
+    try:
+        image_bytes, data = await read_image_request(request)
+        modality = data.get('modality')
+        patient_context = data.get('patientContext', {})
+        slice_index = data.get('slice_index', 0)
+
+        start_time = time.time()
+        decoded = DecodedImage(image_bytes, data.get('frame_index', 0), modality)
+
+        classification = await classify_stage(decoded, modality or 'unknown', slice_index)
+        label = classification.get('classification')
+        report = await report_stage(decoded, modality or 'XR', patient_context, label, slice_index)
+
+        return JSONResponse({
+            'classification': classification,
+            'report': report,
+            'modality': modality,
+            'slice_index': slice_index,
+            'mode': MODE,
+            'processing_time': time.time() - start_time,
+            'timings': decoded.timings
+        })
+    except Exception as e:
+        return error_response(e, 'analyze')
+
+
+async def bind_request_id(request, call_next):
+    """X-Request-ID for the native routes' log lines, echoed back (Flask routes bind their own)"""
+    if request.url.path not in NATIVE_ROUTES:
+        return await call_next(request)
+
+    request_id = structured_logging.new_request_id(request.headers.get(structured_logging.REQUEST_ID_HEADER))
+    token = structured_logging.bind_request_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        structured_logging.reset_request_id(token)
+    response.headers[structured_logging.REQUEST_ID_HEADER] = request_id
+    return response
+
+
+async def track_metrics(request, call_next):
+    """Request latency, in-flight and stage metrics for the native routes (Flask routes record their own)"""
+    path = request.url.path
+    if path not in NATIVE_ROUTES:
+        return await call_next(request)
+
+    scope = metrics.begin_request('unified')
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.end_request(scope, 'unified', MODE, path, status)
+
+
+async def profile_request(request, call_next):
+    """On-demand profiles for the native routes (Flask routes profile themselves)
+
+    Only executor work (run_cpu) is recorded: the event-loop thread interleaves
+    other requests, so profiling it would mix them into this one's profile.
+    """
+    profiler = unified.PROFILER
+    path = request.url.path
+    if not profiler.enabled or path not in NATIVE_ROUTES:
+        return await call_next(request)
+    started = profiler.begin(request.method, path, request.headers.get(profiling_hook.PROFILE_HEADER))
+    if started is None:
+        return await call_next(request)
+
+    profile, trigger = started
+    began = time.perf_counter()
+    token = profiling_hook.bind_profiler(profile)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        profiling_hook.reset_profiler(token)
+        metadata = profiler.request_metadata(request.method, path, status, trigger, began, request.headers)
+        await run_cpu(profiler.finish, profile, metadata)
+
+
+async def simulate_load(request, call_next):
+    """LOAD_SIMULATION for every POST route, bridged ones too, waiting on the event loop instead of a thread"""
+    simulator = unified.LOAD_SIMULATOR
+    path = request.url.path
+    if not simulator.enabled or request.method != 'POST':
+        return await call_next(request)
+
+    plan = simulator.plan(path)
+    if plan is None:
+        return await call_next(request)
+    target, error = plan
+    if error is not None:
+        return JSONResponse({'error': 'Simulated failure (load simulation)', 'simulated': True}, status_code=error)
+
+    started = time.perf_counter()
+    response = await call_next(request)
+    await simulator.async_wait(target, started, path)
+    return response
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Load and warm up in the background so uvicorn binds right away; /ready reports progress
+    unified.start_background_startup()
+    yield
+    await upstream.aclose()
+    CPU_EXECUTOR.shutdown(wait=False)
+
+
+# simulate_load covers the bridged Flask routes too; keep the Flask hooks from simulating them again
+unified.LOAD_SIMULATOR.bridged = True
+
+app = Starlette(
+    routes=[
+        Route('/health', health, methods=['GET']),
+        Route('/classify', classify, methods=['POST']),
+        Route('/generate-report', generate_report, methods=['POST']),
+        Route('/analyze', analyze, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(unified.app))
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(BaseHTTPMiddleware, dispatch=bind_request_id),
+        Middleware(BaseHTTPMiddleware, dispatch=track_metrics),
+        Middleware(BaseHTTPMiddleware, dispatch=profile_request),
+        Middleware(BaseHTTPMiddleware, dispatch=simulate_load)
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print(f"\n✅ Unified AI Service (ASGI) running on http://localhost:{PORT}")
+    print(f"   Mode: {MODE.upper()}")
+    print(f"   CPU workers: {CPU_WORKERS}")
+    print(f"   Test with: curl http://localhost:{PORT}/health\n")
+
+    uvicorn.run(app, host='0.0.0.0', port=PORT)
@@ -0,0 +1,10 @@
+"""
+Benchmarks - Reproducible latency/throughput runs against the AI services
+Synthetic PNG and DICOM corpora, in-process or HTTP drivers, JSON results for comparing commits
+
+Run from ai-services/ (fully offline in demo mode):
+
+    python -m benchmarks.run --target inprocess --concurrency 1,4,16
+    python -m benchmarks.run --target http --base-url http://localhost:5003
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
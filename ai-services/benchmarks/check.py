@@ -0,0 +1,53 @@
+"""
+Benchmark Check - Every modality through /analyze, failing on any non-200 answer
+
+    python -m benchmarks.check
+    python -m benchmarks.check --target http --base-url http://localhost:5003
+
+Demo reports pick a normal or abnormal template per slice, so each image is
+sent for a range of slice indices to reach every template variant.
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks.corpus import DICOM_PROFILES, build_corpus
+from benchmarks.run import csv, make_driver
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check /analyze answers 200 for every modality')
+    parser.add_argument('--target', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--base-url', help='send every endpoint to this URL (default: per-service ports)')
+    parser.add_argument('--endpoint', default='/analyze')
+    parser.add_argument('--modalities', type=csv, default=list(DICOM_PROFILES))
+    parser.add_argument('--formats', type=csv, default=['png', 'dicom'])
+    parser.add_argument('--slices', type=int, default=30, help='slice indices per image')
+    parser.add_argument('--transport', choices=['json', 'binary'], default='binary')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args(argv)
+    args.cache = False
+    args.feature_dtype = None
+
+    corpus = build_corpus(sizes=[256], modalities=args.modalities, formats=args.formats, per_combination=1)
+    driver = make_driver(args)
+
+    failures = []
+    for item in corpus:
+        statuses = [driver.post(args.endpoint, item, n, args.transport) for n in range(args.slices)]
+        bad = [(n, status) for n, status in enumerate(statuses) if status != 200]
+        print(f"  {item.name:<20}{args.slices - len(bad):>4}/{args.slices} ok")
+        failures.extend(f'{item.name} slice {n}: {status}' for n, status in bad)
+
+    if failures:
+        print(f"\n❌ {len(failures)} failed {args.endpoint} requests:")
+        for failure in failures[:20]:
+            print(f"   {failure}")
+        return 1
+    print(f"\n✅ {args.endpoint} answered 200 for {', '.join(args.modalities)} ({os.getenv('AI_MODE', 'demo')} mode)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Benchmark Compare - Throughput and latency change between two result files
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Exits 1 when any shared endpoint/concurrency p95, or any endpoint's median
+per-request peak allocation, regressed by more than --threshold percent, or
+when the new run has error responses, so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    results = {(entry['endpoint'], entry['concurrency']): entry for entry in report['results']}
+    return report['meta'], results, report.get('memory') or {}
+
+
+def change(old, new):
+    """Percent change, or None when either side is missing"""
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100.0
+
+
+def fmt_change(value):
+    return '      n/a' if value is None else f'{value:+8.1f}%'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='p95 latency / peak allocation regression (percent) that fails the comparison')
+    args = parser.parse_args(argv)
+
+    old_meta, old_results, old_memory = load(args.old)
+    new_meta, new_results, new_memory = load(args.new)
+    print(f"old: {old_meta.get('git_commit')} ({old_meta.get('target')}, {old_meta.get('mode')})")
+    print(f"new: {new_meta.get('git_commit')} ({new_meta.get('target')}, {new_meta.get('mode')})")
+    for key in ('target', 'mode', 'transport', 'feature_dtype', 'corpus', 'cpu_count'):
+        if old_meta.get(key) != new_meta.get(key):
+            print(f"⚠️  {key} differs: {old_meta.get(key)} -> {new_meta.get(key)}")
+
+    print(f"\n{'endpoint':<17}{'conc':>5}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    regressions = []
+    for key in sorted(old_results.keys() & new_results.keys()):
+        old, new = old_results[key], new_results[key]
+        old_latency, new_latency = old['latency_ms'] or {}, new['latency_ms'] or {}
+        p95 = change(old_latency.get('p95'), new_latency.get('p95'))
+        print(f"{key[0]:<17}{key[1]:>5}{fmt_change(change(old['throughput_rps'], new['throughput_rps'])):>10}"
+              f"{fmt_change(change(old_latency.get('p50'), new_latency.get('p50'))):>10}"
+              f"{fmt_change(p95):>10}{fmt_change(change(old_latency.get('p99'), new_latency.get('p99'))):>10}")
+        if p95 is not None and p95 > args.threshold:
+            regressions.append(f'{key[0]} x{key[1]}')
+        if new.get('errors'):
+            regressions.append(f"{key[0]} x{key[1]} ({new['errors']} errors)")
+
+    shared_memory = sorted(old_memory.keys() & new_memory.keys())
+    if shared_memory:
+        print(f"\n{'endpoint':<17}{'peak p50':>10}{'peak max':>10}")
+    for name in shared_memory:
+        old_peak = old_memory[name]['peak_alloc_bytes'] or {}
+        new_peak = new_memory[name]['peak_alloc_bytes'] or {}
+        p50 = change(old_peak.get('p50'), new_peak.get('p50'))
+        print(f"{name:<17}{fmt_change(p50):>10}{fmt_change(change(old_peak.get('max'), new_peak.get('max'))):>10}")
+        if p50 is not None and p50 > args.threshold:
+            regressions.append(f'{name} peak allocation')
+
+    missing = sorted(old_results.keys() ^ new_results.keys())
+    if missing:
+        print(f"\nOnly in one file: {', '.join(f'{name} x{conc}' for name, conc in missing)}")
+    if regressions:
+        print(f"\n❌ Regressed more than {args.threshold:g}% or failed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
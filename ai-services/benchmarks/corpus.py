@@ -0,0 +1,129 @@
+"""
+Benchmark Corpus - Deterministic synthetic PNG and DICOM images
+Same seed, same bytes: runs on different commits see an identical workload
+"""
+
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+# Stored-value range and rescale per modality (CT stores HU + 1024)
+DICOM_PROFILES = {
+    'CT': {'bits': 12, 'intercept': -1024.0, 'window': (40.0, 400.0)},
+    'MR': {'bits': 12, 'intercept': 0.0, 'window': None},
+    'XR': {'bits': 12, 'intercept': 0.0, 'window': None},
+    'CR': {'bits': 12, 'intercept': 0.0, 'window': None},
+    'XA': {'bits': 10, 'intercept': 0.0, 'window': None},
+    'US': {'bits': 8, 'intercept': 0.0, 'window': None}
+}
+
+
+class CorpusImage:
+    """One encoded benchmark image and what it was generated from"""
+
+    def __init__(self, name, modality, size, fmt, data):
+        self.name = name
+        self.modality = modality
+        self.size = size
+        self.format = fmt  # 'png' or 'dicom'
+        self.data = data
+
+    @property
+    def content_type(self):
+        return 'application/dicom' if self.format == 'dicom' else 'image/png'
+
+
+def synthetic_pixels(size, modality, rng, bits=12):
+    """(size, size) uint16 'anatomy': body ellipse, a few dense blobs, vessels for XA, noise"""
+    top = (1 << bits) - 1
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size - 0.5
+
+    body = ((x / 0.42) ** 2 + (y / 0.36) ** 2) < 1.0
+    values = np.where(body, 0.45, 0.05).astype(np.float32)
+
+    for _ in range(int(rng.integers(2, 6))):
+        cx, cy = rng.uniform(-0.25, 0.25, 2)
+        radius = rng.uniform(0.03, 0.12)
+        values += rng.uniform(0.1, 0.35) * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * radius ** 2))
+
+    if modality == 'XA':
+        # Dark branching vessels over the background
+        for _ in range(int(rng.integers(3, 7))):
+            slope, offset = rng.uniform(-1.5, 1.5), rng.uniform(-0.3, 0.3)
+            values -= 0.3 * np.exp(-((y - slope * x - offset) ** 2) / (2 * 0.004 ** 2))
+
+    values += rng.normal(0.0, 0.03, values.shape).astype(np.float32)
+    return (np.clip(values, 0.0, 1.0) * top).astype(np.uint16)
+
+
+def encode_png(pixels, bits):
+    """8-bit grayscale PNG, as the viewer would render it"""
+    gray = (pixels.astype(np.float32) * (255.0 / ((1 << bits) - 1))).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(gray, 'L').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def encode_dicom(pixels, modality, seed):
+    """Single-frame MONOCHROME2 Part-10 file with the modality's rescale and window"""
+    import pydicom
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+
+    profile = DICOM_PROFILES.get(modality, DICOM_PROFILES['XR'])
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid(entropy_srcs=[str(seed)])
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset(None, {}, file_meta=meta, preamble=b'\0' * 128)
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = modality
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = 16
+    ds.BitsStored = profile['bits']
+    ds.HighBit = profile['bits'] - 1
+    ds.PixelRepresentation = 0
+    ds.RescaleSlope = 1
+    ds.RescaleIntercept = profile['intercept']
+    if profile['window'] is not None:
+        ds.WindowCenter, ds.WindowWidth = profile['window']
+    ds.PixelData = pixels.astype('<u2').tobytes()
+
+    buffer = io.BytesIO()
+    if int(pydicom.__version__.split('.')[0]) >= 3:
+        ds.save_as(buffer, enforce_file_format=True)
+    else:
+        ds.is_little_endian, ds.is_implicit_VR = True, False
+        ds.save_as(buffer, write_like_original=False)
+    return buffer.getvalue()
+
+
+def build_corpus(sizes=(256, 512, 1024), modalities=tuple(DICOM_PROFILES), formats=('png', 'dicom'),
+                 per_combination=2, seed=0):
+    """Every size x modality x format combination, per_combination distinct images each"""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for size in sizes:
+        for modality in modalities:
+            bits = DICOM_PROFILES.get(modality, DICOM_PROFILES['XR'])['bits']
+            for n in range(per_combination):
+                pixels = synthetic_pixels(size, modality, rng, bits)
+                for fmt in formats:
+                    name = f"{modality}-{size}-{n}.{'dcm' if fmt == 'dicom' else 'png'}"
+                    data = encode_dicom(pixels, modality, f'{seed}-{name}') if fmt == 'dicom' else encode_png(pixels, bits)
+                    corpus.append(CorpusImage(name, modality, size, fmt, data))
+    return corpus
+
+
+def save_corpus(corpus, directory):
+    """Write the corpus out (e.g. to inspect it or replay it with other tools)"""
+    os.makedirs(directory, exist_ok=True)
+    for item in corpus:
+        with open(os.path.join(directory, item.name), 'wb') as f:
+            f.write(item.data)
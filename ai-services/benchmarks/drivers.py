@@ -0,0 +1,104 @@
+"""
+Benchmark Drivers - Send one corpus image to one endpoint, in-process or over HTTP
+Both drivers build identical requests, so their numbers differ only by the transport
+"""
+
+import base64
+import threading
+
+# Endpoint -> service that serves it when services run separately
+ENDPOINT_SERVICES = {
+    '/classify': 'medsigclip',
+    '/generate-report': 'medgemma',
+    '/analyze': 'unified'
+}
+
+DEFAULT_URLS = {
+    'medsigclip': 'http://localhost:5001',
+    'medgemma': 'http://localhost:5002',
+    'unified': 'http://localhost:5003'
+}
+
+
+def request_kwargs(item, slice_index, transport):
+    """(json, data, headers) for one request: base64 JSON (legacy) or a raw binary body"""
+    if transport == 'json':
+        body = {
+            'image': base64.b64encode(item.data).decode('ascii'),
+            'modality': item.modality,
+            'slice_index': slice_index
+        }
+        return body, None, {}
+    headers = {
+        'Content-Type': item.content_type,
+        'X-Modality': item.modality,
+        'X-Slice-Index': str(slice_index)
+    }
+    return None, item.data, headers
+
+
+class InProcessDriver:
+    """Flask test clients against the unified app: the full WSGI stack without sockets"""
+
+    name = 'inprocess'
+
+    def __init__(self):
+        import unified_ai_service
+
+        self.app = unified_ai_service.app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def health(self):
+        return self._client().get('/health').get_json()
+
+    def post(self, endpoint, item, slice_index, transport):
+        """HTTP status of one request"""
+        body, data, headers = request_kwargs(item, slice_index, transport)
+        response = self._client().post(endpoint, json=body, data=data, headers=headers)
+        response.close()
+        return response.status_code
+
+
+class HttpDriver:
+    """Pooled HTTP sessions (one per thread) against running services"""
+
+    name = 'http'
+
+    def __init__(self, base_url=None, urls=None, timeout=120):
+        import requests
+
+        self._requests = requests
+        self.urls = dict(DEFAULT_URLS, **(urls or {}))
+        if base_url:
+            self.urls = {service: base_url for service in self.urls}
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session
+
+    def url(self, endpoint):
+        return self.urls[ENDPOINT_SERVICES.get(endpoint, 'unified')].rstrip('/') + endpoint
+
+    def health(self):
+        return self._session().get(self.urls['unified'].rstrip('/') + '/health', timeout=self.timeout).json()
+
+    def post(self, endpoint, item, slice_index, transport):
+        body, data, headers = request_kwargs(item, slice_index, transport)
+        try:
+            response = self._session().post(
+                self.url(endpoint), json=body, data=data, headers=headers, timeout=self.timeout
+            )
+        except self._requests.RequestException:
+            return 0  # Connection error / timeout
+        response.close()
+        return response.status_code
@@ -0,0 +1,266 @@
+"""
+Benchmark Runner - Throughput and latency percentiles per endpoint and concurrency level
+
+    python -m benchmarks.run --target inprocess
+    python -m benchmarks.run --target http --concurrency 1,8,32 --requests 500
+    python -m benchmarks.run --target http --base-url http://localhost:5003
+
+Results are written as JSON (default benchmarks/results/<UTC time>_<commit>.json)
+for benchmarks.compare. Everything is synthetic and local: no network beyond the
+target services, no model downloads. Any non-200 response fails the run (exit 1)
+after the results are written, so a broken endpoint can't pass as a fast one.
+
+In-process runs also make one untimed sequential pass over the corpus per
+endpoint under tracemalloc and record each request's peak allocation. That
+covers Python and NumPy allocations (Pillow's own image buffers are not
+traced), so it guards against extra full-size array copies creeping back in.
+--feature-dtype float32 runs the in-process services with the float32
+feature path (FEATURE_DTYPE) so its peak can be compared against float64.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+ENDPOINTS = {
+    'classify': '/classify',
+    'generate-report': '/generate-report',
+    'analyze': '/analyze'
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def csv(value, cast=str):
+    return [cast(part.strip()) for part in value.split(',') if part.strip()]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def latency_summary(latencies):
+    """Percentiles in milliseconds"""
+    if not latencies:
+        return None
+    ms = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'mean': round(float(ms.mean()), 3),
+        'max': round(float(ms.max()), 3)
+    }
+
+
+def bytes_summary(values):
+    if not values:
+        return None
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'p50': int(p50), 'p95': int(p95), 'max': int(max(values))}
+
+
+def memory_pass(driver, endpoint, corpus, transport):
+    """Peak traced allocation of each corpus image's request, one request at a time"""
+    peaks, by_resolution, errors = [], defaultdict(list), 0
+    tracemalloc.start()
+    try:
+        for n, item in enumerate(corpus):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            errors += driver.post(endpoint, item, n % 32, transport) != 200
+            peak = tracemalloc.get_traced_memory()[1] - before
+            peaks.append(peak)
+            by_resolution[str(item.size)].append(peak)
+    finally:
+        tracemalloc.stop()
+    return {
+        'requests': len(peaks),
+        'errors': errors,
+        'peak_alloc_bytes': bytes_summary(peaks),
+        'by_resolution': {key: bytes_summary(value) for key, value in sorted(by_resolution.items(), key=lambda kv: int(kv[0]))}
+    }
+
+
+def run_level(driver, endpoint, corpus, concurrency, requests, transport):
+    """Fire `requests` requests from `concurrency` threads; per-request (item, status, seconds)"""
+    def one(n):
+        item = corpus[n % len(corpus)]
+        started = time.perf_counter()
+        status = driver.post(endpoint, item, n % 32, transport)
+        return item, status, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        samples = list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def summarize(samples, elapsed):
+    ok = [seconds for _, status, seconds in samples if status == 200]
+    by_resolution, by_format = defaultdict(list), defaultdict(list)
+    for item, status, seconds in samples:
+        if status == 200:
+            by_resolution[str(item.size)].append(seconds)
+            by_format[item.format].append(seconds)
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        'latency_ms': latency_summary(ok),
+        'by_resolution': {key: latency_summary(value) for key, value in sorted(by_resolution.items(), key=lambda kv: int(kv[0]))},
+        'by_format': {key: latency_summary(value) for key, value in sorted(by_format.items())}
+    }
+
+
+def make_driver(args):
+    from benchmarks.drivers import HttpDriver, InProcessDriver
+
+    if args.target == 'http':
+        return HttpDriver(base_url=args.base_url, timeout=args.timeout)
+    # Measure the services, not the result cache, unless asked to; keep request logs out of the way
+    if not args.cache:
+        os.environ.setdefault('RESULT_CACHE_SIZE', '0')
+    if args.feature_dtype:
+        os.environ['FEATURE_DTYPE'] = args.feature_dtype
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    return InProcessDriver()
+
+
+def print_table(results):
+    print(f"\n{'endpoint':<17}{'conc':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for entry in results:
+        latency = entry['latency_ms'] or {}
+        print(f"{entry['endpoint']:<17}{entry['concurrency']:>5}{entry['throughput_rps']:>10.1f}"
+              f"{latency.get('p50', float('nan')):>10.1f}{latency.get('p95', float('nan')):>10.1f}"
+              f"{latency.get('p99', float('nan')):>10.1f}{entry['errors']:>8}")
+
+
+def print_memory(memory):
+    print(f"\n{'endpoint':<17}{'peak MB p50':>13}{'p95':>9}{'max':>9}")
+    for name, entry in memory.items():
+        peak = entry['peak_alloc_bytes'] or {}
+        print(f"{name:<17}{peak.get('p50', 0) / 1e6:>13.2f}{peak.get('p95', 0) / 1e6:>9.2f}{peak.get('max', 0) / 1e6:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the AI services on a synthetic PNG/DICOM corpus')
+    parser.add_argument('--target', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--base-url', help='send every endpoint to this URL (default: per-service ports)')
+    parser.add_argument('--endpoints', type=csv, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=lambda v: csv(v, int), default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and concurrency level')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per endpoint')
+    parser.add_argument('--sizes', type=lambda v: csv(v, int), default=[256, 512, 1024])
+    parser.add_argument('--modalities', type=csv, default=['CT', 'MR', 'XR', 'CR', 'XA', 'US'])
+    parser.add_argument('--formats', type=csv, default=['png', 'dicom'])
+    parser.add_argument('--per-combination', type=int, default=2)
+    parser.add_argument('--transport', choices=['json', 'binary'], default='binary',
+                        help='base64 JSON bodies or raw image bytes with X-Modality headers')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true', help='leave the in-process result cache enabled')
+    parser.add_argument('--no-memory', action='store_true', help='skip the in-process peak allocation pass')
+    parser.add_argument('--feature-dtype', choices=['float64', 'float32'],
+                        help='FEATURE_DTYPE for in-process runs (default: the environment, else float64)')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<time>_<commit>.json)')
+    parser.add_argument('--save-corpus', metavar='DIR', help='also write the corpus images to DIR')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)} (choose from {', '.join(ENDPOINTS)})")
+
+    from benchmarks.corpus import build_corpus, save_corpus
+
+    started = time.perf_counter()
+    corpus = build_corpus(args.sizes, args.modalities, args.formats, args.per_combination, args.seed)
+    print(f"Corpus: {len(corpus)} images ({time.perf_counter() - started:.1f}s)")
+    if args.save_corpus:
+        save_corpus(corpus, args.save_corpus)
+
+    driver = make_driver(args)
+    health = driver.health() or {}
+    commit = git_commit()
+
+    results = []
+    memory = {}
+    for name in args.endpoints:
+        endpoint = ENDPOINTS[name]
+        for n in range(args.warmup):
+            driver.post(endpoint, corpus[n % len(corpus)], n, args.transport)
+        if driver.name == 'inprocess' and not args.no_memory:
+            memory[name] = memory_pass(driver, endpoint, corpus, args.transport)
+        for concurrency in args.concurrency:
+            samples, elapsed = run_level(driver, endpoint, corpus, concurrency, args.requests, args.transport)
+            entry = {'endpoint': name, 'concurrency': concurrency}
+            entry.update(summarize(samples, elapsed))
+            results.append(entry)
+            print(f"  {name} x{concurrency}: {entry['throughput_rps']} req/s, {entry['errors']} errors")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': driver.name,
+            'mode': health.get('mode'),
+            'transport': args.transport,
+            'feature_dtype': os.getenv('FEATURE_DTYPE', 'float64') if driver.name == 'inprocess' else None,
+            'corpus': {
+                'sizes': args.sizes,
+                'modalities': args.modalities,
+                'formats': args.formats,
+                'per_combination': args.per_combination,
+                'seed': args.seed,
+                'images': len(corpus)
+            },
+            'requests': args.requests,
+            'warmup': args.warmup
+        },
+        'results': results,
+        'memory': memory
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_table(results)
+    if memory:
+        print_memory(memory)
+    print(f"\nResults: {output}")
+
+    errors = sum(entry['errors'] for entry in results) + sum(entry['errors'] for entry in memory.values())
+    if errors:
+        print(f"\n❌ {errors} requests did not return 200 (see the errors column); failing the run")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Circuit Breaker - Fail fast to the fallback path while an upstream API is unhealthy
+Tracks recent failures and latency per upstream; open circuits skip the call entirely
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+log = logging.getLogger('circuit_breaker')
+
+
+class BreakerOpen(RuntimeError):
+    """Raised (or handed to the fallback) instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open when too many recent calls fail, open -> half-open after a cool-down
+
+    A call counts as failed if it raised, returned a 5xx/429 status or took
+    longer than slow_call_ms. Once at least min_calls outcomes fall inside
+    the sliding window and the failed share reaches failure_rate, the
+    circuit opens and allow() returns False for open_seconds. After that up
+    to half_open_calls probes are let through: a success closes the circuit,
+    a failure re-opens it.
+
+    allow() hands out a permit naming the state generation the call was let
+    through in; every transition starts a new generation. Outcomes of calls
+    admitted in an earlier generation (say a slow call that was already in
+    flight when the circuit opened) are counted in the totals but neither
+    enter the window nor decide a half-open probe.
+    """
+
+    def __init__(self, name, failure_rate=0.5, min_calls=5, window_seconds=30.0,
+                 open_seconds=15.0, slow_call_ms=10000.0, half_open_calls=1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.slow_call_ms = slow_call_ms
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self._outcomes = deque()  # (timestamp, failed, latency_ms)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._generation = 1
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @classmethod
+    def from_env(cls, name, prefix='BREAKER'):
+        """Build a breaker from BREAKER_* environment variables"""
+        return cls(
+            name,
+            failure_rate=float(os.getenv(f'{prefix}_FAILURE_RATE', 0.5)),
+            min_calls=int(os.getenv(f'{prefix}_MIN_CALLS', 5)),
+            window_seconds=float(os.getenv(f'{prefix}_WINDOW_SECONDS', 30)),
+            open_seconds=float(os.getenv(f'{prefix}_OPEN_SECONDS', 15)),
+            slow_call_ms=float(os.getenv(f'{prefix}_SLOW_CALL_MS', 10000)),
+            half_open_calls=int(os.getenv(f'{prefix}_HALF_OPEN_CALLS', 1))
+        )
+
+    def allow(self):
+        """A truthy permit if a call may go upstream now (reserves a probe slot when half-open), else False"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self._transition(HALF_OPEN)
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return self._generation
+
+    def record(self, failed, latency_ms, permit=None):
+        """Record the outcome of a call that allow() let through
+
+        Pass the permit allow() returned; without one the outcome is taken as
+        belonging to the current state.
+        """
+        failed = failed or latency_ms > self.slow_call_ms
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.failures += 1
+            if permit is not None and permit != self._generation:
+                return
+
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self._transition(CLOSED)
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append((now, failed, latency_ms))
+            self._trim(now)
+            failed_calls = sum(1 for _, outcome, _ in self._outcomes if outcome)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failed_calls / len(self._outcomes) >= self.failure_rate):
+                self._open(now)
+
+    def release(self, permit=None):
+        """Give back a slot from allow() when no call was made after all"""
+        with self._lock:
+            if permit is not None and permit != self._generation:
+                return
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_response(self, status_code, latency_ms, permit=None):
+        self.record(status_code >= 500 or status_code == 429, latency_ms, permit)
+
+    def _transition(self, state):
+        self.state = state
+        self._generation += 1
+
+    def _open(self, now):
+        self._transition(OPEN)
+        self._opened_at = now
+        self._outcomes.clear()
+        self.times_opened += 1
+        log.warning('circuit opened - using fallback', extra={'circuit': self.name, 'open_seconds': self.open_seconds})
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def stats(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = [latency for _, _, latency in self._outcomes]
+            recent_failures = sum(1 for _, failed, _ in self._outcomes if failed)
+            return {
+                'state': self.state,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': recent_failures,
+                'recent_mean_latency_ms': sum(latencies) / len(latencies) if latencies else None,
+                'calls': self.calls,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened
+            }
@@ -0,0 +1,169 @@
+"""
+DICOM I/O - Decode DICOM Part-10 payloads into analysis-ready pixels
+Applies rescale slope/intercept and a VOI window in vectorized form and selects frames
+"""
+
+import importlib.util
+import io
+import logging
+
+import numpy as np
+from PIL import Image
+
+from metrics import timed
+from request_io import RequestError
+
+# pydicom is imported on the first DICOM upload; its import alone costs ~150ms of startup
+PYDICOM_AVAILABLE = importlib.util.find_spec('pydicom') is not None
+
+log = logging.getLogger('dicom_io')
+if not PYDICOM_AVAILABLE:
+    log.warning('pydicom not installed - DICOM uploads unavailable')
+
+# Default VOI window (center, width) per modality when the dataset has none;
+# modalities not listed are windowed to the frame's own min..max range
+DEFAULT_WINDOWS = {
+    'CT': (40.0, 400.0),  # Soft tissue
+}
+
+
+def is_dicom(data):
+    """True if the bytes look like a DICOM Part-10 file (preamble + 'DICM')"""
+    return len(data) >= 132 and data[128:132] == b'DICM'
+
+
+def read_dataset(data):
+    """Parse DICOM bytes into a pydicom Dataset"""
+    if not PYDICOM_AVAILABLE:
+        raise RuntimeError('pydicom is required to decode DICOM uploads')
+    import pydicom
+    return pydicom.dcmread(io.BytesIO(data))
+
+
+def frame_count(ds):
+    """Number of frames in a (possibly multi-frame) dataset"""
+    return int(ds.get('NumberOfFrames', 1) or 1)
+
+
+@timed('decode')
+def frame_to_gray(ds, frame_index=0, modality=None, pixels=None):
+    """Return one frame as a windowed uint8 grayscale (H, W) array
+
+    The stored 12/16-bit values are mapped to 8 bits in one lookup (see
+    window_pixels). Pass pixels to reuse an already decoded pixel_array.
+    """
+    if pixels is None:
+        pixels = ds.pixel_array
+
+    frames = frame_count(ds)
+    if frames > 1:
+        if not 0 <= frame_index < frames:
+            raise RequestError(f"frame_index {frame_index} out of range (0-{frames - 1})")
+        pixels = pixels[frame_index]
+
+    if int(ds.get('SamplesPerPixel', 1)) > 1:
+        # Color frames: same luma weights PIL uses for convert('L')
+        return np.asarray(Image.fromarray(pixels.astype(np.uint8), 'RGB').convert('L'))
+
+    return window_pixels(
+        pixels,
+        slope=float(ds.get('RescaleSlope', 1) or 1),
+        intercept=float(ds.get('RescaleIntercept', 0) or 0),
+        window=_voi_window(ds, modality or ds.get('Modality')),
+        invert=ds.get('PhotometricInterpretation') == 'MONOCHROME1'
+    )
+
+
+def window_pixels(pixels, slope=1.0, intercept=0.0, window=None, invert=False):
+    """uint8 grayscale from stored pixel values: modality LUT, VOI window, then one lookup
+
+    For 8/16-bit integer data the rescale and window are computed in float32
+    once per possible stored value, and the frame is mapped through that
+    table straight from its native dtype, so no float copy of the frame is
+    made. Other dtypes fall back to the same math on a float32 copy. window
+    is (center, width); None windows to the frame's own value range.
+    """
+    table = stored_value_table(pixels)
+    if table is None:
+        index, values = None, pixels.astype(np.float32)
+    else:
+        index, values = table
+
+    if slope != 1.0:
+        values *= slope
+    if intercept != 0.0:
+        values += intercept
+
+    if window is None:
+        if index is not None:
+            # Rescaled values of the frame's lowest and highest stored value
+            ends = np.array([pixels.min(), pixels.max()], dtype=pixels.dtype).view(index.dtype)
+            window = data_range_window(values[ends])
+        else:
+            window = data_range_window(values)
+
+    gray = apply_window(values, *window)
+    if invert:
+        np.subtract(255, gray, out=gray)
+    return gray if index is None else gray[index]
+
+
+def stored_value_table(pixels):
+    """(index, values) for a lookup-table decode, or None when the dtype is too wide for one
+
+    index is pixels viewed as unsigned table positions (no copy); values[i]
+    is the float32 stored value position i stands for.
+    """
+    kind, size = pixels.dtype.kind, pixels.dtype.itemsize
+    if kind not in 'ui' or size > 2:
+        return None
+    if kind == 'u':
+        return pixels, np.arange(int(pixels.max()) + 1, dtype=np.float32)
+    unsigned = np.dtype(f'u{size}')
+    positions = np.arange(1 << (8 * size), dtype=unsigned)
+    return pixels.view(unsigned), positions.view(pixels.dtype).astype(np.float32)
+
+
+def data_range_window(values):
+    """Window (center, width) spanning the values' min..max"""
+    low = float(values.min())
+    high = float(values.max())
+    return (low + high) / 2, high - low + 1.0
+
+
+def apply_window(values, center, width):
+    """Linear VOI LUT (DICOM PS3.3 C.11.2.1.2) mapped onto 0-255, in place on a float32 array"""
+    width = max(float(width), 1.0)
+    lower = center - 0.5 - (width - 1) / 2
+    values -= lower
+    values *= 255.0 / (width - 1) if width > 1 else 255.0
+    np.clip(values, 0, 255, out=values)
+    values += 0.5  # Round rather than truncate
+    return values.astype(np.uint8)
+
+
+def png_bytes(image):
+    """PNG-encode a PIL image (for upstream APIs that cannot take DICOM)"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _voi_window(ds, modality):
+    """Window (center, width) from the dataset or the modality default; None for the data range"""
+    center = _first(ds.get('WindowCenter'))
+    width = _first(ds.get('WindowWidth'))
+    if center is not None and width is not None and float(width) > 0:
+        return float(center), float(width)
+
+    return DEFAULT_WINDOWS.get(modality)
+
+
+def _first(value):
+    """First item of a possibly multi-valued DICOM element"""
+    if value is None:
+        return None
+    try:
+        return value[0]
+    except (TypeError, IndexError, KeyError):
+        return value
@@ -0,0 +1,59 @@
+"""
+Gunicorn config - pre-forked multi-process serving for any of the Flask services
+Models load once in the master; forked workers share the weight pages copy-on-write
+
+    gunicorn -c gunicorn.conf.py medsigclip_server:app
+    gunicorn -c gunicorn.conf.py medgemma_server:app
+    gunicorn -c gunicorn.conf.py unified_ai_service:app
+
+Each worker has its own GIL, so PIL decode, NumPy features and the torch
+forward pass scale with cores. Set MODEL_WEIGHTS_MMAP_DIR (see
+shared_weights.py) to also share weights between independently started
+processes, and to keep them shared once a worker touches refcounts nearby.
+"""
+
+import gc
+import os
+import random
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5001)}"
+workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = True  # import the app (and load models below) before forking
+
+
+def _app_module(server):
+    uri = server.cfg.wsgi_app or server.app.app_uri
+    return sys.modules.get(uri.split(':')[0])
+
+
+def on_starting(server):
+    # Runs in the master after the preloaded import, before any worker forks
+    module = _app_module(server)
+    if module is not None and hasattr(module, 'load_models'):
+        module.load_models()  # workers inherit the model and only warm up (post_fork)
+    # Keep the collector from touching (and so copying) every inherited object page
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Split the cores between workers instead of each torch pool claiming all of them
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(int(os.getenv('TORCH_THREADS', 0)) or max(1, (os.cpu_count() or 1) // workers))
+    # Demo-mode results draw from random; don't hand every worker the master's sequence
+    random.seed()
+    # Warm up in the worker itself (running torch before fork can wedge its thread pools)
+    module = _app_module(server)
+    if module is not None and hasattr(module, 'start_background_startup'):
+        module.start_background_startup(load=False)
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges from the shared PROMETHEUS_MULTIPROC_DIR
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
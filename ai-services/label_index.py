@@ -0,0 +1,157 @@
+"""
+Label Index - Precomputed text embeddings for zero-shot classification labels
+Build once with `python label_index.py build`; workers memory-map the result
+
+Files written for a given path prefix:
+    <prefix>.npy   float32 (num_labels, dim) matrix of L2-normalized embeddings
+    <prefix>.json  model id, prompt template and per-modality row ranges
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+MODEL_ID = "microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224"
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'label_embeddings')
+
+log = logging.getLogger('label_index')
+
+# Classification labels by modality with more variety
+# (the same five modalities as MedGemma's REPORT_TEMPLATES)
+MODALITY_LABELS = {
+    'XA': ['normal', 'stenosis', 'occlusion', 'aneurysm', 'dissection', 'calcification', 'thrombus'],
+    'XR': ['normal', 'pneumonia', 'fracture', 'effusion', 'cardiomegaly', 'nodule', 'atelectasis'],
+    'CT': ['normal', 'mass', 'hemorrhage', 'infarct', 'nodule', 'fracture', 'consolidation'],
+    'MR': ['normal', 'tumor', 'edema', 'lesion', 'enhancement', 'infarct', 'ischemia'],
+    'US': ['normal', 'cyst', 'mass', 'fluid', 'calcification', 'stone', 'collection']
+}
+DEFAULT_LABELS = ['normal', 'abnormal', 'artifact', 'unclear', 'suspicious']
+
+# Zero-shot prompt wording per modality
+MODALITY_NAMES = {
+    'XA': 'coronary angiography',
+    'XR': 'chest X-ray',
+    'CT': 'CT scan',
+    'MR': 'MRI scan',
+    'US': 'ultrasound'
+}
+PROMPT_TEMPLATE = 'this is a {modality_name} image showing {label}'
+
+
+def vocabulary_key(modality):
+    """Index key for a modality (unknown modalities share the default label set)"""
+    return modality if modality in MODALITY_LABELS else 'default'
+
+
+def labels_for(modality):
+    """Label list used for a modality"""
+    return MODALITY_LABELS.get(modality, DEFAULT_LABELS)
+
+
+def label_prompts(modality):
+    """Text prompts to embed for each of a modality's labels"""
+    modality_name = MODALITY_NAMES.get(modality, 'medical')
+    return [PROMPT_TEMPLATE.format(modality_name=modality_name, label=label) for label in labels_for(modality)]
+
+
+def normalize(vectors):
+    """L2-normalize rows of a float array"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+class LabelIndex:
+    """Per-modality views into one (num_labels, dim) label embedding matrix"""
+
+    def __init__(self, matrix, metadata):
+        self.matrix = matrix
+        self.metadata = metadata
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH, model_id=MODEL_ID):
+        """Memory-map a built index, or return None if missing or built for another model/prompt"""
+        try:
+            with open(f'{path}.json', 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            matrix = np.load(f'{path}.npy', mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        if metadata.get('model_id') != model_id or metadata.get('prompt_template') != PROMPT_TEMPLATE:
+            log.warning('label index built for a different model or prompt - ignoring', extra={'path': path})
+            return None
+        return cls(matrix, metadata)
+
+    def lookup(self, modality):
+        """(labels, embedding rows) for a modality, or None if the index lacks it"""
+        entry = self.metadata['modalities'].get(vocabulary_key(modality))
+        if entry is None or entry['labels'] != labels_for(modality):
+            return None
+        offset = entry['offset']
+        return entry['labels'], self.matrix[offset:offset + len(entry['labels'])]
+
+
+def build_index(encode_text, path=DEFAULT_INDEX_PATH, model_id=MODEL_ID):
+    """Encode every modality's label prompts once and write <path>.npy / <path>.json
+
+    encode_text takes a list of prompts and returns a (len(prompts), dim) array.
+    """
+    vocabularies = {**MODALITY_LABELS, 'default': DEFAULT_LABELS}
+    blocks = []
+    modalities = {}
+    offset = 0
+    for key in vocabularies:
+        embeddings = normalize(encode_text(label_prompts(key)))
+        modalities[key] = {'labels': labels_for(key), 'offset': offset}
+        blocks.append(embeddings)
+        offset += len(embeddings)
+
+    matrix = np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32)
+    metadata = {
+        'model_id': model_id,
+        'prompt_template': PROMPT_TEMPLATE,
+        'dim': int(matrix.shape[1]),
+        'modalities': modalities
+    }
+
+    np.save(f'{path}.npy', matrix)
+    with open(f'{path}.json', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    return LabelIndex.load(path, model_id)
+
+
+def _encode_with_biomedclip(device):
+    """Text encoder backed by the BiomedCLIP open_clip checkpoint"""
+    import open_clip
+    import torch
+
+    model, _ = open_clip.create_model_from_pretrained(f"hf-hub:{MODEL_ID}")
+    tokenizer = open_clip.get_tokenizer(f"hf-hub:{MODEL_ID}")
+    model.to(device)
+    model.eval()
+
+    def encode_text(prompts):
+        with torch.inference_mode():
+            return model.encode_text(tokenizer(prompts).to(device)).float().cpu().numpy()
+
+    return encode_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the MedSigLIP label embedding index')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--output', default=os.getenv('LABEL_INDEX_PATH', DEFAULT_INDEX_PATH),
+                        help='Path prefix for the .npy/.json files')
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    print(f"📥 Loading BiomedCLIP text encoder ({MODEL_ID})...")
+    index = build_index(_encode_with_biomedclip(args.device), args.output)
+    print(f"✅ Wrote {index.matrix.shape[0]} label embeddings ({index.matrix.shape[1]}-d) to {args.output}.npy")
+
+
+if __name__ == '__main__':
+    main()
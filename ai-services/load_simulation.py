@@ -0,0 +1,182 @@
+"""
+Load Simulation - Injected latency and errors for capacity-testing callers
+Off unless LOAD_SIMULATION is set; replaces the fixed sleeps the demo paths used to have
+
+LOAD_SIMULATION holds a JSON object (or @/path/to/file.json) mapping endpoint
+paths to profiles, with '*' as the fallback for every other POST endpoint:
+
+    {
+      "*": {"latency": {"distribution": "fixed", "ms": 150}},
+      "/generate-report": {
+        "latency": {"distribution": "long_tail", "median_ms": 900, "sigma": 0.8, "max_ms": 15000},
+        "error_rate": 0.02,
+        "error_status": 503
+      }
+    }
+
+Distributions:
+    fixed      ms
+    normal     mean_ms, stddev_ms          (clamped at 0)
+    long_tail  median_ms, sigma            (log-normal; sigma ~0.5-1.0 gives realistic p99s)
+All accept max_ms as an upper clamp. LOAD_SIMULATION_SEED makes runs reproducible.
+
+The sampled latency is a target for the whole request: only the residual
+left after real processing is waited out, so injected latency never stacks
+on top of actual work. Errors are returned immediately without waiting.
+
+Latency is injected only by the async server (asgi_app), which waits on the
+event loop for every POST route it serves, bridged Flask routes included. A
+WSGI server has no way to hold a response back without parking a worker
+thread, so Flask services run standalone (werkzeug, gunicorn) inject errors
+only; run the unified service under asgi_app to capacity-test with latency.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import jsonify, request
+
+DISTRIBUTIONS = ('fixed', 'normal', 'long_tail')
+
+log = logging.getLogger('load_simulation')
+
+
+class LatencyProfile:
+    """One endpoint's latency distribution and error rate"""
+
+    def __init__(self, distribution='fixed', params=None, error_rate=0.0, error_status=503):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}' (expected one of {DISTRIBUTIONS})")
+        self.distribution = distribution
+        self.params = params or {}
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+
+    @classmethod
+    def from_dict(cls, config):
+        latency = dict(config.get('latency') or {'distribution': 'fixed', 'ms': 0})
+        distribution = latency.pop('distribution', 'fixed')
+        return cls(distribution, latency, config.get('error_rate', 0.0), config.get('error_status', 503))
+
+    @property
+    def adds_latency(self):
+        return any(float(self.params.get(key, 0)) > 0 for key in ('ms', 'mean_ms', 'median_ms'))
+
+    def sample_ms(self, rng):
+        params = self.params
+        if self.distribution == 'fixed':
+            value = float(params.get('ms', 0))
+        elif self.distribution == 'normal':
+            value = rng.gauss(float(params.get('mean_ms', 0)), float(params.get('stddev_ms', 0)))
+        else:
+            median = float(params.get('median_ms', 0))
+            value = median * math.exp(rng.gauss(0.0, float(params.get('sigma', 0.5)))) if median > 0 else 0.0
+        value = max(0.0, value)
+        if 'max_ms' in params:
+            value = min(value, float(params['max_ms']))
+        return value
+
+    def to_dict(self):
+        return {
+            'distribution': self.distribution,
+            **self.params,
+            'error_rate': self.error_rate,
+            'error_status': self.error_status
+        }
+
+
+class LoadSimulator:
+    """Per-endpoint latency targets and error injection"""
+
+    def __init__(self, profiles=None, seed=None):
+        self.profiles = profiles or {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.delayed_ms = Counter()
+        self.bridged = False  # Set by the async server, which then simulates every route itself
+
+    @classmethod
+    def from_env(cls):
+        """Build from LOAD_SIMULATION / LOAD_SIMULATION_SEED (disabled when unset)"""
+        raw = os.getenv('LOAD_SIMULATION', '').strip()
+        if not raw:
+            return cls()
+        if raw.startswith('@'):
+            with open(raw[1:], 'r', encoding='utf-8') as f:
+                raw = f.read()
+        config = json.loads(raw)
+        profiles = {endpoint: LatencyProfile.from_dict(profile) for endpoint, profile in config.items()}
+        seed = os.getenv('LOAD_SIMULATION_SEED')
+        simulator = cls(profiles, int(seed) if seed else None)
+        log.info('load simulation enabled', extra={'endpoints': sorted(profiles)})
+        return simulator
+
+    @property
+    def enabled(self):
+        return bool(self.profiles)
+
+    def profile_for(self, endpoint):
+        return self.profiles.get(endpoint) or self.profiles.get('*')
+
+    def plan(self, endpoint):
+        """(target_latency_seconds, error_status or None) for one request, or None if not simulated"""
+        profile = self.profile_for(endpoint)
+        if profile is None:
+            return None
+        with self._lock:
+            latency_ms = profile.sample_ms(self._rng)
+            error = profile.error_status if self._rng.random() < profile.error_rate else None
+            self.requests[endpoint] += 1
+            if error is not None:
+                self.errors[endpoint] += 1
+        return latency_ms / 1000.0, error
+
+    def residual(self, target_seconds, started_at, endpoint=None):
+        """Seconds still to wait so the request takes target_seconds in total"""
+        remaining = max(0.0, target_seconds - (time.perf_counter() - started_at))
+        if endpoint is not None and remaining > 0:
+            with self._lock:
+                self.delayed_ms[endpoint] += int(remaining * 1000)
+        return remaining
+
+    async def async_wait(self, target_seconds, started_at, endpoint=None):
+        """Event-loop friendly residual wait for async servers"""
+        remaining = self.residual(target_seconds, started_at, endpoint)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'profiles': {endpoint: profile.to_dict() for endpoint, profile in self.profiles.items()},
+            'requests': dict(self.requests),
+            'errors': dict(self.errors),
+            'delayed_ms': dict(self.delayed_ms)
+        }
+
+    def install(self, app):
+        """Apply error injection to a Flask app's POST endpoints (latency needs the async server)"""
+        if not self.enabled:
+            return
+        if any(profile.adds_latency for profile in self.profiles.values()):
+            log.warning('load simulation latency applies only under asgi_app - WSGI serving injects errors only')
+
+        @app.before_request
+        def _simulate_error():
+            if self.bridged or request.method != 'POST':
+                return None
+            plan = self.plan(request.path)
+            if plan is None or plan[1] is None:
+                return None
+            response = jsonify({'error': 'Simulated failure (load simulation)', 'simulated': True})
+            response.status_code = plan[1]
+            return response
@@ -5,55 +5,107 @@ Supports: Real AI Models, Cloud APIs, and Enhanced Demo Mode
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from PIL import Image
 import io
+import logging
 import base64
 import time
 import os
 import random
+import re
+import threading
 import numpy as np
 
+from image_features import extract_features_batch
+from result_cache import ResultCache
+from request_io import RequestError, read_image_request
+from dicom_io import png_bytes
+from preprocess import PreparedImage
+from series import SeriesSummary, iter_series_batches, read_series_request
+from streaming import collect_records, requested_stream_format, stream_response
+from load_simulation import LoadSimulator
+from profiling_hook import RequestProfiler
+from structured_logging import get_request_logger, install_request_ids, logging_stats, setup_logging
+from metrics import count_fallback, fallback_reason, instrument_app, timed
+from report_stream import iter_report_events, split_for_streaming
+from prefix_cache import PrefixCache
+from upstream import HF_API_URL, UpstreamCall, call_remote, hf_headers
+from circuit_breaker import BreakerOpen, CircuitBreaker
+from single_flight import SingleFlight
+from shared_weights import attach_mmap_weights
+from startup import CLOUD_SDK_MODULES, Readiness, cloud_sdk_available, module_available, warmup_image
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# JSON logs written by a background thread; hot-path request logs sampled (LOG_SAMPLE)
+setup_logging()
+install_request_ids(app)
+log = logging.getLogger('medgemma')
+request_log = get_request_logger('medgemma')
+
 # Configuration
 PORT = int(os.getenv('PORT', 5002))
 MODE = os.getenv('AI_MODE', 'demo')  # 'real', 'cloud', or 'demo'
 CLOUD_PROVIDER = os.getenv('CLOUD_PROVIDER', 'none')
+# Real mode: 'remote' HF API or 'local' model. MEDGEMMA_BACKEND, else the shared
+# INFERENCE_BACKEND, else 'remote' (MedSigLIP defaults to 'local'; see its MEDSIGCLIP_BACKEND)
+INFERENCE_BACKEND = os.getenv('MEDGEMMA_BACKEND') or os.getenv('INFERENCE_BACKEND') or 'remote'
+MAX_NEW_TOKENS = int(os.getenv('MAX_NEW_TOKENS', 512))  # Local generation length cap
+MODEL_ID = "microsoft/llava-med-v1.5-mistral-7b"
+SERVICE_VERSION = '1.0.0-demo'
+MODEL_VERSION = f"{MODEL_ID}@{SERVICE_VERSION}"  # Part of the result cache key
 
-# Try to import deep learning libraries
-try:
-    import torch
-    DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
-    TORCH_AVAILABLE = True
-except ImportError:
-    DEVICE = 'cpu'
-    TORCH_AVAILABLE = False
+# Content-addressed cache of generated reports
+RESULT_CACHE = ResultCache.from_env()
+
+# Concurrent byte-identical requests share one computation
+REPORT_FLIGHTS = SingleFlight.from_env('report')
+
+# Per-stage latency, in-flight and fallback metrics on /metrics
+instrument_app(app, 'medgemma', MODE)
+
+# Optional injected latency/errors for capacity testing (LOAD_SIMULATION)
+LOAD_SIMULATOR = LoadSimulator.from_env()
+LOAD_SIMULATOR.install(app)
+
+# On-demand cProfile of single requests into a bounded ring (PROFILE_TOKEN)
+PROFILER = RequestProfiler.from_env('medgemma')
+PROFILER.install(app)
+
+# Fail fast to the fallback while the Hugging Face endpoint is unhealthy
+HF_BREAKER = CircuitBreaker.from_env(f"huggingface:{MODEL_ID}")
+
+# Attention state of the fixed per-modality prompt prefix (local generation)
+PREFIX_CACHE = PrefixCache.from_env()
+
+# Model load and warm-up progress for /ready
+READINESS = Readiness('medgemma')
+
+# Deep learning libraries are probed without importing them (seconds of startup);
+# load_real_model() imports them and resolves the device
+TORCH_AVAILABLE = module_available('torch')
+DEVICE = 'cpu'
+if not TORCH_AVAILABLE:
     print("⚠️  PyTorch not installed - real AI mode unavailable")
 
-# Try to import cloud SDKs
-CLOUD_AVAILABLE = False
-try:
-    if CLOUD_PROVIDER == 'google':
-        from google.cloud import healthcare_v1
-        CLOUD_AVAILABLE = True
-    elif CLOUD_PROVIDER == 'aws':
-        import boto3
-        CLOUD_AVAILABLE = True
-    elif CLOUD_PROVIDER == 'azure':
-        from azure.ai.vision import ImageAnalysisClient
-        CLOUD_AVAILABLE = True
-except ImportError:
+# Cloud SDKs are only probed here; the cloud code paths import what they use
+CLOUD_AVAILABLE = cloud_sdk_available(CLOUD_PROVIDER)
+if CLOUD_PROVIDER in CLOUD_SDK_MODULES and not CLOUD_AVAILABLE:
     print(f"⚠️  Cloud SDK for {CLOUD_PROVIDER} not installed")
 
 # Global model variable
 MODEL = None
 TOKENIZER = None
+PROCESSOR = None  # Image+text processor when the checkpoint ships one
+
+# Pyramid level handed to the image processor (its 896 px input)
+MODEL_IMAGE_SIDE = 896
 
 print(f"🚀 Starting MedGemma Server")
 print(f"   Mode: {MODE.upper()}")
 print(f"   Device: {DEVICE}")
 print(f"   Port: {PORT}")
+print(f"   Inference Backend: {INFERENCE_BACKEND.upper()} (MEDGEMMA_BACKEND / INFERENCE_BACKEND, default REMOTE)")
 print(f"   PyTorch: {'Available' if TORCH_AVAILABLE else 'Not Available'}")
 print(f"   Cloud: {CLOUD_PROVIDER.upper() if CLOUD_AVAILABLE else 'Not Configured'}")
 
@@ -111,22 +163,58 @@ REPORT_TEMPLATES = {
     }
 }
 
+# Impressions that read as a normal study (real-model reports carry no structured finding)
+NORMAL_IMPRESSION = re.compile(
+    r'\b(normal|no acute|unremarkable|no significant abnormality|no abnormality)\b', re.IGNORECASE
+)
+
 def load_real_model():
     """Load real MedGemma model from Hugging Face"""
-    global MODEL, TOKENIZER
+    global MODEL, TOKENIZER, PROCESSOR, DEVICE
     try:
-        from transformers import AutoModelForCausalLM, AutoTokenizer
-        print("📥 Loading MedGemma model from Hugging Face...")
-        MODEL = AutoModelForCausalLM.from_pretrained("microsoft/llava-med-v1.5-mistral-7b")
-        TOKENIZER = AutoTokenizer.from_pretrained("microsoft/llava-med-v1.5-mistral-7b")
+        import torch
+        from transformers import AutoModelForCausalLM, AutoProcessor, AutoTokenizer
+        DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+        log.info('loading model', extra={'model_id': MODEL_ID, 'device': DEVICE})
+        MODEL = AutoModelForCausalLM.from_pretrained(MODEL_ID)
+        attach_mmap_weights(MODEL, MODEL_ID)
+        TOKENIZER = AutoTokenizer.from_pretrained(MODEL_ID)
+        try:
+            PROCESSOR = AutoProcessor.from_pretrained(MODEL_ID)
+        except Exception:
+            PROCESSOR = None  # Text-only prompting
         MODEL.to(DEVICE)
         MODEL.eval()
-        print("✅ Real AI model loaded successfully!")
+        log.info('model loaded', extra={'model_id': MODEL_ID})
         return True
-    except Exception as e:
-        print(f"❌ Failed to load real model: {e}")
+    except Exception:
+        log.exception('failed to load model', extra={'model_id': MODEL_ID})
         return False
 
+def load_models():
+    """Load whatever the configured mode needs (pre-fork servers call this in the master)"""
+    # Load the model only for local inference; the remote backend needs nothing local
+    if MODE == 'real' and INFERENCE_BACKEND == 'local' and TORCH_AVAILABLE:
+        READINESS.run('model', load_real_model)
+    else:
+        READINESS.skip('model', 'no local model in this configuration')
+
+def warm_up():
+    """Generate one report for a synthetic image (also fills the prefix cache for local models)"""
+    if not (MODE == 'demo' or use_local_model()):
+        READINESS.skip('warmup', 'inference runs upstream or no model is loaded')
+        return
+    image = PreparedImage.from_image(warmup_image())
+    READINESS.run('warmup', lambda: generate_report_for_image(image, png_bytes(image.rgb()), 'XR', {}, time.time()))
+
+def start_background_startup(load=True):
+    """Load (unless already loaded, e.g. pre-fork) and warm up on a background thread"""
+    def startup():
+        if load:
+            load_models()
+        warm_up()
+    return READINESS.start(startup)
+
 @app.route('/health', methods=['GET'])
 def health():
     model_status = 'loaded' if MODEL is not None else 'not loaded'
@@ -136,231 +224,495 @@ def health():
         'model': f'MedGemma ({MODE} mode)',
         'model_status': model_status,
         'device': DEVICE,
-        'gpu_available': TORCH_AVAILABLE and torch.cuda.is_available() if TORCH_AVAILABLE else False,
+        'inference_backend': INFERENCE_BACKEND,
+        'gpu_available': DEVICE == 'cuda',
         'cloud_provider': CLOUD_PROVIDER if CLOUD_AVAILABLE else 'none',
         'torch_available': TORCH_AVAILABLE,
-        'cloud_available': CLOUD_AVAILABLE
+        'cloud_available': CLOUD_AVAILABLE,
+        'cache': RESULT_CACHE.stats(),
+        'single_flight': REPORT_FLIGHTS.stats(),
+        'prefix_cache': PREFIX_CACHE.stats(),
+        'circuit_breaker': HF_BREAKER.stats(),
+        'profiling': PROFILER.stats(),
+        'load_simulation': LOAD_SIMULATOR.stats(),
+        'logging': logging_stats()
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until the model is loaded and warmed up"""
+    stats = READINESS.stats()
+    return jsonify(stats), 200 if stats['ready'] else 503
+
 @app.route('/generate-report', methods=['POST'])
 def generate_report():
     try:
-        data = request.json
-        image_b64 = data.get('image')
+        image_bytes, data = read_image_request()
         modality = data.get('modality', 'XR')
         patient_context = data.get('patientContext', {})
         classification = data.get('classification', None)  # Get classification from MedSigLIP
         slice_index = data.get('slice_index', 0)  # Get slice index from request
+        frame_index = data.get('frame_index', 0)  # Frame within a multi-frame DICOM upload
         
-        print(f"\n{'='*60}")
-        print(f"📥 MEDGEMMA REPORT REQUEST")
-        print(f"   Modality: {modality}")
-        print(f"   Slice Index: {slice_index}")
-        print(f"   Slice Index Type: {type(slice_index)}")
-        print(f"   Classification: {classification}")
-        print(f"{'='*60}\n")
-        
-        # Decode image (clean base64)
-        image_bytes = base64.b64decode(image_b64)
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        request_log.info('report request', extra={
+            'modality': modality, 'slice_index': slice_index, 'frame_index': frame_index,
+            'classification': classification
+        })
         
         start_time = time.time()
         
-        # Route to appropriate method based on MODE
-        if MODE == 'real' or MODE == 'cloud':
-            return generate_real_report(image, image_bytes, modality, patient_context, start_time)
-        else:
-            print(f"📝 Generating demo report, slice_index={slice_index}, classification={classification}")
-            return generate_demo_report(image, modality, patient_context, start_time, classification, slice_index)
-        
-        # Simulate processing time
-        time.sleep(1.0)
-        
-        # Extract patient info
-        age = patient_context.get('age', 'unknown')
-        sex = patient_context.get('sex', 'unknown')
-        history = patient_context.get('clinicalHistory', 'not provided')
-        indication = patient_context.get('indication', 'not specified')
-        
-        # Analyze image for demo with more sophisticated features
-        width, height = image.size
-        pixels = list(image.convert('L').getdata())
-        avg_brightness = sum(pixels) / len(pixels)
-        
-        # Calculate additional features for better differentiation
-        variance = sum((p - avg_brightness) ** 2 for p in pixels[:2000]) / 2000
-        
-        # Calculate histogram
-        histogram = [0] * 4
-        for p in pixels[::20]:  # Sample every 20th pixel
-            histogram[min(3, int(p / 64))] += 1
+        # Serve repeated frames straight from the cache
+        cache_key = make_cache_key(image_bytes, modality, slice_index, classification, patient_context, frame_index)
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            cached['processing_time'] = time.time() - start_time
+            cached['cached'] = True
+            request_log.info('report cache hit', extra={'slice_index': slice_index})
+            return jsonify(cached)
         
-        contrast = (histogram[3] - histogram[0]) / max(sum(histogram), 1)
+        # Byte-identical requests already in flight wait for that result instead
+        result, shared = REPORT_FLIGHTS.do(cache_key, lambda: generate_report_uncached(
+            image_bytes, modality, patient_context, classification, slice_index, frame_index, cache_key, start_time
+        ))
+        if shared:
+            result['processing_time'] = time.time() - start_time
+            result['coalesced'] = True
         
-        # More sophisticated determination
-        brightness_score = avg_brightness / 255.0
-        variance_score = min(variance / 5000.0, 1.0)
-        combined_score = (brightness_score * 0.5 + variance_score * 0.3 + abs(contrast) * 0.2)
+        return jsonify(result)
         
-        # Determine if "normal" or "abnormal" based on combined features
-        is_normal = combined_score > 0.55
-        
-        # Get template
-        modality_key = modality if modality in REPORT_TEMPLATES else 'XR'
-        template = REPORT_TEMPLATES[modality_key]['normal' if is_normal else 'abnormal']
-        
-        # Generate report
-        if is_normal:
-            findings = f"""TECHNIQUE:
-{modality} imaging was performed according to standard protocol.
-
-CLINICAL HISTORY:
-{history}
-
-FINDINGS:
-{template['findings']}
-
-Image quality is adequate for diagnostic interpretation."""
-
-            impression = template['impression']
-            recommendations = ['No follow-up needed', 'Clinical correlation as needed']
-            
-        else:
-            # Generate "abnormal" findings with variations based on image features
-            locations = ['right upper lobe', 'left lower lobe', 'right middle lobe', 'bilateral bases', 'left upper lobe', 'right lower lobe']
-            findings_list = ['consolidation', 'opacity', 'nodule', 'infiltrate', 'atelectasis', 'pleural thickening']
-            cardiac_statuses = ['normal in size', 'mildly enlarged', 'within normal limits', 'borderline enlarged']
-            
-            # Use image features to select findings (more deterministic but varied)
-            location_idx = int((avg_brightness % 60) / 10)
-            finding_idx = int((variance % 600) / 100)
-            cardiac_idx = int((contrast * 100) % 4)
-            
-            location = locations[min(location_idx, len(locations) - 1)]
-            finding = findings_list[min(finding_idx, len(findings_list) - 1)]
-            cardiac = cardiac_statuses[min(cardiac_idx, len(cardiac_statuses) - 1)]
-            
-            findings = f"""TECHNIQUE:
-{modality} imaging was performed according to standard protocol.
-
-CLINICAL HISTORY:
-{history}
-
-FINDINGS:
-{template['findings'].format(
-    location=location,
-    finding=finding,
-    cardiac_status=cardiac,
-    additional_findings='No pleural effusion or pneumothorax identified.'
-)}
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception('generate report failed')
+        return jsonify({'error': str(e)}), 500
 
-Image quality is adequate for diagnostic interpretation."""
+@app.route('/generate-report/stream', methods=['POST'])
+def generate_report_stream():
+    """Stream a report as Server-Sent Events
 
-            impression = template['impression'].format(finding=finding.capitalize())
-            recommendations = [
-                'Clinical correlation recommended',
-                'Consider follow-up imaging in 4-6 weeks',
-                'Radiologist review required'
-            ]
-        
-        processing_time = time.time() - start_time
+    Events: 'start', 'token' ({'text'}), 'section_start' ({'section'}),
+    'section_end' ({'section', 'text'}) as soon as each FINDINGS /
+    IMPRESSION / RECOMMENDATIONS boundary is seen, then 'report' with the
+    same body /generate-report returns. Tokens come straight from the local
+    model; other modes stream their finished report section by section.
+    """
+    try:
+        image_bytes, data = read_image_request()
+        modality = data.get('modality', 'XR')
+        patient_context = data.get('patientContext', {})
+        classification = data.get('classification', None)
+        slice_index = data.get('slice_index', 0)
+        frame_index = data.get('frame_index', 0)
         
-        return jsonify({
-            'findings': findings,
-            'impression': impression,
-            'recommendations': recommendations,
-            'processing_time': processing_time,
-            'confidence': 0.78 if is_normal else 0.72,
-            'demo_mode': True,
-            'patient_age': age,
-            'patient_sex': sex,
-            'modality': modality
+        request_log.info('streaming report request', extra={
+            'modality': modality, 'slice_index': slice_index, 'classification': classification
         })
         
+        start_time = time.time()
+        cache_key = make_cache_key(image_bytes, modality, slice_index, classification, patient_context, frame_index)
+        image = PreparedImage.from_bytes(image_bytes, frame_index, modality)
+        
+        records = report_stream_records(
+            image, image_bytes, modality, patient_context, classification, slice_index, cache_key, start_time
+        )
+        return stream_response(records, 'sse')
+        
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Error in generate_report: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('streaming report failed')
         return jsonify({'error': str(e)}), 500
 
+def report_stream_records(image, image_bytes, modality, patient_context, classification, slice_index, cache_key, start_time):
+    """(event, payload) records for one streamed report"""
+    cached = RESULT_CACHE.get(cache_key)
+    local = cached is None and use_local_model()
+    yield 'start', {'modality': modality, 'mode': MODE, 'streaming': 'tokens' if local else 'sections'}
+    
+    if local:
+        events = iter_report_events(local_token_stream(image, modality, patient_context))
+        first_token_time = None
+        try:
+            while True:
+                try:
+                    event, payload = next(events)
+                except StopIteration as done:
+                    generated_text = done.value
+                    break
+                if first_token_time is None and event == 'token':
+                    first_token_time = time.time() - start_time
+                yield event, payload
+        except Exception as e:
+            # Same demo fallback as the non-streaming path; its sections follow any partial tokens
+            result = real_report_failed(e, image, modality, patient_context, start_time)
+            for record in report_section_records(result):
+                yield record
+        else:
+            result = build_real_report(generated_text, modality, patient_context, start_time)
+            result['time_to_first_token'] = first_token_time
+            RESULT_CACHE.put(cache_key, result)
+    else:
+        if cached is not None:
+            cached['cached'] = True
+            result = cached
+        else:
+            result = generate_report_for_image(
+                image, image_bytes, modality, patient_context, start_time, classification, slice_index
+            )
+        if cached is None and (MODE == 'demo' or not result.get('demo_mode')):
+            RESULT_CACHE.put(cache_key, result)
+        for record in report_section_records(result):
+            yield record
+    
+    result['processing_time'] = time.time() - start_time
+    request_log.info('streamed report', extra={'processing_time': result['processing_time']})
+    yield 'report', result
+
+def report_section_records(result):
+    """Token and section records replaying an already finished report"""
+    sections = (
+        ('findings', result.get('findings', '')),
+        ('impression', result.get('impression', '')),
+        ('recommendations', '\n'.join(result.get('recommendations', [])))
+    )
+    for name, text in sections:
+        yield 'section_start', {'section': name}
+        for chunk in split_for_streaming(text):
+            yield 'token', {'text': chunk}
+        yield 'section_end', {'section': name, 'text': text}
+
 @app.route('/', methods=['GET'])
 def index():
     return jsonify({
         'service': 'MedGemma Report Generation Service',
-        'version': '1.0.0-demo',
+        'version': SERVICE_VERSION,
         'endpoints': {
             '/health': 'GET - Check service health',
-            '/generate-report': 'POST - Generate radiology report'
+            '/metrics': 'GET - Prometheus metrics',
+            '/ready': 'GET - Readiness and warm-up progress (503 while warming)',
+            '/generate-report': 'POST - Generate radiology report (base64 JSON, octet-stream or multipart)',
+            '/generate-report/stream': 'POST - Same inputs; streams tokens and section events as SSE',
+            '/generate-report-series': 'POST - Generate reports for every frame of a multi-frame DICOM or frame list (?stream=ndjson|sse to stream per frame)'
         }
     })
 
-def generate_real_report(image, image_bytes, modality, patient_context, start_time):
-    """Generate report using real AI (Hugging Face API)"""
+@app.route('/generate-report-series', methods=['POST'])
+def generate_report_series():
+    """Generate a report for every (sampled) frame of a series uploaded in one request
+
+    With ?stream=ndjson|sse (or a matching Accept header) each report is
+    flushed as soon as it is generated, followed by a summary record.
+    """
     try:
-        import requests
+        payloads, data = read_series_request()
+        modality = data.get('modality', 'XR')
+        patient_context = data.get('patientContext', {})
+        sample_rate = data['sample_rate']  # Validated by read_series_request
+        # Per-frame MedSigLIP labels: list in analyzed-frame order or {slice_index: label}
+        classifications = data['classifications']
+        stream_format = requested_stream_format(data)
         
-        # Use LLaVA-Med or similar vision-language model
-        API_URL = "https://api-inference.huggingface.co/models/microsoft/llava-med-v1.5-mistral-7b"
-        headers = {"Authorization": f"Bearer {os.getenv('HUGGINGFACE_TOKEN', '')}"}
+        request_log.info('series report request', extra={
+            'modality': modality, 'payloads': len(payloads), 'sample_rate': sample_rate, 'stream': stream_format
+        })
         
-        # Prepare prompt
-        age = patient_context.get('age', 'unknown')
-        sex = patient_context.get('sex', 'unknown')
-        history = patient_context.get('clinicalHistory', 'not provided')
+        records = report_series_records(payloads, modality, patient_context, sample_rate, classifications)
+        if stream_format:
+            return stream_response(records, stream_format)
+        return jsonify(collect_records(records))
         
-        prompt = f"""Generate a radiology report for this {modality} image.
-Patient: {age} year old {sex}
-Clinical History: {history}
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception('series report failed')
+        return jsonify({'error': str(e)}), 500
+
+def report_series_records(payloads, modality, patient_context, sample_rate, classifications):
+    """Yield ('frame', report) per frame, then one ('summary', ...) record"""
+    start_time = time.time()
+    
+    # Frames are decoded and analyzed a batch at a time
+    count = 0
+    summary = SeriesSummary(normal_labels=('normal', 'no findings', 'clear'))
+    for frames in iter_series_batches(payloads, modality, sample_rate):
+        if MODE == 'demo':
+            features_list = extract_features_batch([frame.gray for frame in frames], gradients=False)
+        else:
+            features_list = [None] * len(frames)
+        
+        for frame, features in zip(frames, features_list):
+            classification = frame_classification(classifications, count, frame.slice_index)
+            frame_start = time.time()
+            if MODE == 'real' or MODE == 'cloud':
+                report = generate_real_report(frame.image, None, modality, patient_context, frame_start)
+            else:
+                report = generate_demo_report(
+                    None, modality, patient_context, frame_start,
+                    classification, frame.slice_index, features=features
+                )
+            report['slice_index'] = frame.slice_index
+            report['classification'] = classification
+            # Unlabeled frames are summarized by what their own report found
+            summary.add(frame.slice_index, classification or report_label(report), report.get('confidence', 0.0))
+            count += 1
+            yield 'frame', report
+    
+    processing_time = time.time() - start_time
+    
+    request_log.info('series reports generated', extra={'frames': count, 'processing_time': processing_time})
+    
+    yield 'summary', {
+        'summary': summary.to_dict(),
+        'count': count,
+        'modality': modality,
+        'mode': MODE,
+        'processing_time': processing_time,
+        'frames_per_second': count / processing_time if processing_time > 0 else None
+    }
+
+def report_label(report):
+    """Label a report by its own finding (demo reports) or, failing that, its impression"""
+    if report.get('finding'):
+        return report['finding']
+    impression = report.get('impression') or ''
+    return 'normal' if NORMAL_IMPRESSION.search(impression) else 'abnormal'
+
+def frame_classification(classifications, position, slice_index):
+    """Look up the MedSigLIP label supplied for a series frame, if any"""
+    if isinstance(classifications, list):
+        return classifications[position] if position < len(classifications) else None
+    return classifications.get(str(slice_index), classifications.get(slice_index))
+
+def make_cache_key(image_bytes, modality, slice_index, classification, patient_context, frame_index=0):
+    """Cache key for one report request"""
+    return ResultCache.make_key(
+        image_bytes,
+        modality=modality,
+        slice_index=slice_index,
+        frame_index=frame_index,
+        classification=classification,
+        patient_context=patient_context,
+        mode=MODE,
+        model_version=MODEL_VERSION
+    )
+
+def generate_report_uncached(image_bytes, modality, patient_context, classification, slice_index,
+                             frame_index, cache_key, start_time):
+    """Decode, generate and cache one report (cache miss path)"""
+    image = PreparedImage.from_bytes(image_bytes, frame_index, modality)
+    result = generate_report_for_image(
+        image, image_bytes, modality, patient_context, start_time, classification, slice_index
+    )
+    
+    # Only cache real reports in real/cloud mode, never their demo fallbacks
+    if MODE == 'demo' or not result.get('demo_mode'):
+        RESULT_CACHE.put(cache_key, result)
+    return result
+
+def generate_report_for_image(image, image_bytes, modality, patient_context, start_time,
+                              classification=None, slice_index=0, features=None):
+    """Generate a report for one PreparedImage with the configured path (real/cloud or demo)"""
+    if MODE == 'real' or MODE == 'cloud':
+        return generate_real_report(image, image_bytes, modality, patient_context, start_time)
+    return generate_demo_report(
+        image, modality, patient_context, start_time, classification, slice_index, features=features
+    )
+
+def use_local_model():
+    """True when reports come from the locally loaded model"""
+    return MODE == 'real' and INFERENCE_BACKEND == 'local' and MODEL is not None
+
+def build_report_prompt_parts(modality, patient_context):
+    """(prefix, suffix) of the report prompt
+
+    The prefix depends only on the modality, so its attention state can be
+    computed once and reused (PREFIX_CACHE); per-patient fields go last.
+    """
+    age = patient_context.get('age', 'unknown')
+    sex = patient_context.get('sex', 'unknown')
+    history = patient_context.get('clinicalHistory', 'not provided')
+    
+    prefix = f"""Generate a radiology report for this {modality} image.
 
 Please provide:
 1. FINDINGS: Detailed description of what you see
 2. IMPRESSION: Summary and diagnosis
 3. RECOMMENDATIONS: Follow-up suggestions
 
-Format as a professional radiology report."""
-        
-        # Convert image to base64
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_b64 = base64.b64encode(img_byte_arr.getvalue()).decode()
+Format as a professional radiology report.
+
+"""
+    suffix = f"""Patient: {age} year old {sex}
+Clinical History: {history}
+"""
+    return prefix, suffix
+
+def build_report_prompt(modality, patient_context):
+    """Report instruction prompt for one request"""
+    prefix, suffix = build_report_prompt_parts(modality, patient_context)
+    return prefix + suffix
+
+def compute_prefix_state(prefix):
+    """Prefill a prompt prefix once: (input_ids, past_key_values)"""
+    import torch
+    input_ids = TOKENIZER(prefix, return_tensors='pt').input_ids.to(DEVICE)
+    with torch.inference_mode():
+        outputs = MODEL(input_ids=input_ids, use_cache=True)
+    return input_ids, outputs.past_key_values
+
+def build_generation_inputs(image, modality, patient_context):
+    """generate() kwargs for one report, reusing the cached prefix state when enabled
+
+    The prompt is tokenized as prefix + suffix so the prefix tokens are
+    identical across requests; generate() then only prefills the suffix
+    and image tokens on top of the cached past_key_values.
+    """
+    import torch
+    prefix, suffix = build_report_prompt_parts(modality, patient_context)
+    inputs = {}
+    if PROCESSOR is not None:
+        suffix = f"{getattr(PROCESSOR, 'image_token', '<image>')}\n{suffix}"
+        inputs['pixel_values'] = PROCESSOR.image_processor(image.rgb(MODEL_IMAGE_SIDE), return_tensors='pt').pixel_values.to(DEVICE)
+    
+    if PREFIX_CACHE.enabled:
+        entry = PREFIX_CACHE.get_or_compute(prefix, lambda: compute_prefix_state(prefix))
+        prefix_ids = entry.input_ids
+        inputs['past_key_values'] = entry.fork()
+    else:
+        prefix_ids = TOKENIZER(prefix, return_tensors='pt').input_ids.to(DEVICE)
+    
+    suffix_ids = TOKENIZER(suffix, return_tensors='pt', add_special_tokens=False).input_ids.to(DEVICE)
+    input_ids = torch.cat([prefix_ids, suffix_ids], dim=-1)
+    inputs['input_ids'] = input_ids
+    inputs['attention_mask'] = torch.ones_like(input_ids)
+    return inputs
+
+def local_token_stream(image, modality, patient_context):
+    """Yield decoded text chunks from the local model as they are generated
+
+    generate() runs in a background thread feeding a TextIteratorStreamer;
+    if the consumer stops early (client disconnect) generation is halted at
+    the next token. If generate() raises, the stream is ended and the error
+    is re-raised here so callers fall back as for any other model failure.
+    """
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+    
+    class StopWhenSet(StoppingCriteria):
+        def __init__(self, event):
+            self.event = event
         
-        payload = {
-            "inputs": {
-                "image": img_b64,
-                "text": prompt
-            }
+        def __call__(self, input_ids, scores, **kwargs):
+            return self.event.is_set()
+    
+    inputs = build_generation_inputs(image, modality, patient_context)
+    
+    stop = threading.Event()
+    streamer = TextIteratorStreamer(TOKENIZER, skip_prompt=True, skip_special_tokens=True)
+    failure = []
+
+    def generate(**kwargs):
+        try:
+            MODEL.generate(**kwargs)
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            streamer.end()  # Unblocks the consumer; a second end() after a normal finish is harmless
+
+    generation = threading.Thread(
+        target=generate,
+        kwargs={
+            **inputs,
+            'streamer': streamer,
+            'max_new_tokens': MAX_NEW_TOKENS,
+            'do_sample': False,
+            'stopping_criteria': StoppingCriteriaList([StopWhenSet(stop)])
+        },
+        daemon=True
+    )
+    generation.start()
+    try:
+        for text in streamer:
+            yield text
+    finally:
+        stop.set()
+    if failure:
+        raise failure[0]
+
+@timed('inference')
+def generate_local_report(image, modality, patient_context, start_time):
+    """Generate a report with the local model (non-streaming)"""
+    generated_text = ''.join(local_token_stream(image, modality, patient_context))
+    return build_real_report(generated_text, modality, patient_context, start_time)
+
+@timed('render')
+def build_real_report(generated_text, modality, patient_context, start_time):
+    """Response body for a model-generated report"""
+    findings, impression, recommendations = parse_generated_report(generated_text)
+    return {
+        'findings': findings,
+        'impression': impression,
+        'recommendations': recommendations,
+        'processing_time': time.time() - start_time,
+        'confidence': 0.85,
+        'demo_mode': False,
+        'model': 'LLaVA-Med (Real AI)',
+        'patient_age': patient_context.get('age', 'unknown'),
+        'patient_sex': patient_context.get('sex', 'unknown'),
+        'modality': modality
+    }
+
+def generate_real_report(image, image_bytes, modality, patient_context, start_time):
+    """Generate report using real AI (local model when loaded, otherwise Hugging Face API)"""
+    if use_local_model():
+        try:
+            return generate_local_report(image, modality, patient_context, start_time)
+        except Exception as e:
+            return real_report_failed(e, image, modality, patient_context, start_time)
+    
+    return call_remote(
+        lambda: remote_report_call(image, modality, patient_context),
+        lambda response: parse_remote_report(response, image, modality, patient_context, start_time),
+        lambda error: real_report_failed(error, image, modality, patient_context, start_time),
+        breaker=HF_BREAKER
+    )
+
+def remote_report_call(image, modality, patient_context):
+    """Prepared Hugging Face Inference API request for one report"""
+    # Use LLaVA-Med or similar vision-language model
+    prompt = build_report_prompt(modality, patient_context)
+    
+    # Convert image to base64
+    img_byte_arr = io.BytesIO()
+    image.rgb().save(img_byte_arr, format='PNG')
+    img_b64 = base64.b64encode(img_byte_arr.getvalue()).decode()
+    
+    payload = {
+        "inputs": {
+            "image": img_b64,
+            "text": prompt
         }
+    }
+    return UpstreamCall(f"{HF_API_URL}/{MODEL_ID}", timeout=60, headers=hf_headers(), json=payload)
+
+def parse_remote_report(response, image, modality, patient_context, start_time):
+    """Report from a Hugging Face API response, or the demo fallback"""
+    if response.status_code == 200:
+        result = response.json()
+        generated_text = result.get('generated_text', '') if isinstance(result, dict) else str(result)
         
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=60)
-        
-        if response.status_code == 200:
-            result = response.json()
-            generated_text = result.get('generated_text', '') if isinstance(result, dict) else str(result)
-            
-            # Parse the generated report
-            findings, impression, recommendations = parse_generated_report(generated_text)
-            
-            processing_time = time.time() - start_time
-            
-            return jsonify({
-                'findings': findings,
-                'impression': impression,
-                'recommendations': recommendations,
-                'processing_time': processing_time,
-                'confidence': 0.85,
-                'demo_mode': False,
-                'model': 'LLaVA-Med (Real AI)',
-                'patient_age': age,
-                'patient_sex': sex,
-                'modality': modality
-            })
-        else:
-            print(f"Hugging Face API error: {response.status_code}")
-            return generate_demo_report(image, modality, patient_context, start_time)
-            
-    except Exception as e:
-        print(f"Real AI report generation failed: {e}")
-        return generate_demo_report(image, modality, patient_context, start_time)
+        # Parse the generated report
+        return build_real_report(generated_text, modality, patient_context, start_time)
+    
+    log.warning('hugging face api failed - falling back to demo report', extra={'status': response.status_code})
+    count_fallback('medgemma', 'upstream_status')
+    return generate_demo_report(image, modality, patient_context, start_time)
+
+def real_report_failed(error, image, modality, patient_context, start_time):
+    """Demo fallback when real report generation raised"""
+    log.warning('real report generation failed - falling back to demo report', extra={'error': str(error)},
+                exc_info=None if isinstance(error, BreakerOpen) else error)
+    count_fallback('medgemma', 'model_error' if use_local_model() else fallback_reason(error))
+    return generate_demo_report(image, modality, patient_context, start_time)
 
 def parse_generated_report(text):
     """Parse AI-generated report into sections"""
@@ -387,10 +739,9 @@ def parse_generated_report(text):
     
     return findings, impression, recommendations
 
-def generate_demo_report(image, modality, patient_context, start_time, classification=None, slice_index=0):
+@timed('render')
+def generate_demo_report(image, modality, patient_context, start_time, classification=None, slice_index=0, features=None):
     """Generate demo report with slice variation"""
-    time.sleep(0.5)  # Faster for demo
-    
     age = patient_context.get('age', 'unknown')
     sex = patient_context.get('sex', 'unknown')
     history = patient_context.get('clinicalHistory', 'not provided')
@@ -399,15 +750,12 @@ def generate_demo_report(image, modality, patient_context, start_time, classific
     if slice_index is None:
         slice_index = 0
     
-    # Analyze image
-    width, height = image.size
-    pixels = list(image.convert('L').getdata())
-    avg_brightness = sum(pixels) / len(pixels)
-    variance = sum((p - avg_brightness) ** 2 for p in pixels[:2000]) / 2000
-    
-    histogram = [0] * 4
-    for p in pixels[::20]:
-        histogram[min(3, int(p / 64))] += 1
+    # Analyze image (series callers pass features precomputed for the batch)
+    if features is None:
+        features = image.features(gradients=False)
+    avg_brightness = features['brightness']
+    variance = features['sample_variance']
+    histogram = features['quartile_histogram']
     
     contrast = (histogram[3] - histogram[0]) / max(sum(histogram), 1)
     brightness_score = avg_brightness / 255.0
@@ -482,6 +830,18 @@ Image quality is adequate for diagnostic interpretation."""
             ]
         
         cardiac_statuses = ['normal', 'mildly enlarged', 'within normal limits', 'borderline']
+        # CT, MR and US templates also describe the finding's size and appearance
+        sizes = ['5 mm', '8 mm', '1.2 cm', '1.5 cm', '2.1 cm', '3 cm']
+        densities = ['hypodense', 'hyperdense', 'isodense', 'heterogeneous']
+        characteristics_list = [
+            'Margins are well circumscribed.', 'Margins are ill-defined.',
+            'There is mild surrounding edema.', 'No internal calcification is seen.',
+            'Appearance is similar on adjacent slices.'
+        ]
+        follow_ups = [
+            'follow-up imaging in 3 months', 'contrast-enhanced imaging',
+            'comparison with prior studies', 'specialist consultation'
+        ]
         
         # Use slice index as PRIMARY variation (add 1 to avoid 0)
         slice_seed = slice_index + 1
@@ -492,6 +852,10 @@ Image quality is adequate for diagnostic interpretation."""
         location = locations[location_idx]
         finding = findings_list[finding_idx]
         cardiac = cardiac_statuses[cardiac_idx]
+        size = sizes[(slice_seed * 3 + location_idx) % len(sizes)]
+        density = densities[(slice_seed + finding_idx) % len(densities)]
+        characteristics = characteristics_list[(slice_seed * 2 + finding_idx) % len(characteristics_list)]
+        follow_up = follow_ups[(slice_seed + location_idx) % len(follow_ups)]
         
         findings = f"""TECHNIQUE:
 {modality} imaging was performed.
@@ -500,11 +864,11 @@ CLINICAL HISTORY:
 {history}
 
 FINDINGS:
-Slice {slice_index}: {template['findings'].format(location=location, finding=finding, cardiac_status=cardiac, additional_findings=f'No other acute findings on this slice.')}
+Slice {slice_index}: {template['findings'].format(location=location, finding=finding, cardiac_status=cardiac, additional_findings=f'No other acute findings on this slice.', size=size, density=density, characteristics=characteristics)}
 
 Additional observations: Image demonstrates {finding} pattern in the {location}."""
         
-        impression = f"Slice {slice_index}: {template['impression'].format(finding=finding.capitalize())}"
+        impression = f"Slice {slice_index}: {template['impression'].format(finding=finding.capitalize(), recommendation=follow_up)}"
         recommendations = [
             f'Radiologist review of slice {slice_index} recommended',
             'Clinical correlation advised',
@@ -513,15 +877,12 @@ Additional observations: Image demonstrates {finding} pattern in the {location}.
     
     processing_time = time.time() - start_time
     
-    print(f"\n{'='*60}")
-    print(f"📝 MEDGEMMA RESULT")
-    print(f"   Slice {slice_index}: Generated {'normal' if is_normal else 'abnormal'} report")
-    print(f"   Slice Factor: {slice_factor:.3f}")
-    print(f"   Combined Score: {combined_score:.3f}")
-    print(f"   Finding: {finding if not is_normal else 'Normal'}")
-    print(f"{'='*60}\n")
+    request_log.debug('demo report', extra={
+        'slice_index': slice_index, 'normal': is_normal, 'slice_factor': slice_factor,
+        'combined_score': combined_score, 'finding': finding if not is_normal else 'Normal'
+    })
     
-    return jsonify({
+    return {
         'findings': findings,
         'impression': impression,
         'recommendations': recommendations,
@@ -531,16 +892,21 @@ Additional observations: Image demonstrates {finding} pattern in the {location}.
         'patient_age': age,
         'patient_sex': sex,
         'modality': modality,
-        'slice_index': slice_index
-    })
+        'slice_index': slice_index,
+        'finding': 'normal' if is_normal else finding
+    }
 
 if __name__ == '__main__':
+    # Load in the background so the port is open (and /ready reports progress) right away
+    start_background_startup()
+    
     print(f"\n✅ MedGemma Server running on http://localhost:{PORT}")
     print(f"   Mode: {MODE.upper()}")
     print(f"   Test with: curl http://localhost:{PORT}/health\n")
     
     if MODE == 'demo':
         print("⚠️  DEMO MODE: Using template-based reports (not real AI)")
-        print("   To enable real AI: Set AI_MODE=real or AI_MODE=cloud\n")
+        print("   To enable real AI: Set AI_MODE=real or AI_MODE=cloud")
+        print("   For token streaming from a local model: also set MEDGEMMA_BACKEND=local\n")
     
     app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
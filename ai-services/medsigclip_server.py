@@ -5,94 +5,157 @@ Supports: Real AI Models, Cloud APIs, and Enhanced Demo Mode
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from PIL import Image
 import io
-import base64
+import logging
 import time
 import os
+import threading
 import numpy as np
 
+from image_features import extract_features_batch
+from result_cache import ResultCache
+from request_io import RequestError, image_from_json, read_image_request
+from dicom_io import is_dicom, png_bytes
+from preprocess import PreparedImage
+from series import SeriesFrame, SeriesSummary, iter_series_batches, read_series_request
+from streaming import collect_records, requested_stream_format, stream_response
+from load_simulation import LoadSimulator
+from profiling_hook import RequestProfiler
+from structured_logging import get_request_logger, install_request_ids, logging_stats, setup_logging
+from metrics import count_fallback, fallback_reason, instrument_app, register_queue, stage, timed
+from upstream import HF_API_URL, UpstreamCall, call_remote, hf_headers
+from circuit_breaker import BreakerOpen, CircuitBreaker
+from single_flight import SingleFlight
+from shared_weights import attach_mmap_weights
+from startup import CLOUD_SDK_MODULES, Readiness, cloud_sdk_available, module_available, warmup_image
+from micro_batcher import MicroBatcher
+from label_index import DEFAULT_INDEX_PATH, LabelIndex, label_prompts, labels_for, normalize, vocabulary_key
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# JSON logs written by a background thread; hot-path request logs sampled (LOG_SAMPLE)
+setup_logging()
+install_request_ids(app)
+log = logging.getLogger('medsigclip')
+request_log = get_request_logger('medsigclip')
+
 # Configuration
 PORT = int(os.getenv('PORT', 5001))
 MODE = os.getenv('AI_MODE', 'demo')  # 'real', 'cloud', or 'demo'
 CLOUD_PROVIDER = os.getenv('CLOUD_PROVIDER', 'none')  # 'google', 'aws', 'azure', or 'none'
+# Real mode: 'local' BiomedCLIP or 'remote' HF API. MEDSIGCLIP_BACKEND, else the shared
+# INFERENCE_BACKEND, else 'local' (MedGemma defaults to 'remote'; see its MEDGEMMA_BACKEND)
+INFERENCE_BACKEND = os.getenv('MEDSIGCLIP_BACKEND') or os.getenv('INFERENCE_BACKEND') or 'local'
+MODEL_ID = "microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224"
+SERVICE_VERSION = '1.0.0-demo'
+MODEL_VERSION = f"{MODEL_ID}@{SERVICE_VERSION}"  # Part of the result cache key
 
-# Try to import deep learning libraries
-try:
-    import torch
-    import torchvision.transforms as transforms
-    DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
-    TORCH_AVAILABLE = True
-except ImportError:
-    DEVICE = 'cpu'
-    TORCH_AVAILABLE = False
+# Content-addressed cache of classification results
+RESULT_CACHE = ResultCache.from_env()
+
+# Concurrent byte-identical requests share one computation
+CLASSIFY_FLIGHTS = SingleFlight.from_env('classify')
+
+# Per-stage latency, in-flight and fallback metrics on /metrics
+instrument_app(app, 'medsigclip', MODE)
+
+# Optional injected latency/errors for capacity testing (LOAD_SIMULATION)
+LOAD_SIMULATOR = LoadSimulator.from_env()
+LOAD_SIMULATOR.install(app)
+
+# On-demand cProfile of single requests into a bounded ring (PROFILE_TOKEN)
+PROFILER = RequestProfiler.from_env('medsigclip')
+PROFILER.install(app)
+
+# Fail fast to the fallback while the Hugging Face endpoint is unhealthy
+HF_BREAKER = CircuitBreaker.from_env(f"huggingface:{MODEL_ID}")
+
+# Model load and warm-up progress for /ready
+READINESS = Readiness('medsigclip')
+
+# Deep learning libraries are probed without importing them (seconds of startup);
+# load_real_model() imports them and resolves the device
+TORCH_AVAILABLE = module_available('torch')
+DEVICE = 'cpu'
+if not TORCH_AVAILABLE:
     print("⚠️  PyTorch not installed - real AI mode unavailable")
 
-# Try to import cloud SDKs
-CLOUD_AVAILABLE = False
-try:
-    if CLOUD_PROVIDER == 'google':
-        from google.cloud import healthcare_v1
-        CLOUD_AVAILABLE = True
-    elif CLOUD_PROVIDER == 'aws':
-        import boto3
-        CLOUD_AVAILABLE = True
-    elif CLOUD_PROVIDER == 'azure':
-        from azure.ai.vision import ImageAnalysisClient
-        CLOUD_AVAILABLE = True
-except ImportError:
+# Cloud SDKs are only probed here; the cloud code paths import what they use
+CLOUD_AVAILABLE = cloud_sdk_available(CLOUD_PROVIDER)
+if CLOUD_PROVIDER in CLOUD_SDK_MODULES and not CLOUD_AVAILABLE:
     print(f"⚠️  Cloud SDK for {CLOUD_PROVIDER} not installed")
 
 # Global model variable
 MODEL = None
 TRANSFORM = None
+TOKENIZER = None
+
+# Pyramid level handed to TRANSFORM: twice its 224 px crop, so its bicubic resize still has full detail
+MODEL_IMAGE_SIDE = 448
+
+# Label text embeddings: memory-mapped prebuilt index (python label_index.py build),
+# otherwise computed once per modality in-process
+LABEL_INDEX = LabelIndex.load(os.getenv('LABEL_INDEX_PATH', DEFAULT_INDEX_PATH), MODEL_ID)
+LABEL_EMBEDDINGS = {}
+LABEL_EMBEDDINGS_LOCK = threading.Lock()
 
 print(f"🚀 Starting MedSigLIP Server")
 print(f"   Mode: {MODE.upper()}")
 print(f"   Device: {DEVICE}")
 print(f"   Port: {PORT}")
 print(f"   PyTorch: {'Available' if TORCH_AVAILABLE else 'Not Available'}")
+print(f"   Inference Backend: {INFERENCE_BACKEND.upper()} (MEDSIGCLIP_BACKEND / INFERENCE_BACKEND, default LOCAL)")
+print(f"   Label Index: {'Loaded' if LABEL_INDEX is not None else 'Not Built'}")
 print(f"   Cloud: {CLOUD_PROVIDER.upper() if CLOUD_AVAILABLE else 'Not Configured'}")
 
 def load_real_model():
-    """Load real MedSigLIP model from Hugging Face"""
-    global MODEL, TRANSFORM
+    """Load real MedSigLIP (BiomedCLIP) model from Hugging Face for local inference"""
+    global MODEL, TRANSFORM, TOKENIZER, DEVICE
     try:
-        from transformers import AutoModel, AutoProcessor
-        print("📥 Loading MedSigLIP model from Hugging Face...")
-        MODEL = AutoModel.from_pretrained("microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224")
-        TRANSFORM = AutoProcessor.from_pretrained("microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224")
+        # BiomedCLIP is published as an open_clip checkpoint
+        import open_clip
+        import torch
+        DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+        log.info('loading model', extra={'model_id': MODEL_ID, 'device': DEVICE})
+        MODEL, TRANSFORM = open_clip.create_model_from_pretrained(f"hf-hub:{MODEL_ID}")
+        TOKENIZER = open_clip.get_tokenizer(f"hf-hub:{MODEL_ID}")
+        attach_mmap_weights(MODEL, MODEL_ID)
         MODEL.to(DEVICE)
         MODEL.eval()
-        print("✅ Real AI model loaded successfully!")
+        log.info('model loaded', extra={'model_id': MODEL_ID})
         return True
-    except Exception as e:
-        print(f"❌ Failed to load real model: {e}")
+    except Exception:
+        log.exception('failed to load model', extra={'model_id': MODEL_ID})
         return False
 
+def load_models():
+    """Load whatever the configured mode needs (pre-fork servers call this in the master)"""
+    # Try to load real model if in real mode with local inference
+    if MODE == 'real' and INFERENCE_BACKEND == 'local' and TORCH_AVAILABLE:
+        READINESS.run('model', load_real_model)
+    else:
+        READINESS.skip('model', 'no local model in this configuration')
+
+def warm_up():
+    """Classify a synthetic image once so the first request doesn't pay for lazy initialization"""
+    if not (MODE == 'demo' or (MODE == 'real' and MODEL is not None)):
+        READINESS.skip('warmup', 'inference runs upstream or no model is loaded')
+        return
+    image = PreparedImage.from_image(warmup_image())
+    READINESS.run('warmup', lambda: classify_image(image, png_bytes(image.rgb()), 'XR'))
+
+def start_background_startup(load=True):
+    """Load (unless already loaded, e.g. pre-fork) and warm up on a background thread"""
+    def startup():
+        if load:
+            load_models()
+        warm_up()
+    return READINESS.start(startup)
+
 def analyze_image_features(image):
-    """Enhanced image analysis for better demo mode"""
-    # Convert to numpy array
-    img_array = np.array(image.convert('L'))
-    
-    # Calculate comprehensive features
-    features = {
-        'brightness': float(np.mean(img_array)),
-        'contrast': float(np.std(img_array)),
-        'entropy': float(-np.sum(np.histogram(img_array, bins=256)[0] * np.log2(np.histogram(img_array, bins=256)[0] + 1e-10))),
-        'edges': float(np.mean(np.abs(np.gradient(img_array.astype(float))[0]))),
-        'texture': float(np.std(np.gradient(img_array.astype(float))[0])),
-    }
-    
-    # Histogram analysis
-    hist, _ = np.histogram(img_array, bins=256, range=(0, 256))
-    features['hist_peak'] = float(np.argmax(hist))
-    features['hist_spread'] = float(np.std(np.where(hist > 0)[0]))
-    
-    return features
+    """Enhanced image analysis for better demo mode (on the image's reduced grayscale level)"""
+    return image.features()
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -103,179 +166,476 @@ def health():
         'model': f'MedSigLIP ({MODE} mode)',
         'model_status': model_status,
         'device': DEVICE,
-        'gpu_available': TORCH_AVAILABLE and torch.cuda.is_available() if TORCH_AVAILABLE else False,
+        'gpu_available': DEVICE == 'cuda',
         'cloud_provider': CLOUD_PROVIDER if CLOUD_AVAILABLE else 'none',
         'torch_available': TORCH_AVAILABLE,
-        'cloud_available': CLOUD_AVAILABLE
+        'cloud_available': CLOUD_AVAILABLE,
+        'inference_backend': INFERENCE_BACKEND,
+        'batching': MODEL_BATCHER.stats(),
+        'label_index': 'loaded' if LABEL_INDEX is not None else 'not built',
+        'cache': RESULT_CACHE.stats(),
+        'single_flight': CLASSIFY_FLIGHTS.stats(),
+        'circuit_breaker': HF_BREAKER.stats(),
+        'profiling': PROFILER.stats(),
+        'load_simulation': LOAD_SIMULATOR.stats(),
+        'logging': logging_stats()
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until the model is loaded and warmed up"""
+    stats = READINESS.stats()
+    return jsonify(stats), 200 if stats['ready'] else 503
+
 @app.route('/classify', methods=['POST'])
 def classify():
     try:
-        data = request.json
-        image_b64 = data.get('image')
+        image_bytes, data = read_image_request()
         modality = data.get('modality', 'unknown')
         slice_index = data.get('slice_index', 0)  # Get slice index from request
+        frame_index = data.get('frame_index', 0)  # Frame within a multi-frame DICOM upload
         
-        print(f"\n{'='*60}")
-        print(f"📥 MEDSIGCLIP CLASSIFY REQUEST")
-        print(f"   Modality: {modality}")
-        print(f"   Slice Index: {slice_index}")
-        print(f"   Slice Index Type: {type(slice_index)}")
-        print(f"{'='*60}\n")
-        
-        # Decode image (clean base64)
-        image_bytes = base64.b64decode(image_b64)
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        request_log.info('classify request', extra={
+            'modality': modality, 'slice_index': slice_index, 'frame_index': frame_index
+        })
         
         start_time = time.time()
         
-        # Route to appropriate classification method
-        if MODE == 'real' and MODEL is not None:
-            result = classify_with_real_model(image, modality)
-        elif MODE == 'cloud' and CLOUD_AVAILABLE:
-            result = classify_with_cloud_api(image_bytes, modality)
-        else:
-            # Pass slice_index directly
-            print(f"🔍 Classifying with demo mode, slice_index={slice_index}")
-            result = classify_with_enhanced_demo(image, modality, slice_index)
+        # Serve repeated frames straight from the cache
+        cache_key = make_cache_key(image_bytes, modality, slice_index, frame_index)
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            cached['processing_time'] = time.time() - start_time
+            cached['cached'] = True
+            request_log.info('classify cache hit', extra={
+                'classification': cached.get('classification'), 'confidence': cached.get('confidence')
+            })
+            return jsonify(cached)
         
-        result['processing_time'] = time.time() - start_time
-        result['mode'] = MODE
+        # Byte-identical requests already in flight wait for that result instead
+        result, shared = CLASSIFY_FLIGHTS.do(
+            cache_key, lambda: classify_uncached(image_bytes, modality, slice_index, frame_index, cache_key, start_time)
+        )
+        if shared:
+            result['processing_time'] = time.time() - start_time
+            result['coalesced'] = True
         
-        print(f"✅ Classification result: {result.get('classification')} ({result.get('confidence'):.2f})")
+        request_log.info('classify result', extra={
+            'classification': result.get('classification'), 'confidence': result.get('confidence'),
+            'processing_time': result.get('processing_time')
+        })
         
         return jsonify(result)
         
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Error in classify: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('classify failed')
         return jsonify({'error': str(e)}), 500
 
-def classify_with_real_model(image, modality):
-    """Use real AI model via Hugging Face Inference API"""
+@app.route('/classify-batch', methods=['POST'])
+def classify_batch():
+    """Classify several slices of one study in a single round-trip"""
     try:
-        import requests
-        
-        print(f"🔍 Real AI: Calling Hugging Face API for {modality} image...")
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise RequestError('Expected a JSON object body')
+        slices = data.get('slices', [])
+        modality = data.get('modality', 'unknown')
         
-        # Convert image to bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr = img_byte_arr.getvalue()
+        if not slices:
+            return jsonify({'error': 'No slices provided'}), 400
+        if not isinstance(slices, list):
+            raise RequestError("'slices' must be a list")
         
-        # Use Hugging Face Inference API (FREE!)
-        API_URL = "https://api-inference.huggingface.co/models/microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224"
-        headers = {"Authorization": f"Bearer {os.getenv('HUGGINGFACE_TOKEN', '')}"}
+        request_log.info('classify batch request', extra={'modality': modality, 'slices': len(slices)})
         
-        # Call Hugging Face API
-        response = requests.post(
-            API_URL,
-            headers=headers,
-            data=img_byte_arr,
-            timeout=30
-        )
+        start_time = time.time()
         
-        print(f"📡 Hugging Face API response: {response.status_code}")
+        # Decode every slice up front (clean base64), skipping cached ones
+        results = [None] * len(slices)
+        slice_indices = []
+        cache_keys = []
+        pending = []
+        images_bytes = []
+        frame_indices = []
+        for position, item in enumerate(slices):
+            try:
+                image_bytes, params = image_from_json(item)
+            except RequestError as e:
+                raise RequestError(f"Slice {position}: {e}")
+            slice_index = params.get('slice_index')
+            slice_index = position if slice_index is None else slice_index
+            frame_index = params.get('frame_index', 0)
+            slice_indices.append(slice_index)
+            cache_keys.append(make_cache_key(image_bytes, modality, slice_index, frame_index))
+            
+            cached = RESULT_CACHE.get(cache_keys[-1])
+            if cached is not None:
+                cached['cached'] = True
+                results[position] = cached
+            else:
+                pending.append(position)
+                images_bytes.append(image_bytes)
+                frame_indices.append(frame_index)
         
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ Got result: {type(result)}")
+        if pending:
+            frames = []
+            for position, image_bytes, frame_index in zip(pending, images_bytes, frame_indices):
+                frames.append(SeriesFrame(
+                    slice_indices[position],
+                    PreparedImage.from_bytes(image_bytes, frame_index, modality),
+                    source_bytes=None if is_dicom(image_bytes) else image_bytes
+                ))
             
-            # Parse results - HF returns different formats
-            if isinstance(result, list) and len(result) > 0:
-                top_result = result[0]
-                return {
-                    'classification': top_result.get('label', 'unknown'),
-                    'confidence': float(top_result.get('score', 0.0)),
-                    'top_predictions': [
-                        {'label': r.get('label'), 'confidence': float(r.get('score', 0))}
-                        for r in result[:5]
-                    ],
-                    'modality': modality,
-                    'demo_mode': False,
-                    'model': 'BiomedCLIP (Hugging Face)'
-                }
-            elif isinstance(result, dict):
-                # Sometimes HF returns dict with 'error' or other format
-                if 'error' in result:
-                    print(f"⚠️  HF API error: {result['error']}")
-                    print("   Falling back to enhanced demo mode...")
-                    return classify_with_enhanced_demo(image, modality)
-                # Try to extract classification from dict
-                return {
-                    'classification': result.get('label', 'unknown'),
-                    'confidence': float(result.get('score', 0.5)),
-                    'modality': modality,
-                    'demo_mode': False,
-                    'model': 'BiomedCLIP (Hugging Face)'
-                }
-        else:
-            print(f"⚠️  HF API returned {response.status_code}: {response.text[:200]}")
-            print("   Falling back to enhanced demo mode...")
+            for position, result in zip(pending, classify_frames(frames, modality)):
+                cache_result(cache_keys[position], result)
+                results[position] = result
+        
+        processing_time = time.time() - start_time
         
-        # Fallback to local analysis if API fails
-        return classify_with_enhanced_demo(image, modality)
+        request_log.info('classify batch result', extra={'slices': len(results), 'processing_time': processing_time})
         
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'modality': modality,
+            'mode': MODE,
+            'processing_time': processing_time,
+            'slices_per_second': len(results) / processing_time if processing_time > 0 else None
+        })
+        
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Real model inference failed: {e}")
-        import traceback
-        traceback.print_exc()
-        print("   Falling back to enhanced demo mode...")
-        return classify_with_enhanced_demo(image, modality)
+        log.exception('classify batch failed')
+        return jsonify({'error': str(e)}), 500
 
-def classify_with_cloud_api(image_bytes, modality):
-    """Use cloud API for classification - Using Hugging Face as default"""
+@app.route('/classify-series', methods=['POST'])
+def classify_series():
+    """Classify every (sampled) frame of a series uploaded in one request
+
+    With ?stream=ndjson|sse (or a matching Accept header) each frame's result
+    is flushed as soon as its batch is done, followed by a summary record.
+    """
     try:
-        import requests
-        
-        # Use Hugging Face Inference API (works without token for public models)
-        API_URL = "https://api-inference.huggingface.co/models/microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224"
+        payloads, data = read_series_request()
+        modality = data.get('modality', 'unknown')
+        sample_rate = data.get('sample_rate', 1)
+        stream_format = requested_stream_format(data)
         
-        response = requests.post(API_URL, data=image_bytes, timeout=30)
+        request_log.info('classify series request', extra={
+            'modality': modality, 'payloads': len(payloads), 'sample_rate': sample_rate, 'stream': stream_format
+        })
         
-        if response.status_code == 200:
-            result = response.json()
-            
-            if isinstance(result, list) and len(result) > 0:
-                return {
-                    'classification': result[0].get('label', 'unknown'),
-                    'confidence': float(result[0].get('score', 0.0)),
-                    'top_predictions': [
-                        {'label': r.get('label'), 'confidence': float(r.get('score', 0))}
-                        for r in result[:5]
-                    ],
-                    'modality': modality,
-                    'demo_mode': False,
-                    'model': 'BiomedCLIP (Cloud)'
-                }
+        records = classify_series_records(payloads, modality, sample_rate)
+        if stream_format:
+            return stream_response(records, stream_format)
+        return jsonify(collect_records(records))
         
-        # Fallback
-        return classify_with_enhanced_demo(Image.open(io.BytesIO(image_bytes)), modality)
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Cloud API failed: {e}")
-        return classify_with_enhanced_demo(Image.open(io.BytesIO(image_bytes)), modality)
+        log.exception('classify series failed')
+        return jsonify({'error': str(e)}), 500
+
+def classify_series_records(payloads, modality, sample_rate):
+    """Yield ('frame', result) per classified frame, then one ('summary', ...) record"""
+    start_time = time.time()
+    
+    # Frames are decoded and classified a batch at a time
+    count = 0
+    summary = SeriesSummary()
+    for frames in iter_series_batches(payloads, modality, sample_rate):
+        for result in classify_frames(frames, modality):
+            summary.add(result['slice_index'], result.get('classification'), result.get('confidence', 0.0))
+            count += 1
+            yield 'frame', result
+    
+    processing_time = time.time() - start_time
+    
+    request_log.info('classify series result', extra={'frames': count, 'processing_time': processing_time})
+    
+    yield 'summary', {
+        'summary': summary.to_dict(),
+        'count': count,
+        'modality': modality,
+        'mode': MODE,
+        'processing_time': processing_time,
+        'frames_per_second': count / processing_time if processing_time > 0 else None
+    }
+
+def classify_uncached(image_bytes, modality, slice_index, frame_index, cache_key, start_time):
+    """Decode, classify and cache one request (cache miss path)"""
+    image = PreparedImage.from_bytes(image_bytes, frame_index, modality)
+    result = classify_image(image, image_bytes, modality, slice_index)
+    
+    result['processing_time'] = time.time() - start_time
+    result['mode'] = MODE
+    cache_result(cache_key, result)
+    return result
+
+def classify_image(image, image_bytes, modality, slice_index=0, features=None):
+    """Classify one PreparedImage with the configured path (real, cloud or demo)
+
+    features lets in-process callers that already computed the image
+    features (e.g. the unified /analyze service) share them with demo mode.
+    """
+    if use_real_model():
+        return classify_with_real_model(image, modality)
+    if MODE == 'cloud' and CLOUD_AVAILABLE:
+        return classify_with_cloud_api(upstream_bytes(image_bytes, image), modality)
+    # Pass slice_index directly
+    return classify_with_enhanced_demo(image, modality, slice_index, features=features)
+
+def classify_frames(frames, modality):
+    """Classify a list of SeriesFrames with one feature pass / forward pass"""
+    # Route to appropriate classification method
+    if use_real_model() and INFERENCE_BACKEND == 'local':
+        results = classify_batch_with_real_model([frame.image for frame in frames], modality)
+    elif use_real_model():
+        results = [classify_with_real_model(frame.image, modality) for frame in frames]
+    elif MODE == 'cloud' and CLOUD_AVAILABLE:
+        results = [
+            classify_with_cloud_api(frame.source_bytes or png_bytes(frame.image.rgb()), modality)
+            for frame in frames
+        ]
+    else:
+        features_list = extract_features_batch([frame.gray for frame in frames])
+        results = [
+            classify_with_enhanced_demo(None, modality, frame.slice_index, features=features)
+            for frame, features in zip(frames, features_list)
+        ]
+    
+    for frame, result in zip(frames, results):
+        result['slice_index'] = frame.slice_index
+        result['mode'] = MODE
+    return results
+
+def make_cache_key(image_bytes, modality, slice_index, frame_index=0):
+    """Cache key for one classification request"""
+    return ResultCache.make_key(
+        image_bytes,
+        modality=modality,
+        slice_index=slice_index,
+        frame_index=frame_index,
+        mode=MODE,
+        backend=INFERENCE_BACKEND,
+        model_version=MODEL_VERSION
+    )
+
+def upstream_bytes(image_bytes, image):
+    """Bytes to post to remote APIs (DICOM uploads are sent as the decoded frame in PNG)"""
+    return png_bytes(image.rgb()) if is_dicom(image_bytes) else image_bytes
+
+def cache_result(cache_key, result):
+    """Cache a result unless it came from a demo fallback in real/cloud mode"""
+    if MODE == 'demo' or not result.get('demo_mode'):
+        RESULT_CACHE.put(cache_key, result)
+
+def use_real_model():
+    """Whether requests should go to the real model (local weights or remote API)"""
+    return MODE == 'real' and (MODEL is not None or INFERENCE_BACKEND == 'remote')
+
+def classify_with_real_model(image, modality):
+    """Use real AI model - local BiomedCLIP by default, HF Inference API when opted in"""
+    if INFERENCE_BACKEND == 'remote':
+        return classify_with_remote_api(image, modality)
+    # Concurrent requests are merged into one forward pass by the batcher
+    with stage('inference'):
+        return MODEL_BATCHER.run((image, modality))
+
+def classify_batch_with_real_model(images, modality):
+    """Zero-shot classify a batch of images with the locally loaded BiomedCLIP model"""
+    try:
+        import torch
+        
+        labels, label_matrix = get_label_embeddings(modality)
+        
+        with torch.inference_mode():
+            batch = torch.stack([TRANSFORM(image.rgb(MODEL_IMAGE_SIDE)) for image in images]).to(DEVICE)
+            image_features = MODEL.encode_image(batch).float().cpu().numpy()
+            logit_scale = float(MODEL.logit_scale.exp())
+        
+        # One matrix multiply scores the whole batch against every label
+        logits = logit_scale * (normalize(image_features) @ label_matrix.T)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        
+        return [format_zero_shot_result(row, labels, modality) for row in probs]
+        
+    except Exception:
+        log.exception('local model inference failed - falling back to demo mode')
+        count_fallback('medsigclip', 'model_error', len(images))
+        return [classify_with_enhanced_demo(image, modality) for image in images]
+
+def run_model_batch(items):
+    """MicroBatcher callback: one forward pass for a group of (image, modality) items"""
+    images = [image for image, _ in items]
+    return classify_batch_with_real_model(images, items[0][1])
+
+# Request queue in front of the local model (BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+MODEL_BATCHER = MicroBatcher.from_env(run_model_batch, group_key=lambda item: item[1], name='medsigclip-batcher')
+register_queue(MODEL_BATCHER.name, lambda: MODEL_BATCHER.stats()['queue_depth'])
+
+def get_label_embeddings(modality):
+    """(labels, normalized text embedding matrix) for a modality's label prompts"""
+    if LABEL_INDEX is not None:
+        entry = LABEL_INDEX.lookup(modality)
+        if entry is not None:
+            return entry
+    
+    import torch
+    
+    key = vocabulary_key(modality)
+    with LABEL_EMBEDDINGS_LOCK:
+        if key not in LABEL_EMBEDDINGS:
+            with torch.inference_mode():
+                tokens = TOKENIZER(label_prompts(modality)).to(DEVICE)
+                text_features = MODEL.encode_text(tokens).float().cpu().numpy()
+            LABEL_EMBEDDINGS[key] = (labels_for(modality), normalize(text_features))
+        return LABEL_EMBEDDINGS[key]
 
-def classify_with_enhanced_demo(image, modality, slice_index=0):
+def format_zero_shot_result(probs, labels, modality):
+    """Turn one row of label probabilities into the classify response shape"""
+    order = np.argsort(probs)[::-1]
+    return {
+        'classification': labels[order[0]],
+        'confidence': float(probs[order[0]]),
+        'top_predictions': [
+            {'label': labels[i], 'confidence': float(probs[i])}
+            for i in order[:5]
+        ],
+        'modality': modality,
+        'demo_mode': False,
+        'model': 'BiomedCLIP (Local)'
+    }
+
+def classify_with_remote_api(image, modality):
+    """Use real AI model via Hugging Face Inference API"""
+    return call_remote(
+        lambda: remote_classify_call(image),
+        lambda response: parse_remote_classification(response, image, modality),
+        lambda error: remote_classification_failed(error, image, modality),
+        breaker=HF_BREAKER
+    )
+
+def remote_classify_call(image):
+    """Prepared Hugging Face Inference API request for one image"""
+    # Convert image to bytes
+    img_byte_arr = io.BytesIO()
+    image.rgb().save(img_byte_arr, format='PNG')
+    
+    # Use Hugging Face Inference API (FREE!)
+    return UpstreamCall(f"{HF_API_URL}/{MODEL_ID}", timeout=30, headers=hf_headers(), data=img_byte_arr.getvalue())
+
+def parse_remote_classification(response, image, modality):
+    """Classification from a Hugging Face API response, or the demo fallback"""
+    request_log.debug('hugging face api response', extra={'status': response.status_code})
+    
+    if response.status_code == 200:
+        result = response.json()
+        
+        # Parse results - HF returns different formats
+        if isinstance(result, list) and len(result) > 0:
+            top_result = result[0]
+            return {
+                'classification': top_result.get('label', 'unknown'),
+                'confidence': float(top_result.get('score', 0.0)),
+                'top_predictions': [
+                    {'label': r.get('label'), 'confidence': float(r.get('score', 0))}
+                    for r in result[:5]
+                ],
+                'modality': modality,
+                'demo_mode': False,
+                'model': 'BiomedCLIP (Hugging Face)'
+            }
+        elif isinstance(result, dict):
+            # Sometimes HF returns dict with 'error' or other format
+            if 'error' in result:
+                log.warning('hugging face api error - falling back to demo mode', extra={'error': result['error']})
+                count_fallback('medsigclip', 'upstream_error')
+                return classify_with_enhanced_demo(image, modality)
+            # Try to extract classification from dict
+            return {
+                'classification': result.get('label', 'unknown'),
+                'confidence': float(result.get('score', 0.5)),
+                'modality': modality,
+                'demo_mode': False,
+                'model': 'BiomedCLIP (Hugging Face)'
+            }
+    else:
+        log.warning('hugging face api failed - falling back to demo mode', extra={
+            'status': response.status_code, 'body': response.text[:200]
+        })
+    
+    # Fallback to local analysis if API fails
+    count_fallback('medsigclip', 'upstream_status' if response.status_code != 200 else 'bad_response')
+    return classify_with_enhanced_demo(image, modality)
+
+def remote_classification_failed(error, image, modality):
+    """Demo fallback when the Hugging Face API call raised"""
+    # An open circuit is expected while the upstream is down; no traceback for it
+    log.warning('real model inference failed - falling back to demo mode', extra={'error': str(error)},
+                exc_info=None if isinstance(error, BreakerOpen) else error)
+    count_fallback('medsigclip', fallback_reason(error))
+    return classify_with_enhanced_demo(image, modality)
+
+def classify_with_cloud_api(image_bytes, modality):
+    """Use cloud API for classification - Using Hugging Face as default"""
+    return call_remote(
+        lambda: cloud_classify_call(image_bytes),
+        lambda response: parse_cloud_classification(response, image_bytes, modality),
+        lambda error: cloud_classification_failed(error, image_bytes, modality),
+        breaker=HF_BREAKER
+    )
+
+def cloud_classify_call(image_bytes):
+    """Prepared cloud classification request"""
+    # Use Hugging Face Inference API (works without token for public models)
+    return UpstreamCall(f"{HF_API_URL}/{MODEL_ID}", timeout=30, data=image_bytes)
+
+def parse_cloud_classification(response, image_bytes, modality):
+    """Classification from a cloud API response, or the demo fallback"""
+    if response.status_code == 200:
+        result = response.json()
+        
+        if isinstance(result, list) and len(result) > 0:
+            return {
+                'classification': result[0].get('label', 'unknown'),
+                'confidence': float(result[0].get('score', 0.0)),
+                'top_predictions': [
+                    {'label': r.get('label'), 'confidence': float(r.get('score', 0))}
+                    for r in result[:5]
+                ],
+                'modality': modality,
+                'demo_mode': False,
+                'model': 'BiomedCLIP (Cloud)'
+            }
+    
+    # Fallback
+    count_fallback('medsigclip', 'upstream_status' if response.status_code != 200 else 'bad_response')
+    return classify_with_enhanced_demo(PreparedImage.from_bytes(image_bytes), modality)
+
+def cloud_classification_failed(error, image_bytes, modality):
+    """Demo fallback when the cloud API call raised"""
+    log.warning('cloud api failed - falling back to demo mode', extra={'error': str(error)}, exc_info=error)
+    count_fallback('medsigclip', fallback_reason(error))
+    return classify_with_enhanced_demo(PreparedImage.from_bytes(image_bytes), modality)
+
+@timed('inference')
+def classify_with_enhanced_demo(image, modality, slice_index=0, features=None):
     """Enhanced demo mode with realistic image analysis and slice variation"""
-    # Analyze image features
-    features = analyze_image_features(image)
+    # Analyze image features (batch callers pass them precomputed)
+    if features is None:
+        features = analyze_image_features(image)
     
     # Use provided slice_index (default 0 if not provided)
     if slice_index is None:
         slice_index = 0
     
-    # Classification labels by modality with more variety
-    classifications = {
-        'XA': ['normal', 'stenosis', 'occlusion', 'aneurysm', 'dissection', 'calcification', 'thrombus'],
-        'XR': ['normal', 'pneumonia', 'fracture', 'effusion', 'cardiomegaly', 'nodule', 'atelectasis'],
-        'CT': ['normal', 'mass', 'hemorrhage', 'infarct', 'nodule', 'fracture', 'consolidation'],
-        'MR': ['normal', 'tumor', 'edema', 'lesion', 'enhancement', 'infarct', 'ischemia'],
-        'US': ['normal', 'cyst', 'mass', 'fluid', 'calcification', 'stone', 'collection']
-    }
-    
-    labels = classifications.get(modality, ['normal', 'abnormal', 'artifact', 'unclear', 'suspicious'])
+    labels = labels_for(modality)
     
     # Safety check - ensure labels is not empty
     if not labels or len(labels) == 0:
@@ -367,12 +727,10 @@ def classify_with_enhanced_demo(image, modality, slice_index=0):
             if len(top_predictions) >= 5:  # Limit to 5 predictions
                 break
     
-    print(f"\n{'='*60}")
-    print(f"🎯 MEDSIGCLIP RESULT")
-    print(f"   Slice {slice_index}: {classification} ({confidence:.2f})")
-    print(f"   Slice Factor: {slice_factor:.3f}")
-    print(f"   Combined Score: {combined_score:.3f}")
-    print(f"{'='*60}\n")
+    request_log.debug('demo classification', extra={
+        'slice_index': slice_index, 'classification': classification, 'confidence': float(confidence),
+        'slice_factor': slice_factor, 'combined_score': combined_score
+    })
     
     return {
         'classification': classification,
@@ -394,17 +752,20 @@ def classify_with_enhanced_demo(image, modality, slice_index=0):
 def index():
     return jsonify({
         'service': 'MedSigLIP Classification Service',
-        'version': '1.0.0-demo',
+        'version': SERVICE_VERSION,
         'endpoints': {
             '/health': 'GET - Check service health',
-            '/classify': 'POST - Classify medical image'
+            '/metrics': 'GET - Prometheus metrics',
+            '/ready': 'GET - Readiness and warm-up progress (503 while warming)',
+            '/classify': 'POST - Classify medical image (base64 JSON, octet-stream or multipart)',
+            '/classify-batch': 'POST - Classify multiple slices in one request',
+            '/classify-series': 'POST - Classify every frame of a multi-frame DICOM or frame list (?stream=ndjson|sse to stream per frame)'
         }
     })
 
 if __name__ == '__main__':
-    # Try to load real model if in real mode
-    if MODE == 'real' and TORCH_AVAILABLE:
-        load_real_model()
+    # Load in the background so the port is open (and /ready reports progress) right away
+    start_background_startup()
     
     print(f"\n✅ MedSigLIP Server running on http://localhost:{PORT}")
     print(f"   Mode: {MODE.upper()}")
@@ -412,7 +773,8 @@ if __name__ == '__main__':
     
     if MODE == 'demo':
         print("⚠️  DEMO MODE: Using enhanced image analysis (not real AI)")
-        print("   To enable real AI: Set AI_MODE=real and install PyTorch")
+        print("   To enable real AI: Set AI_MODE=real and install PyTorch + open_clip_torch")
+        print("   To use the HF Inference API instead: also set MEDSIGCLIP_BACKEND=remote")
         print("   To use cloud: Set AI_MODE=cloud and CLOUD_PROVIDER=google/aws/azure\n")
     
     app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
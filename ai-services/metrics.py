@@ -0,0 +1,227 @@
+"""
+Metrics - Prometheus metrics for the AI services (GET /metrics)
+Per-stage latency histograms labelled by modality and mode, plus in-flight, queue depth and fallback counters
+
+Stages are timed exclusively: a stage nested in another (e.g. feature
+extraction inside demo inference) pauses the enclosing one, so a request's
+stage times add up to the time it spent in instrumented code.
+
+    parse      body read, JSON / multipart parsing
+    decode     base64, image and DICOM decoding
+    features   NumPy image feature extraction
+    inference  local model forward pass / generation, demo scoring
+    remote     waiting on an upstream API (Hugging Face, cloud)
+    render     report text rendering and parsing
+    serialize  JSON response encoding
+
+Set PROMETHEUS_MULTIPROC_DIR when serving with several worker processes
+(gunicorn.conf.py) so /metrics aggregates every worker.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from circuit_breaker import BreakerOpen
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import REGISTRY, multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    print("⚠️  prometheus_client not installed - /metrics unavailable")
+
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Modality label values; anything else is reported as 'other' to bound cardinality
+KNOWN_MODALITIES = {'CT', 'MR', 'XR', 'CR', 'DX', 'US', 'XA', 'MG', 'NM', 'PT', 'RF'}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        'ai_stage_duration_seconds', 'Time one request spent in a processing stage',
+        ['service', 'stage', 'modality', 'mode'], buckets=LATENCY_BUCKETS
+    )
+    REQUEST_SECONDS = Histogram(
+        'ai_request_duration_seconds', 'End-to-end request latency',
+        ['service', 'endpoint', 'status', 'mode'], buckets=LATENCY_BUCKETS
+    )
+    IN_FLIGHT = Gauge(
+        'ai_requests_in_flight', 'Requests currently being handled',
+        ['service'], multiprocess_mode='livesum'
+    )
+    QUEUE_DEPTH = Gauge(
+        'ai_queue_depth', 'Items waiting in an in-process queue (sampled at scrape time)',
+        ['queue'], multiprocess_mode='livesum'
+    )
+    FALLBACKS = Counter(
+        'ai_fallbacks_total', 'Results served by a demo fallback instead of the configured path',
+        ['model', 'reason']
+    )
+
+_QUEUES = {}  # queue name -> callable returning its current depth
+_CURRENT = contextvars.ContextVar('ai_request_stages', default=None)
+
+
+class StageTimer:
+    """Exclusive time per stage for one request"""
+
+    def __init__(self):
+        self.totals = {}
+        self.modality = None
+        self.started = time.perf_counter()
+        self._stack = []  # [stage, resumed_at]
+
+    def enter(self, stage):
+        now = time.perf_counter()
+        if self._stack:
+            self._add(self._stack[-1], now)
+        self._stack.append([stage, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        self._add(self._stack.pop(), now)
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def _add(self, frame, now):
+        self.totals[frame[0]] = self.totals.get(frame[0], 0.0) + now - frame[1]
+
+
+def modality_label(modality):
+    if not modality:
+        return 'unknown'
+    modality = str(modality).upper()
+    return modality if modality in KNOWN_MODALITIES else 'other'
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request (no-op outside a request)"""
+    timer = _CURRENT.get()
+    if timer is None:
+        yield
+        return
+    timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit()
+
+
+def timed(name):
+    """Decorator form of stage()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note_modality(modality):
+    """Label the current request's stage times with its modality (first call wins)"""
+    timer = _CURRENT.get()
+    if timer is not None and timer.modality is None and modality:
+        timer.modality = modality
+
+
+def current_request_stages():
+    """(modality, {stage: seconds so far}) of the current request, or (None, {}) outside one"""
+    timer = _CURRENT.get()
+    if timer is None:
+        return None, {}
+    return timer.modality, dict(timer.totals)
+
+
+def count_fallback(model, reason, amount=1):
+    if PROMETHEUS_AVAILABLE:
+        FALLBACKS.labels(model, reason).inc(amount)
+
+
+def fallback_reason(error):
+    """Fallback label for an exception handed to a fallback path"""
+    return 'breaker_open' if isinstance(error, BreakerOpen) else 'upstream_error'
+
+
+def register_queue(name, depth_fn):
+    """Report depth_fn() as ai_queue_depth{queue=name} on every scrape"""
+    _QUEUES[name] = depth_fn
+
+
+def begin_request(service):
+    """Start timing a request; returns the scope end_request() takes"""
+    if PROMETHEUS_AVAILABLE:
+        IN_FLIGHT.labels(service).inc()
+    timer = StageTimer()
+    return timer, _CURRENT.set(timer)
+
+
+def end_request(scope, service, mode, endpoint, status):
+    """Record a finished request's latency and stage times"""
+    timer, token = scope
+    _CURRENT.reset(token)
+    if not PROMETHEUS_AVAILABLE:
+        return
+    IN_FLIGHT.labels(service).dec()
+    REQUEST_SECONDS.labels(service, endpoint, str(status), mode).observe(time.perf_counter() - timer.started)
+    modality = modality_label(timer.modality)
+    for name, seconds in timer.totals.items():
+        STAGE_SECONDS.labels(service, name, modality, mode).observe(seconds)
+
+
+def render_latest():
+    """(body, content type) of the Prometheus text exposition"""
+    for name, depth_fn in _QUEUES.items():
+        QUEUE_DEPTH.labels(name).set(depth_fn())
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def instrument_app(app, service, mode):
+    """Time every request of a Flask app and serve /metrics from it"""
+    from flask import Response, g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with stage('serialize'):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_scope = begin_request(service)
+
+    def finish(status):
+        scope = g.pop('metrics_scope', None)
+        if scope is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            end_request(scope, service, mode, endpoint, status)
+
+    @app.after_request
+    def record_metrics(response):
+        finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def abandon_metrics(error=None):
+        # Requests that raised past the view never reach after_request
+        finish(500)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if not PROMETHEUS_AVAILABLE:
+            return Response('prometheus_client not installed\n', status=503, mimetype='text/plain')
+        body, content_type = render_latest()
+        return Response(body, content_type=content_type)
@@ -0,0 +1,133 @@
+"""
+Micro Batcher - Dynamic request batching in front of a model
+Gathers concurrent requests into one forward pass, bounded by batch size and wait time
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Collect items submitted from many request threads and run them in batches
+
+    batch_fn receives a list of items and must return a list of results in
+    the same order. Items are grouped by group_key (e.g. modality) so each
+    batch call only sees compatible items. The worker thread starts lazily
+    on first use and is restarted after a fork, so the batcher is safe to
+    create at import time.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, group_key=None, name='batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.group_key = group_key or (lambda item: None)
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+        self.batches = 0
+        self.items = 0
+        self.max_observed_batch = 0
+        self.last_batch_size = 0
+
+    @classmethod
+    def from_env(cls, batch_fn, prefix='BATCH', **kwargs):
+        """Build a batcher from BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS environment variables"""
+        return cls(
+            batch_fn,
+            max_batch_size=int(os.getenv(f'{prefix}_MAX_SIZE', 16)),
+            max_wait_ms=float(os.getenv(f'{prefix}_MAX_WAIT_MS', 10)),
+            **kwargs
+        )
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def run(self, item, timeout=None):
+        """Queue one item and block until its result is ready"""
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+                'max_observed_batch': self.max_observed_batch,
+                'last_batch_size': self.last_batch_size,
+                'queue_depth': self._queue.qsize()
+            }
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker is not None and self._pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == pid and self._worker.is_alive():
+                return
+            if self._pid != pid:
+                # Threads and queued items do not survive a fork
+                self._queue = queue.Queue()
+            self._pid = pid
+            self._worker = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._worker.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the wait expires"""
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    pending.append(self._queue.get_nowait())
+                else:
+                    pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _loop(self):
+        while True:
+            pending = self._collect()
+
+            groups = {}
+            for item, future in pending:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(self.group_key(item), []).append((item, future))
+
+            for members in groups.values():
+                self._run_batch(members)
+
+    def _run_batch(self, members):
+        items = [item for item, _ in members]
+        try:
+            results = self.batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name} returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, future in members:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.items += len(items)
+                self.last_batch_size = len(items)
+                self.max_observed_batch = max(self.max_observed_batch, len(items))
+
+        for (_, future), result in zip(members, results):
+            future.set_result(result)
@@ -0,0 +1,118 @@
+"""
+Prefix Cache - Reuse the attention key/value state of fixed prompt prefixes
+Each distinct prefix is prefilled once; requests only prefill their own suffix
+"""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+
+class PrefixEntry:
+    """Token ids of a prefix and the model's past_key_values after reading them"""
+
+    def __init__(self, input_ids, past_key_values):
+        self.input_ids = input_ids
+        self.past_key_values = past_key_values
+        self.nbytes = state_nbytes(past_key_values)
+
+    @property
+    def length(self):
+        return int(self.input_ids.shape[-1])
+
+    def fork(self):
+        """past_key_values safe to hand to one generate() call
+
+        Legacy tuple caches are never written to (generate concatenates new
+        tensors), so they are shared as-is; Cache objects are extended in
+        place and must be copied per request.
+        """
+        if isinstance(self.past_key_values, tuple):
+            return self.past_key_values
+        return copy.deepcopy(self.past_key_values)
+
+
+class PrefixCache:
+    """LRU of PrefixEntry objects keyed by prefix text, bounded by total tensor bytes"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> PrefixEntry
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_reused = 0
+
+    @classmethod
+    def from_env(cls, prefix='PREFIX_CACHE'):
+        """Build a cache from PREFIX_CACHE_MB (0 disables it)"""
+        return cls(max_bytes=int(float(os.getenv(f'{prefix}_MB', 256)) * 1024 * 1024))
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get_or_compute(self, key, compute):
+        """Return the entry for key, calling compute() -> (input_ids, past_key_values) on a miss
+
+        compute runs outside the lock, so two simultaneous misses on the same
+        prefix may both prefill it once; the second result simply replaces
+        the first.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.tokens_reused += entry.length
+                return entry
+            self.misses += 1
+
+        entry = PrefixEntry(*compute())
+        if entry.nbytes > self.max_bytes:
+            return entry  # Too large to keep; still usable for this request
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'tokens_reused': self.tokens_reused
+            }
+
+
+def state_nbytes(past_key_values):
+    """Total bytes held by the tensors of a past_key_values structure"""
+    if hasattr(past_key_values, 'key_cache'):
+        tensors = list(past_key_values.key_cache) + list(past_key_values.value_cache)
+    else:
+        tensors = [tensor for layer in past_key_values for tensor in layer]
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
@@ -0,0 +1,133 @@
+"""
+Preprocessing - Decode each upload once, at the resolution each stage actually needs
+Keeps a small per-image pyramid: feature statistics, model input and (only if asked) full size
+
+Demo feature statistics are stable well below native resolution, so the
+grayscale level they read is reduced to FEATURE_RESOLUTION (shorter side,
+default 512; 0 keeps full resolution). Reductions are integer box filters,
+so images already at or below the target are used exactly as decoded.
+
+JPEGs are decoded straight at the reduced scale and in the target mode
+(Image.draft); other formats decode once and shrink with Image.reduce()
+before the one conversion to 'L' or 'RGB'. Levels are built on first use
+and cached, so the classify and report stages of one request share them.
+
+16-bit grayscale PNG/TIFF pixels are read at their native depth and
+windowed to their own value range in one lookup (dicom_io.window_pixels),
+the way DICOM frames without a window are, instead of being clipped at 255.
+"""
+
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from dicom_io import frame_to_gray, is_dicom, read_dataset, window_pixels
+from image_features import extract_features
+from metrics import timed
+
+FEATURE_RESOLUTION = int(os.getenv('FEATURE_RESOLUTION', 512))
+
+# Modes Image.reduce() works on directly; others are converted first
+_REDUCIBLE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'I', 'F', 'CMYK'}
+
+# High bit depth grayscale modes, windowed to 8 bits at decode
+_DEEP_GRAY_MODES = {'I;16', 'I;16B', 'I;16L', 'I;16N', 'I'}
+
+
+def reduction_factor(size, min_side):
+    """Largest integer factor that keeps the shorter side at least min_side (1 = keep as is)"""
+    if not min_side:
+        return 1
+    return max(1, min(size) // int(min_side))
+
+
+def reduced_size(size, factor):
+    """Size of an image reduced by factor (rounded up, as Image.reduce() does)"""
+    return tuple(-(-side // factor) for side in size)
+
+
+class PreparedImage:
+    """One decoded upload and the reduced levels built from it so far"""
+
+    def __init__(self, source, data=None):
+        self._source = source   # opened PIL image; pixel data loads on first use
+        self._data = data       # encoded bytes, to re-decode a JPEG at a finer scale
+        self.size = source.size
+        self._bases = {}        # (scale, gray_only) -> decoded image at 1/scale
+        self._levels = {}       # (factor, mode) -> image at 1/factor in mode
+        self._features = None
+
+    @classmethod
+    def from_bytes(cls, data, frame_index=0, modality=None):
+        """Open PNG/JPEG/... or DICOM bytes (DICOM frames are windowed to 8 bits here)"""
+        if is_dicom(data):
+            ds = read_dataset(data)
+            return cls.from_gray(frame_to_gray(ds, frame_index or 0, modality))
+        return cls(Image.open(io.BytesIO(data)), data)
+
+    @classmethod
+    def from_gray(cls, gray):
+        """From a uint8 (H, W) array, e.g. a frame cut out of a multi-frame DICOM"""
+        return cls(Image.fromarray(gray, 'L'))
+
+    @classmethod
+    def from_image(cls, image):
+        """From an already decoded PIL image (warm-up, tests)"""
+        return cls(image)
+
+    @timed('decode')
+    def level(self, factor, mode):
+        """The image reduced by an integer factor, in mode ('L' or 'RGB')"""
+        key = (factor, mode)
+        if key not in self._levels:
+            image = self._base(factor, mode)
+            target = reduced_size(self.size, factor)
+            if image.size != target:
+                if image.mode not in _REDUCIBLE_MODES:
+                    image = image.convert(mode)
+                step = image.width // target[0]
+                if reduced_size(image.size, step) == target:
+                    image = image.reduce(step)
+                else:
+                    image = image.resize(target, Image.BOX)  # JPEG drafts that don't divide evenly
+            # Reduce first, then the one conversion to the target mode
+            self._levels[key] = image if image.mode == mode else image.convert(mode)
+        return self._levels[key]
+
+    def _base(self, factor, mode):
+        """Decoded pixels at the coarsest already-decoded scale usable for factor, decoding if none is"""
+        # Keys are (scale, gray_only): a JPEG drafted to 'L' can't serve an RGB level
+        usable = [key for key in self._bases if key[0] <= factor and (mode == 'L' or not key[1])]
+        if usable:
+            return self._bases[max(usable)]
+
+        source = self._source if self._source is not None else Image.open(io.BytesIO(self._data))
+        self._source = None
+        scale, gray_only = 1, False
+        if source.format == 'JPEG':
+            color = source.mode != 'L'
+            # Decoder-level reduction: the DCT is decoded at 1/2, 1/4 or 1/8 scale, straight to mode
+            if source.draft(mode, reduced_size(self.size, factor)) is not None:
+                scale = max(1, round(self.size[0] / source.size[0]))
+                gray_only = color and source.mode == 'L'
+        source.load()
+        if source.mode in _DEEP_GRAY_MODES:
+            source = Image.fromarray(window_pixels(np.asarray(source)), 'L')
+        self._bases[(scale, gray_only)] = source
+        return source
+
+    def gray(self):
+        """uint8 grayscale array at FEATURE_RESOLUTION"""
+        return np.asarray(self.level(reduction_factor(self.size, FEATURE_RESOLUTION), 'L'))
+
+    def rgb(self, min_side=None):
+        """RGB image whose shorter side stays at least min_side (full resolution when None)"""
+        return self.level(reduction_factor(self.size, min_side), 'RGB')
+
+    def features(self, gradients=True):
+        """extract_features() of the grayscale level, computed once per image"""
+        if self._features is None or (gradients and 'edges' not in self._features):
+            self._features = extract_features(self.gray(), gradients)
+        return self._features
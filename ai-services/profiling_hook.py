@@ -0,0 +1,280 @@
+"""
+Profiling Hook - On-demand cProfile of individual requests, kept in a bounded on-disk ring
+Off unless PROFILE_TOKEN is set; even then only requests that ask for it (or were armed) are profiled
+
+    PROFILE_TOKEN  shared secret; enables the hook
+    PROFILE_DIR    where profiles go (default <tmp>/ai-service-profiles)
+    PROFILE_KEEP   profiles kept on disk, oldest removed first (default 50)
+
+Trigger one request:
+
+    curl -H "X-Profile-Token: $PROFILE_TOKEN" -F image=@slow.dcm http://localhost:5001/classify
+
+Or arm the next N POST requests (optionally only one path) of this process:
+
+    curl -X POST -H "X-Profile-Token: $PROFILE_TOKEN" -H 'Content-Type: application/json' \\
+         -d '{"requests": 20, "path": "/generate-report"}' http://localhost:5002/admin/profile
+
+Each profile is written as <name>.prof (load with pstats or snakeviz) next to
+<name>.json, which holds the request's endpoint, status, modality, request ID,
+wall time, stage timings and the top functions by cumulative time. GET
+/admin/profile lists the ring. Under gunicorn, arming only reaches the worker
+that served the admin call; the header works on every worker.
+
+At most one request is profiled at a time per process; others that ask while
+a profile is running are served unprofiled (and don't consume an armed slot).
+"""
+
+import cProfile
+import contextvars
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+from structured_logging import current_request_id
+
+PROFILE_HEADER = 'X-Profile-Token'
+ADMIN_PATH = '/admin/profile'
+TOP_FUNCTIONS = 25
+
+log = logging.getLogger('profiling')
+
+# Profiler of the async request running in this context (executor work joins it via call_profiled)
+_ACTIVE = contextvars.ContextVar('active_profiler', default=None)
+
+
+def bind_profiler(profiler):
+    """Record call_profiled() work in this context into profiler; returns a token for reset_profiler()"""
+    return _ACTIVE.set(profiler)
+
+
+def reset_profiler(token):
+    _ACTIVE.reset(token)
+
+
+def call_profiled(fn, *args, **kwargs):
+    """fn(*args, **kwargs), recorded into the current request's profile if it has one"""
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        return fn(*args, **kwargs)
+    # cProfile hooks the calling thread only; enable it on whichever thread does the work
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    """[{function, calls, tottime_ms, cumtime_ms}] sorted by cumulative time"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({name})" if line else name,
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3)
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+class RequestProfiler:
+    """Per-request cProfile runs, triggered by a header or armed for the next N requests"""
+
+    def __init__(self, service, token='', directory=None, keep=50):
+        self.service = service
+        self.token = token
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'ai-service-profiles')
+        self.keep = max(1, int(keep))
+        self._armed = 0
+        self._armed_path = None
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()  # one profile at a time
+        self.written = 0
+        self.skipped_busy = 0
+
+    @classmethod
+    def from_env(cls, service):
+        """Build from PROFILE_TOKEN / PROFILE_DIR / PROFILE_KEEP (disabled without a token)"""
+        profiler = cls(
+            service,
+            os.getenv('PROFILE_TOKEN', ''),
+            os.getenv('PROFILE_DIR') or None,
+            int(os.getenv('PROFILE_KEEP', 50))
+        )
+        if profiler.enabled:
+            log.info('request profiling available', extra={'service': service, 'directory': profiler.directory})
+        return profiler
+
+    @property
+    def enabled(self):
+        return bool(self.token)
+
+    def authorized(self, value):
+        return self.enabled and bool(value) and hmac.compare_digest(value.encode(), self.token.encode())
+
+    def arm(self, count, path=None):
+        with self._lock:
+            self._armed = max(0, int(count))
+            self._armed_path = path or None
+        return self.armed()
+
+    def armed(self):
+        return {'remaining': self._armed, 'path': self._armed_path}
+
+    def begin(self, method, path, header_value):
+        """(profiler, trigger) when this request should be profiled, else None; cheap when disarmed"""
+        if (self._armed <= 0 and header_value is None) or path == ADMIN_PATH:
+            return None
+        if header_value is not None:
+            if not self.authorized(header_value):
+                return None
+            trigger = 'header'
+        elif method == 'POST' and self._armed_path in (None, path):
+            trigger = 'armed'
+        else:
+            return None
+
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        if trigger == 'armed':
+            with self._lock:
+                if self._armed <= 0:
+                    self._busy.release()
+                    return None
+                self._armed -= 1
+        profiler = cProfile.Profile()
+        return profiler, trigger
+
+    def finish(self, profiler, metadata):
+        """Write the profile and its metadata into the ring; releases the profile slot"""
+        try:
+            profiler.disable()
+            name = f"{time.time_ns()}_{os.getpid()}_{self.service}_{re.sub(r'[^A-Za-z0-9]+', '-', metadata['path']).strip('-') or 'root'}"
+            metadata = dict(metadata, service=self.service, pid=os.getpid(), top=top_functions(profiler))
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, name + '.prof'))
+            with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+                json.dump(metadata, f, indent=2, default=str)
+            self.written += 1
+            self.prune()
+        except OSError:
+            # A full or unwritable disk loses the profile, never the response
+            log.warning('Could not write request profile', exc_info=True)
+        finally:
+            self._busy.release()
+
+    def abandon(self, profiler):
+        profiler.disable()
+        self._busy.release()
+
+    def prune(self):
+        """Drop the oldest profiles beyond PROFILE_KEEP (names sort chronologically)"""
+        names = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.prof'))
+        for stale in names[:-self.keep]:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, stale + suffix))
+                except FileNotFoundError:
+                    pass  # Another worker pruned it first
+
+    def recent(self, limit=20):
+        """Metadata (without the function table) of the newest profiles"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in sorted((n for n in os.listdir(self.directory) if n.endswith('.json')), reverse=True)[:limit]:
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entry.pop('top', None)
+            entry['file'] = name[:-5] + '.prof'
+            entries.append(entry)
+        return entries
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'keep': self.keep,
+            'armed': self.armed(),
+            'written': self.written,
+            'skipped_busy': self.skipped_busy
+        }
+
+    def request_metadata(self, method, path, status, trigger, started, headers):
+        modality, stages = metrics.current_request_stages()
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'method': method,
+            'path': path,
+            'status': status,
+            'trigger': trigger,
+            'request_id': current_request_id(),
+            'modality': modality or headers.get('X-Modality'),
+            'content_type': headers.get('Content-Type'),
+            'content_length': headers.get('Content-Length'),
+            'wall_ms': round((time.perf_counter() - started) * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in stages.items()}
+        }
+
+    def install(self, app):
+        """Profile a Flask app's requests on demand and serve /admin/profile (no-op when disabled)"""
+        if not self.enabled:
+            return
+
+        from flask import g, jsonify, request
+
+        @app.before_request
+        def _profile_start():
+            started = self.begin(request.method, request.path, request.headers.get(PROFILE_HEADER))
+            if started is None:
+                return
+            profiler, trigger = started
+            g.request_profile = (profiler, trigger, time.perf_counter())
+            profiler.enable()
+
+        @app.after_request
+        def _profile_finish(response):
+            # Registered after instrument_app(), so this runs while the stage timings are still current
+            state = g.pop('request_profile', None)
+            if state is not None:
+                profiler, trigger, started = state
+                self.finish(profiler, self.request_metadata(
+                    request.method, request.path, response.status_code, trigger, started, request.headers
+                ))
+            return response
+
+        @app.teardown_request
+        def _profile_abandon(error=None):
+            # Requests that raised past the view never reach after_request
+            state = g.pop('request_profile', None)
+            if state is not None:
+                self.abandon(state[0])
+
+        @app.route(ADMIN_PATH, methods=['GET', 'POST'])
+        def admin_profile():
+            if not self.authorized(request.headers.get(PROFILE_HEADER)):
+                return jsonify({'error': 'Forbidden'}), 403
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+                try:
+                    count = int(data.get('requests', 1))
+                except (TypeError, ValueError):
+                    return jsonify({'error': "'requests' must be an integer"}), 400
+                self.arm(count, data.get('path'))
+            return jsonify({**self.stats(), 'recent': self.recent()})
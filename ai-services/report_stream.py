@@ -0,0 +1,90 @@
+"""
+Report Streaming - Turn a stream of generated text into token and section events
+Section headers (FINDINGS:/IMPRESSION:/RECOMMENDATIONS:) are detected as the text arrives
+"""
+
+SECTION_HEADERS = (
+    ('findings', 'FINDINGS:'),
+    ('impression', 'IMPRESSION:'),
+    ('recommendations', 'RECOMMENDATIONS:')
+)
+_LONGEST_HEADER = max(len(header) for _, header in SECTION_HEADERS)
+
+
+class SectionTracker:
+    """Incrementally locate report section headers in generated text
+
+    feed() returns the (event, payload) records triggered by a new chunk:
+    ('section_start', {'section': name}) when a header is completed and
+    ('section_end', {'section': name, 'text': ...}) for the section it closes.
+    Headers split across chunks are still found because the scan restarts
+    a header's length before the end of the previous buffer.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.current = None        # Name of the open section
+        self.current_start = 0     # Offset where its body begins
+        self._scan_from = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        records = []
+        while True:
+            found = self._next_header()
+            if found is None:
+                break
+            name, position, end = found
+            records.extend(self._close(position))
+            self.current = name
+            self.current_start = end
+            self._scan_from = end
+            records.append(('section_start', {'section': name}))
+        self._scan_from = max(self._scan_from, len(self.text) - _LONGEST_HEADER + 1)
+        return records
+
+    def finish(self):
+        """Close the open section at the end of generation"""
+        return self._close(len(self.text))
+
+    def _next_header(self):
+        best = None
+        for name, header in SECTION_HEADERS:
+            position = self.text.find(header, self._scan_from)
+            if position != -1 and (best is None or position < best[1]):
+                best = (name, position, position + len(header))
+        return best
+
+    def _close(self, position):
+        if self.current is None:
+            return []
+        body = self.text[self.current_start:position].strip()
+        name = self.current
+        self.current = None
+        return [('section_end', {'section': name, 'text': body})]
+
+
+def iter_report_events(chunks):
+    """Yield ('token', ...) and section records for an iterator of text chunks
+
+    The complete generated text is returned as the generator's value
+    (StopIteration.value), for callers that parse the final report.
+    """
+    tracker = SectionTracker()
+    for chunk in chunks:
+        if not chunk:
+            continue
+        yield 'token', {'text': chunk}
+        for record in tracker.feed(chunk):
+            yield record
+    for record in tracker.finish():
+        yield record
+    return tracker.text
+
+
+def split_for_streaming(text, words_per_chunk=4):
+    """Split ready-made text into word-sized chunks (for reports that were not generated token by token)"""
+    words = text.split(' ')
+    for start in range(0, len(words), words_per_chunk):
+        chunk = ' '.join(words[start:start + words_per_chunk])
+        yield chunk if start + words_per_chunk >= len(words) else chunk + ' '
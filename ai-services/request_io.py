@@ -0,0 +1,146 @@
+"""
+Request I/O - Read image payloads and metadata from incoming requests
+Accepts base64-in-JSON (legacy), raw application/octet-stream and multipart/form-data bodies
+"""
+
+import binascii
+import json
+
+from flask import request
+
+from metrics import note_modality, stage
+
+# Header names for metadata sent alongside raw binary bodies
+METADATA_HEADERS = {
+    'modality': 'X-Modality',
+    'slice_index': 'X-Slice-Index',
+    'frame_index': 'X-Frame-Index',
+    'classification': 'X-Classification',
+    'patientContext': 'X-Patient-Context'
+}
+INT_FIELDS = ('slice_index', 'frame_index')
+JSON_FIELDS = ('patientContext',)
+
+
+class RequestError(ValueError):
+    """Malformed request payload (reported to the caller as HTTP 400)"""
+
+
+def read_image_request():
+    """Return (image_bytes, params) for the current request
+
+    - application/json: {'image': <base64>, 'modality': ..., ...}
+    - application/octet-stream, application/dicom or image/*: the body is the
+      image, metadata comes from X-Modality / X-Slice-Index / X-Frame-Index /
+      X-Classification / X-Patient-Context headers or the query string
+    - multipart/form-data: an 'image' file part plus either a 'metadata'
+      JSON part/field or individual form fields
+    """
+    mimetype = request.mimetype or ''
+
+    with stage('parse'):
+        if mimetype == 'multipart/form-data':
+            image_bytes, params = _read_multipart()
+        elif mimetype == 'application/json' or mimetype.endswith('+json'):
+            image_bytes, params = _read_json()
+        else:
+            image_bytes, params = _read_raw()
+    note_modality(params.get('modality'))
+    return image_bytes, params
+
+
+def decode_base64(value):
+    """Bytes of a base64 str (or bytes), decoded straight from the string's own buffer
+
+    Same leniency as base64.b64decode() (characters outside the alphabet are
+    skipped) without first copying the whole string into an ASCII bytes object.
+    """
+    if not isinstance(value, (str, bytes)):
+        raise RequestError(f"Expected a base64 string, got {type(value).__name__}")
+    data = binascii.a2b_base64(value)
+    if not data:
+        raise RequestError('empty or invalid base64 image')
+    return data
+
+
+def _read_json():
+    return image_from_json(request.get_json(silent=True))
+
+
+def image_from_json(data):
+    """(image_bytes, params) from a parsed {'image': <base64>, ...} JSON body"""
+    if not isinstance(data, dict):
+        raise RequestError('Expected a JSON object body')
+    image_b64 = data.get('image')
+    if not image_b64:
+        raise RequestError("Missing 'image' field")
+    try:
+        with stage('decode'):
+            image_bytes = decode_base64(image_b64)
+    except (binascii.Error, ValueError) as e:
+        raise RequestError(f"Invalid base64 image: {e}")
+    params = {key: value for key, value in data.items() if key != 'image'}
+    return image_bytes, params
+
+
+def _read_raw():
+    # Read the body once, straight from the input stream, without caching a copy
+    image_bytes = request.get_data(cache=False)
+    if not image_bytes:
+        raise RequestError('Empty request body')
+    return image_bytes, parse_metadata(request.args, request.headers)
+
+
+def _read_multipart():
+    upload = request.files.get('image')
+    if upload is None:
+        raise RequestError("Missing 'image' file part")
+    image_bytes = upload.read()
+    if not image_bytes:
+        raise RequestError("Empty 'image' file part")
+
+    params = parse_metadata(request.form, request.headers)
+
+    metadata = request.form.get('metadata')
+    if metadata is None and 'metadata' in request.files:
+        metadata = request.files['metadata'].read().decode('utf-8')
+    merge_metadata_json(params, metadata)
+
+    return image_bytes, params
+
+
+def merge_metadata_json(params, metadata):
+    """Merge a 'metadata' JSON document (if any) into params"""
+    if metadata:
+        try:
+            params.update(json.loads(metadata))
+        except ValueError as e:
+            raise RequestError(f"Invalid 'metadata' JSON: {e}")
+    return params
+
+
+def parse_metadata(fields, headers=None):
+    """Collect metadata from form/query fields, falling back to X-* headers when given"""
+    params = {}
+    for key, header in METADATA_HEADERS.items():
+        value = fields.get(key)
+        if value is None and headers is not None:
+            value = headers.get(header)
+        if value is None:
+            continue
+        params[key] = _coerce(key, value)
+    return params
+
+
+def _coerce(key, value):
+    if key in INT_FIELDS:
+        try:
+            return int(value)
+        except ValueError:
+            raise RequestError(f"'{key}' must be an integer")
+    if key in JSON_FIELDS:
+        try:
+            return json.loads(value)
+        except ValueError:
+            raise RequestError(f"'{key}' must be JSON")
+    return value
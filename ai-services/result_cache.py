@@ -0,0 +1,231 @@
+"""
+Result Cache - Content-addressed cache for classification and report results
+In-memory LRU tier with an optional on-disk tier that survives restarts
+
+The disk tier may be shared by several processes (gunicorn workers), each of
+which only sees its own writes. When a process's view goes over the byte
+budget it rescans the directory first and then evicts the oldest files down
+to DISK_LOW_WATER of the budget, so the headroom keeps rescans infrequent.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger('result_cache')
+
+# Fraction of disk_max_bytes left after an eviction pass
+DISK_LOW_WATER = 0.9
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of JSON-serializable results
+
+    Entries are stored as serialized JSON so every hit hands back a fresh
+    copy that callers can annotate without touching the cached value.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory = OrderedDict()  # key -> (stored_at, payload)
+        self._disk_index = OrderedDict()  # key -> file size, oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.disk_rescans = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_index, self._disk_bytes = self._scan_disk()
+
+    @classmethod
+    def from_env(cls, prefix='RESULT_CACHE'):
+        """Build a cache from RESULT_CACHE_* environment variables"""
+        return cls(
+            max_entries=int(os.getenv(f'{prefix}_SIZE', 1024)),
+            ttl_seconds=float(os.getenv(f'{prefix}_TTL', 3600)),
+            disk_dir=os.getenv(f'{prefix}_DIR') or None,
+            disk_max_bytes=int(float(os.getenv(f'{prefix}_DISK_MB', 256)) * 1024 * 1024)
+        )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.disk_dir)
+
+    @staticmethod
+    def make_key(image_bytes, **params):
+        """Hash the image bytes together with every parameter that affects the result"""
+        hasher = hashlib.sha256()
+        hasher.update(image_bytes)
+        hasher.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """Return a copy of the cached result, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, payload = entry
+                if self._is_fresh(stored_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return json.loads(payload)
+                del self._memory[key]
+
+        payload = self._read_disk(key, now)
+
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, now, payload)
+        return json.loads(payload)
+
+    def put(self, key, result):
+        """Store a result in the memory tier and, if configured, on disk"""
+        if not self.enabled:
+            return
+
+        payload = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, payload)
+        self._write_disk(key, now, payload)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_entries': len(self._disk_index),
+                'disk_bytes': self._disk_bytes,
+                'disk_rescans': self.disk_rescans,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+    def _is_fresh(self, stored_at, now):
+        return self.ttl_seconds <= 0 or now - stored_at <= self.ttl_seconds
+
+    def _remember(self, key, stored_at, payload):
+        """Insert into the memory LRU (caller holds the lock)"""
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (stored_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _scan_disk(self):
+        """(index oldest first, total bytes) of the files currently in the disk tier"""
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+
+        index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        return index, sum(index.values())
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not self._is_fresh(record.get('stored_at', 0), now):
+            self._remove_disk(key)
+            return None
+        return record.get('payload')
+
+    def _write_disk(self, key, stored_at, payload):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stored_at': stored_at, 'payload': payload}, f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            log.warning('result cache disk write failed', extra={'path': path, 'error': str(e)})
+            return
+
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = size
+            self._disk_bytes += size
+            if self._disk_bytes <= self.disk_max_bytes:
+                return
+
+        # Other processes may have written or evicted files since our last look
+        index, total = self._scan_disk()
+        stale = []
+        with self._lock:
+            self._disk_index, self._disk_bytes = index, total
+            self.disk_rescans += 1
+            while self._disk_bytes > self.disk_max_bytes * DISK_LOW_WATER and len(self._disk_index) > 1:
+                old_key, old_size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= old_size
+                self.evictions += 1
+                stale.append(old_key)
+
+        for old_key in stale:
+            self._unlink(old_key)
+
+    def _remove_disk(self, key):
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+        self._unlink(key)
+
+    def _unlink(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
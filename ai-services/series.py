@@ -0,0 +1,183 @@
+"""
+Series Analysis - Server-side frame iteration for whole-series requests
+Reads a multi-frame DICOM or a list of frames from one upload and yields them in batches
+"""
+
+import binascii
+import os
+from collections import Counter
+
+from flask import request
+
+from dicom_io import frame_count, frame_to_gray, is_dicom, read_dataset
+from preprocess import PreparedImage
+from request_io import RequestError, decode_base64, merge_metadata_json, read_image_request
+
+# Frames decoded and analyzed together per chunk (bounds memory for long series)
+SERIES_BATCH_SIZE = int(os.getenv('SERIES_BATCH_SIZE', 16))
+
+
+class SeriesFrame:
+    """One frame of a series: its slice index and PreparedImage
+
+    source_bytes keeps the original encoded upload for remote APIs; it is
+    None for frames cut out of a DICOM object.
+    """
+
+    def __init__(self, slice_index, image, source_bytes=None):
+        self.slice_index = slice_index
+        self.image = image
+        self.source_bytes = source_bytes
+
+    @property
+    def gray(self):
+        """Grayscale pixels at the feature resolution"""
+        return self.image.gray()
+
+
+class SeriesSummary:
+    """Series-level summary accumulated one frame at a time"""
+
+    def __init__(self, normal_labels=('normal',)):
+        self.normal_labels = set(normal_labels)
+        self.frames = 0
+        self.label_counts = Counter()
+        self.abnormal_slices = []
+        self.confidence_total = 0.0
+        self.top_finding = None  # (confidence, label, slice_index)
+
+    def add(self, slice_index, label, confidence):
+        self.frames += 1
+        self.confidence_total += confidence
+        if label is None:
+            return
+        self.label_counts[label] += 1
+        if label.lower() not in self.normal_labels:
+            self.abnormal_slices.append(slice_index)
+            if self.top_finding is None or confidence > self.top_finding[0]:
+                self.top_finding = (confidence, label, slice_index)
+
+    def to_dict(self):
+        abnormal = len(self.abnormal_slices)
+        summary = {
+            'frames_analyzed': self.frames,
+            'label_counts': dict(self.label_counts),
+            'abnormal_frames': abnormal,
+            'abnormal_slices': self.abnormal_slices,
+            'normal_frames': sum(count for label, count in self.label_counts.items()
+                                 if label.lower() in self.normal_labels),
+            'mean_confidence': self.confidence_total / self.frames if self.frames else 0.0,
+            'overall': 'abnormal' if abnormal else 'normal'
+        }
+        if self.top_finding is not None:
+            confidence, label, slice_index = self.top_finding
+            summary['primary_finding'] = {'label': label, 'confidence': confidence, 'slice_index': slice_index}
+        return summary
+
+
+def read_series_request():
+    """Return (payloads, params) for a whole-series request
+
+    payloads is a list of (slice_index or None, image_bytes, frame_index).
+    Accepted bodies:
+    - a single multi-frame DICOM (raw, multipart 'image' or JSON base64 'image')
+    - JSON {'frames': [{'image': <base64>, 'slice_index': n}, ...], ...}
+    - multipart with repeated 'frames' file parts plus optional 'metadata'
+
+    sample_rate and classifications are checked here, before any frame is
+    decoded, so a bad value is a 400 even for streamed responses.
+    """
+    payloads, params = _read_series_payloads()
+    return payloads, validate_series_params(params)
+
+
+def _read_series_payloads():
+    if request.mimetype == 'application/json':
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and 'frames' in data:
+            if not isinstance(data['frames'], list):
+                raise RequestError("'frames' must be a list")
+            payloads = []
+            for item in data['frames']:
+                try:
+                    image_bytes = decode_base64(item['image'])
+                except (KeyError, TypeError, binascii.Error, ValueError) as e:
+                    raise RequestError(f"Invalid frame entry: {e}")
+                payloads.append((item.get('slice_index'), image_bytes, item.get('frame_index', 0)))
+            params = {key: value for key, value in data.items() if key != 'frames'}
+            return payloads, params
+
+    if request.mimetype == 'multipart/form-data' and 'frames' in request.files:
+        params = _multipart_params()
+        payloads = [(None, upload.read(), 0) for upload in request.files.getlist('frames')]
+        return payloads, params
+
+    image_bytes, params = read_image_request()
+    return [(None, image_bytes, params.get('frame_index', 0))], params
+
+
+def validate_series_params(params):
+    """Normalize sample_rate to an int >= 1 and check classifications, raising RequestError"""
+    sample_rate = params.get('sample_rate')
+    if isinstance(sample_rate, bool):
+        raise RequestError('sample_rate must be an integer')
+    try:
+        params['sample_rate'] = max(1, int(sample_rate or 1))
+    except (TypeError, ValueError):
+        raise RequestError('sample_rate must be an integer')
+
+    # Per-frame labels: a list in analyzed-frame order or {slice_index: label}
+    classifications = params.get('classifications') or {}
+    if not isinstance(classifications, (list, dict)):
+        raise RequestError('classifications must be a list or an object keyed by slice index')
+    labels = classifications if isinstance(classifications, list) else classifications.values()
+    if any(label is not None and not isinstance(label, str) for label in labels):
+        raise RequestError('classifications must be strings')
+    params['classifications'] = classifications
+    return params
+
+
+def _multipart_params():
+    """Metadata for a multipart frames upload"""
+    params = merge_metadata_json({}, request.form.get('metadata'))
+    for key in ('modality', 'sample_rate'):
+        if key in request.form:
+            params.setdefault(key, request.form[key])
+    return params
+
+
+def iter_series_batches(payloads, modality, sample_rate=1, batch_size=None):
+    """Yield lists of SeriesFrame, batch_size at a time, in slice order
+
+    A single DICOM payload is expanded into its frames (pixel data decoded
+    once); otherwise every payload is one frame. sample_rate keeps every
+    Nth frame, like the orchestrator's multi-slice loop.
+    """
+    batch_size = batch_size or SERIES_BATCH_SIZE
+    sample_rate = max(1, int(sample_rate or 1))
+    batch = []
+    for frame in _iter_frames(payloads, modality, sample_rate):
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_frames(payloads, modality, sample_rate):
+    if len(payloads) == 1 and is_dicom(payloads[0][1]):
+        ds = read_dataset(payloads[0][1])
+        frames = frame_count(ds)
+        pixels = ds.pixel_array
+        for index in range(0, frames, sample_rate):
+            yield SeriesFrame(index, PreparedImage.from_gray(frame_to_gray(ds, index, modality, pixels=pixels)))
+        return
+
+    for position in range(0, len(payloads), sample_rate):
+        slice_index, image_bytes, frame_index = payloads[position]
+        yield SeriesFrame(
+            position if slice_index is None else slice_index,
+            PreparedImage.from_bytes(image_bytes, frame_index, modality),
+            source_bytes=None if is_dicom(image_bytes) else image_bytes
+        )
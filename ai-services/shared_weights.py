@@ -0,0 +1,73 @@
+"""
+Shared Weights - Memory-mapped model weights that worker processes share through the page cache
+Export once with `python shared_weights.py export medsigclip|medgemma`; loaders then attach to the file
+
+Set MODEL_WEIGHTS_MMAP_DIR to the export directory. A model's parameters are
+then replaced by tensors backed by a read-only mmap of <dir>/<model>.pt, so N
+worker processes (pre-forked or started independently) map the same physical
+pages instead of each holding a private copy.
+"""
+
+import argparse
+import os
+
+WEIGHTS_MMAP_DIR = os.getenv('MODEL_WEIGHTS_MMAP_DIR') or None
+
+
+def weights_path(model_id, directory=None):
+    """File a model's state dict is exported to"""
+    directory = directory or WEIGHTS_MMAP_DIR
+    return os.path.join(directory, model_id.replace('/', '__') + '.pt')
+
+
+def attach_mmap_weights(model, model_id):
+    """Point model's parameters at the exported mmap file; False if not configured or not exported"""
+    if not WEIGHTS_MMAP_DIR:
+        return False
+    path = weights_path(model_id)
+    if not os.path.exists(path):
+        print(f"⚠️  No exported weights at {path} - using private in-memory weights")
+        return False
+
+    import torch
+
+    state_dict = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    # assign=True keeps the mmap-backed tensors instead of copying into the existing ones
+    model.load_state_dict(state_dict, assign=True)
+    print(f"🗺️  Model weights memory-mapped from {path}")
+    return True
+
+
+def export_weights(model, model_id, directory):
+    """Write model's state dict where attach_mmap_weights() looks for it"""
+    import torch
+
+    os.makedirs(directory, exist_ok=True)
+    path = weights_path(model_id, directory)
+    state_dict = {name: tensor.detach().cpu().contiguous() for name, tensor in model.state_dict().items()}
+    torch.save(state_dict, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export model weights for memory-mapped sharing')
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('service', choices=['medsigclip', 'medgemma'])
+    parser.add_argument('--output', default=WEIGHTS_MMAP_DIR or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights'),
+                        help='Directory for the exported .pt file')
+    args = parser.parse_args()
+
+    if args.service == 'medsigclip':
+        import medsigclip_server as server
+    else:
+        import medgemma_server as server
+
+    if not server.load_real_model():
+        raise SystemExit(1)
+    path = export_weights(server.MODEL, server.MODEL_ID, args.output)
+    print(f"✅ Exported {server.MODEL_ID} weights to {path}")
+    print(f"   Serve with: MODEL_WEIGHTS_MMAP_DIR={args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Single Flight - Coalesce identical requests that are in flight at the same time
+The first caller for a key computes; concurrent duplicates wait for and share its result
+"""
+
+import asyncio
+import copy
+import os
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Per-key deduplication of concurrent work (no result is kept once the call finishes)
+
+    Keys are the same content hashes the result cache uses (image bytes plus
+    every parameter that affects the output), so only byte-identical
+    requests are merged. Followers receive a deep copy of the leader's
+    result and may annotate it freely; if the leader raises, they raise the
+    same exception.
+    """
+
+    def __init__(self, enabled=True, name='flight'):
+        self.enabled = enabled
+        self.name = name
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls, name='flight'):
+        """Build from SINGLE_FLIGHT (set to 0 to disable coalescing)"""
+        return cls(enabled=os.getenv('SINGLE_FLIGHT', '1') != '0', name=name)
+
+    def _join(self, key):
+        """(future, is_leader) for key"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Return (result, shared): fn() for the first caller, a copy of its result for concurrent duplicates"""
+        if not self.enabled:
+            return fn(), False
+
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(future.result()), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def do_async(self, key, coroutine_fn):
+        """Async do(): followers await the leader without holding a thread"""
+        if not self.enabled:
+            return await coroutine_fn(), False
+
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(await asyncio.wrap_future(future)), True
+
+        try:
+            result = await coroutine_fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'enabled': self.enabled,
+            'in_flight': in_flight,
+            'leaders': self.leaders,
+            'coalesced': self.coalesced
+        }
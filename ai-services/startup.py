@@ -0,0 +1,111 @@
+"""
+Startup - Optional-dependency probes, background model loading and readiness tracking
+Lets a server bind its port immediately and report warm-up progress on /ready
+"""
+
+import importlib.util
+import logging
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+# Module behind each CLOUD_PROVIDER's SDK (probed at startup, never imported there)
+CLOUD_SDK_MODULES = {
+    'google': 'google.cloud.healthcare_v1',
+    'aws': 'boto3',
+    'azure': 'azure.ai.vision'
+}
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+log = logging.getLogger('startup')
+
+
+def module_available(name):
+    """True if a module can be imported, without importing it (or anything heavy)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        # A missing parent package (e.g. google.cloud) raises instead of returning None
+        return False
+
+
+def cloud_sdk_available(provider):
+    """True if the SDK for CLOUD_PROVIDER is installed ('none' and unknown providers are not)"""
+    module = CLOUD_SDK_MODULES.get(provider)
+    return module is not None and module_available(module)
+
+
+def warmup_image(size=224):
+    """Synthetic radial-gradient image for warm-up inferences"""
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32)
+    distance = np.hypot(x - size / 2, y - size / 2) / (size / 2)
+    gray = (np.clip(1.0 - distance, 0.0, 1.0) * 200 + 30).astype(np.uint8)
+    return Image.fromarray(gray, 'L').convert('RGB')
+
+
+class Readiness:
+    """Ordered startup stages, each pending -> running -> done | skipped | failed
+
+    The service is ready once every stage is done or skipped. A failed
+    stage keeps it unready (the server still answers, e.g. with demo
+    fallbacks, but orchestrators should prefer healthy nodes).
+    """
+
+    def __init__(self, name, stages=('model', 'warmup')):
+        self.name = name
+        self._stages = {stage: {'status': PENDING} for stage in stages}
+        self._lock = threading.Lock()
+        self._created = time.time()
+
+    def _set(self, stage, **fields):
+        with self._lock:
+            self._stages[stage] = fields
+
+    def skip(self, stage, reason):
+        self._set(stage, status=SKIPPED, reason=reason)
+
+    def run(self, stage, fn):
+        """Run one stage; an exception or a False return marks it failed"""
+        self._set(stage, status=RUNNING)
+        start = time.time()
+        try:
+            ok = fn() is not False
+            error = None if ok else 'returned False'
+        except Exception as e:
+            log.exception('startup stage raised', extra={'service': self.name, 'stage': stage})
+            ok, error = False, str(e)
+        seconds = time.time() - start
+        if ok:
+            self._set(stage, status=DONE, seconds=seconds)
+            log.info('startup stage ready', extra={'service': self.name, 'stage': stage, 'seconds': round(seconds, 2)})
+        else:
+            self._set(stage, status=FAILED, seconds=seconds, error=error)
+            log.error('startup stage failed', extra={'service': self.name, 'stage': stage, 'error': error})
+        return ok
+
+    def start(self, fn):
+        """Run fn (the startup stages) on a daemon thread so the server can bind right away"""
+        thread = threading.Thread(target=fn, name=f'{self.name}-startup', daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self):
+        with self._lock:
+            return all(stage['status'] in (DONE, SKIPPED) for stage in self._stages.values())
+
+    def stats(self):
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        return {
+            'ready': all(stage['status'] in (DONE, SKIPPED) for stage in stages.values()),
+            'stages': stages,
+            'uptime_seconds': time.time() - self._created
+        }
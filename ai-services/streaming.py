@@ -0,0 +1,87 @@
+"""
+Streaming Responses - NDJSON / Server-Sent Events output for long-running analyses
+Records are produced by generators and flushed one at a time, never held in memory together
+"""
+
+import json
+import logging
+
+from flask import Response, request, stream_with_context
+
+from structured_logging import bind_request_id, current_request_id, reset_request_id
+
+log = logging.getLogger('streaming')
+
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+
+def requested_stream_format(params=None):
+    """'ndjson', 'sse' or None, from ?stream=/the 'stream' param or the Accept header"""
+    fmt = request.args.get('stream') or (params or {}).get('stream')
+    if fmt in STREAM_MIMETYPES:
+        return fmt
+
+    accept = request.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return None
+
+
+def encode_record(event, payload, fmt):
+    """Serialize one (event, payload) record for the wire"""
+    data = json.dumps(payload)
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {data}\n\n"
+    return f'{{"type": {json.dumps(event)}, "data": {data}}}\n'
+
+
+def stream_response(records, fmt):
+    """Chunked response that flushes each (event, payload) record as soon as it is yielded
+
+    An exception while producing records is reported as a final 'error'
+    record, since the HTTP status has already been sent.
+
+    The body is produced after the view has returned, possibly on another
+    thread, so the request ID is captured now and bound around each step
+    of the generator for the log lines it emits.
+    """
+    request_id = current_request_id()
+
+    def generate():
+        iterator = iter(records)
+        while True:
+            token = bind_request_id(request_id)
+            try:
+                event, payload = next(iterator)
+            except StopIteration:
+                return
+            except Exception as e:
+                log.exception('error while streaming')
+                event, payload = 'error', {'error': str(e)}
+                iterator = iter(())
+            finally:
+                reset_request_id(token)
+            yield encode_record(event, payload, fmt)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=STREAM_MIMETYPES[fmt],
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def collect_records(records, item_event='frame', items_key='frames'):
+    """Non-streaming fallback: gather item records into a list next to the final summary fields"""
+    items = []
+    response = {}
+    for event, payload in records:
+        if event == item_event:
+            items.append(payload)
+        else:
+            response.update(payload)
+    return {items_key: items, **response}
@@ -0,0 +1,236 @@
+"""
+Structured Logging - JSON log lines written by a background thread, never by request threads
+Hot-path request logs are sampled per level; every line carries the caller's X-Request-ID
+
+Request threads only put records on a bounded queue (QueueHandler); a
+QueueListener thread formats and writes them. When the queue is full
+records are dropped and counted rather than blocking the request.
+
+    LOG_LEVEL       minimum level (default INFO)
+    LOG_FORMAT      'json' (default) or 'text'
+    LOG_SAMPLE      share of request logs kept per level, e.g. "DEBUG=0,INFO=0.1"
+                    (unlisted levels keep everything)
+    LOG_QUEUE_SIZE  records buffered for the writer thread (default 10000)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+_REQUEST_ID = contextvars.ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not user-supplied extra fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+def parse_sample_rates(spec):
+    """{'INFO': 0.1, ...} from "INFO=0.1,DEBUG=0" """
+    rates = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        level, rate = part.split('=', 1)
+        rates[level.strip().upper()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+SAMPLE_RATES = parse_sample_rates(os.getenv('LOG_SAMPLE', ''))
+
+
+def current_request_id():
+    return _REQUEST_ID.get()
+
+
+def new_request_id(incoming=None):
+    """The caller's request ID if it is well-formed, otherwise a fresh one"""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def bind_request_id(request_id):
+    """Set the request ID for log lines from this context; returns a token for reset_request_id()"""
+    return _REQUEST_ID.set(request_id)
+
+
+def reset_request_id(token):
+    _REQUEST_ID.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the request ID while still on the request's thread"""
+
+    def filter(self, record):
+        record.request_id = _REQUEST_ID.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a per-level share of records; all lines of one request are kept or dropped together"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelname, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        request_id = _REQUEST_ID.get()
+        if request_id is None:
+            return random.random() < rate
+        return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = {key: value for key, value in vars(record).items() if key not in _RESERVED}
+        return f"{line} {json.dumps(extra, default=str)}" if extra else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking or erroring when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Keep the record's fields for the writer's formatter; only render the traceback here,
+        # while the exception is still alive
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    _listener = logging.handlers.QueueListener(_handler.queue, writer, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The writer thread does not survive fork(); give the child its own queue and thread
+    if _handler is not None:
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _start_listener()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()  # flushes what is still queued
+
+
+def setup_logging():
+    """Route the root logger through the background writer (idempotent)"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _handler.addFilter(RequestIdFilter())
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(LOG_LEVEL)
+        _start_listener()
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def get_request_logger(name):
+    """Logger for per-request hot-path events, sampled according to LOG_SAMPLE"""
+    logger = logging.getLogger(f'{name}.requests')
+    if SAMPLE_RATES and not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter(SAMPLE_RATES))
+    return logger
+
+
+def logging_stats():
+    return {
+        'format': LOG_FORMAT,
+        'level': LOG_LEVEL,
+        'sample_rates': SAMPLE_RATES,
+        'queued': _handler.queue.qsize() if _handler is not None else 0,
+        'dropped': _handler.dropped if _handler is not None else 0
+    }
+
+
+def install_request_ids(app):
+    """Bind each Flask request's X-Request-ID (or a new one) for logging and echo it back"""
+    from flask import g, request
+
+    @app.before_request
+    def bind_request():
+        g.request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+        g.request_id_token = bind_request_id(g.request_id)
+
+    @app.after_request
+    def echo_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    @app.teardown_request
+    def unbind_request(error=None):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            reset_request_id(token)
@@ -0,0 +1,17 @@
+"""
+Shared pytest setup for the AI services
+
+    cd ai-services && python -m pytest tests
+
+The services are flat modules next to this directory; tests import them directly.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests exercise the services in demo mode without a shared result cache
+os.environ.setdefault('AI_MODE', 'demo')
+os.environ.setdefault('RESULT_CACHE_SIZE', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
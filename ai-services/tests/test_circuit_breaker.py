@@ -0,0 +1,154 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+def make_breaker(**kwargs):
+    options = dict(failure_rate=0.5, min_calls=4, window_seconds=30, open_seconds=10, slow_call_ms=1000)
+    options.update(kwargs)
+    return CircuitBreaker('test', **options)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record(True, 5, breaker.allow())
+    assert breaker.state == OPEN
+
+
+def test_opens_once_the_failure_rate_is_reached_over_min_calls(clock):
+    breaker = make_breaker()
+    for failed in (True, False, True):
+        breaker.record(failed, 5, breaker.allow())
+    assert breaker.state == CLOSED  # below min_calls
+    breaker.record(False, 5, breaker.allow())
+    assert breaker.state == OPEN
+    assert breaker.stats()['times_opened'] == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = make_breaker(min_calls=2)
+    breaker.record_response(200, 5000, breaker.allow())
+    breaker.record_response(503, 5, breaker.allow())
+    assert breaker.state == OPEN
+
+
+def test_outcomes_outside_the_window_are_forgotten(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(True, 5, breaker.allow())
+    clock.advance(31)
+    breaker.record(True, 5, breaker.allow())
+    assert breaker.state == CLOSED
+    assert breaker.stats()['recent_calls'] == 1
+
+
+def test_rejects_while_open_then_lets_one_probe_through(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    assert not breaker.allow()
+    clock.advance(10)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # the single probe slot is taken
+    assert breaker.stats()['rejected'] == 2
+
+
+def test_probe_success_closes_the_circuit(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.advance(10)
+    breaker.record(False, 5, breaker.allow())
+    assert breaker.state == CLOSED
+    assert breaker.stats()['recent_calls'] == 0
+    assert breaker.allow()
+
+
+def test_probe_failure_reopens_the_circuit(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.advance(10)
+    breaker.record(True, 5, breaker.allow())
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_release_gives_the_probe_slot_back(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.advance(10)
+    permit = breaker.allow()
+    assert not breaker.allow()
+    breaker.release(permit)
+    assert breaker.allow()
+
+
+def test_slow_call_from_before_the_open_does_not_decide_the_probe(clock):
+    breaker = make_breaker()
+    slow = breaker.allow()  # admitted while closed, still in flight
+    trip(breaker)
+    clock.advance(10)
+    probe = breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+    breaker.record(False, 11_000, slow)  # finishes during half-open
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # the probe is still the one in flight
+    breaker.release(slow)
+    assert not breaker.allow()
+
+    breaker.record(True, 5, probe)
+    assert breaker.state == OPEN
+
+
+def test_stale_success_is_counted_but_does_not_close(clock):
+    breaker = make_breaker(slow_call_ms=60_000)
+    slow = breaker.allow()
+    trip(breaker)
+    clock.advance(10)
+    breaker.allow()
+    calls = breaker.stats()['calls']
+    breaker.record(False, 11_000, slow)
+    assert breaker.state == HALF_OPEN
+    assert breaker.stats()['calls'] == calls + 1
+
+
+def test_stale_failure_after_recovery_stays_out_of_the_window(clock):
+    breaker = make_breaker()
+    slow = breaker.allow()
+    trip(breaker)
+    clock.advance(10)
+    breaker.record(False, 5, breaker.allow())
+    assert breaker.state == CLOSED
+    breaker.record(True, 11_000, slow)
+    assert breaker.stats()['recent_calls'] == 0
+
+
+def test_outcomes_without_a_permit_apply_to_the_current_state(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.advance(10)
+    assert breaker.allow()
+    breaker.record(False, 5)
+    assert breaker.state == CLOSED
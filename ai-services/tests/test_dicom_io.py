@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from dicom_io import DEFAULT_WINDOWS, apply_window, data_range_window, is_dicom, window_pixels
+
+
+def per_pixel(pixels, slope=1.0, intercept=0.0, window=None, invert=False):
+    """window_pixels computed directly on a float32 copy of every pixel"""
+    values = pixels.astype(np.float32)
+    values *= np.float32(slope)
+    values += np.float32(intercept)
+    gray = apply_window(values, *(window or data_range_window(values)))
+    return 255 - gray if invert else gray
+
+
+def ct_frame(seed=0):
+    return np.random.default_rng(seed).integers(-1024, 3072, (64, 48)).astype(np.int16)
+
+
+@pytest.mark.parametrize('pixels', [
+    np.random.default_rng(1).integers(0, 4096, (64, 48)).astype(np.uint16),
+    np.random.default_rng(2).integers(0, 256, (64, 48)).astype(np.uint8),
+    ct_frame(),
+])
+@pytest.mark.parametrize('options', [
+    {},
+    {'window': (40.0, 400.0)},
+    {'slope': 2.0, 'intercept': -1024.0, 'window': (300.0, 1500.0)},
+    {'invert': True},
+])
+def test_lookup_matches_per_pixel_math(pixels, options):
+    gray = window_pixels(pixels, **options)
+    assert gray.dtype == np.uint8 and gray.shape == pixels.shape
+    assert np.array_equal(gray, per_pixel(pixels, **options))
+
+
+def test_float_pixels_take_the_copy_path():
+    pixels = np.linspace(-5.0, 5.0, 100).reshape(10, 10)
+    gray = window_pixels(pixels)
+    assert np.array_equal(gray, per_pixel(pixels))
+    assert np.all(np.diff(gray.ravel().astype(int)) >= 0) and gray[-1, -1] == 255
+
+
+def test_no_window_spans_the_frame_range():
+    pixels = np.array([[1000, 1500], [2000, 3000]], dtype=np.uint16)
+    gray = window_pixels(pixels)
+    assert gray.min() == 0 and gray.max() == 255
+
+
+def test_ct_soft_tissue_window():
+    center, width = DEFAULT_WINDOWS['CT']
+    pixels = np.array([[-1000, center - width / 2 - 1], [center, 3000]], dtype=np.int16)
+    gray = window_pixels(pixels, window=(center, width))
+    assert gray[0, 0] == gray[0, 1] == 0
+    assert gray[1, 1] == 255
+    assert abs(int(gray[1, 0]) - 128) <= 1
+
+
+def test_monochrome1_inverts():
+    pixels = ct_frame(3)
+    assert np.array_equal(window_pixels(pixels, invert=True), 255 - window_pixels(pixels))
+
+
+def test_input_pixels_are_left_untouched():
+    pixels = ct_frame(4)
+    original = pixels.copy()
+    window_pixels(pixels, slope=2.0, intercept=-1024.0, window=(40.0, 400.0), invert=True)
+    assert np.array_equal(pixels, original)
+
+
+def test_is_dicom_checks_the_preamble_magic():
+    assert is_dicom(b'\0' * 128 + b'DICM' + b'rest')
+    assert not is_dicom(b'\x89PNG\r\n\x1a\n' + b'\0' * 200)
+    assert not is_dicom(b'DICM')
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import image_features
+from image_features import extract_features, extract_features_batch
+
+
+def baseline_features(gray):
+    """The per-feature formulas the servers used before the shared kernel"""
+    gradient = np.gradient(gray.astype(float))[0]
+    hist, _ = np.histogram(gray, bins=256, range=(0, 256))
+    pixels = gray.reshape(-1).tolist()
+    avg = sum(pixels) / len(pixels)
+    quartiles = [0] * 4
+    for p in pixels[::20]:
+        quartiles[min(3, int(p / 64))] += 1
+    return {
+        'brightness': float(np.mean(gray)),
+        'contrast': float(np.std(gray)),
+        'entropy': float(-np.sum(np.histogram(gray, bins=256)[0] * np.log2(np.histogram(gray, bins=256)[0] + 1e-10))),
+        'edges': float(np.mean(np.abs(gradient))),
+        'texture': float(np.std(gradient)),
+        'hist_peak': float(np.argmax(hist)),
+        'hist_spread': float(np.std(np.where(hist > 0)[0])),
+        'sample_variance': sum((p - avg) ** 2 for p in pixels[:2000]) / 2000,
+        'quartile_histogram': quartiles
+    }
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_baseline_formulas_exactly(seed, monkeypatch):
+    monkeypatch.setattr(image_features, 'FEATURE_DTYPE', np.dtype(np.float64))
+    rng = np.random.default_rng(seed)
+    height, width = rng.integers(2, 200, 2)
+    gray = rng.integers(0, 256, (height, width), dtype=np.uint8)
+    if seed % 3 == 0:
+        gray //= np.uint8(rng.integers(2, 40))  # Narrow value range
+    features = extract_features(gray)
+    for key, value in baseline_features(gray).items():
+        assert features[key] == value, key
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_float32_stays_within_float32_precision(seed, monkeypatch):
+    monkeypatch.setattr(image_features, 'FEATURE_DTYPE', np.dtype(np.float32))
+    gray = np.random.default_rng(seed).integers(0, 256, (512, 384), dtype=np.uint8)
+    features = extract_features(gray)
+    for key, value in baseline_features(gray).items():
+        assert features[key] == pytest.approx(value, rel=1e-5), key
+
+
+def test_stack_gives_one_dict_per_slice():
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 256, (3, 32, 48), dtype=np.uint8)
+    assert extract_features(stack) == [extract_features(stack[i]) for i in range(3)]
+
+
+def test_batch_keeps_input_order_across_sizes():
+    rng = np.random.default_rng(1)
+    grays = [rng.integers(0, 256, shape, dtype=np.uint8) for shape in [(16, 16), (24, 8), (16, 16), (5, 9)]]
+    assert extract_features_batch(grays) == [extract_features(gray) for gray in grays]
+
+
+def test_gradients_false_skips_edge_statistics():
+    features = extract_features(np.full((8, 8), 7, dtype=np.uint8), gradients=False)
+    assert 'edges' not in features and 'texture' not in features
+    assert features['brightness'] == 7.0
+
+
+def test_rejects_non_uint8_and_too_short_images():
+    with pytest.raises(ValueError):
+        extract_features(np.zeros((8, 8), dtype=np.float32))
+    with pytest.raises(ValueError):
+        extract_features(np.zeros((1, 8), dtype=np.uint8))
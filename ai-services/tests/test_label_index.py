@@ -0,0 +1,55 @@
+import zlib
+
+import numpy as np
+
+import label_index
+from label_index import LabelIndex, build_index, label_prompts, normalize
+
+
+def fake_encoder(prompts):
+    """Deterministic per-prompt vectors standing in for the text encoder"""
+    return np.stack([np.random.default_rng(zlib.crc32(p.encode())).standard_normal(8) for p in prompts])
+
+
+def test_build_then_load_serves_memory_mapped_rows(tmp_path):
+    path = str(tmp_path / 'labels')
+    build_index(fake_encoder, path)
+    index = LabelIndex.load(path)
+    assert isinstance(index.matrix, np.memmap)
+
+    labels, rows = index.lookup('XR')
+    assert labels == label_index.MODALITY_LABELS['XR']
+    np.testing.assert_array_equal(rows, normalize(fake_encoder(label_prompts('XR'))))
+
+    # Unknown modalities use the default vocabulary
+    labels, rows = index.lookup('NM')
+    assert labels == label_index.DEFAULT_LABELS and len(rows) == len(labels)
+
+
+def test_changed_labels_are_not_served_from_a_stale_index_until_rebuilt(tmp_path, monkeypatch):
+    path = str(tmp_path / 'labels')
+    build_index(fake_encoder, path)
+    monkeypatch.setitem(label_index.MODALITY_LABELS, 'XR', ['normal', 'pneumothorax'])
+
+    index = LabelIndex.load(path)
+    assert index.lookup('XR') is None  # Caller computes XR embeddings in-process instead
+    assert index.lookup('CT') is not None  # Unchanged vocabularies still come from the index
+
+    build_index(fake_encoder, path)
+    labels, rows = LabelIndex.load(path).lookup('XR')
+    assert labels == ['normal', 'pneumothorax']
+    np.testing.assert_array_equal(rows, normalize(fake_encoder(label_prompts('XR'))))
+
+
+def test_index_for_another_model_or_prompt_is_ignored(tmp_path, monkeypatch):
+    path = str(tmp_path / 'labels')
+    build_index(fake_encoder, path, model_id='other/model')
+    assert LabelIndex.load(path) is None
+
+    build_index(fake_encoder, path)
+    monkeypatch.setattr(label_index, 'PROMPT_TEMPLATE', 'a {modality_name} with {label}')
+    assert LabelIndex.load(path) is None
+
+
+def test_missing_index_loads_as_none(tmp_path):
+    assert LabelIndex.load(str(tmp_path / 'absent')) is None
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class Recorder:
+    """batch_fn that records every batch it is handed"""
+
+    def __init__(self, fn=lambda item: item * 10):
+        self.batches = []
+        self.fn = fn
+        self.lock = threading.Lock()
+
+    def __call__(self, items):
+        with self.lock:
+            self.batches.append(list(items))
+        return [self.fn(item) for item in items]
+
+
+def test_full_batch_flushes_without_waiting_out_the_window():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=4, max_wait_ms=10_000)
+    started = time.monotonic()
+    futures = [batcher.submit(n) for n in range(4)]
+    assert [future.result(timeout=5) for future in futures] == [0, 10, 20, 30]
+    assert time.monotonic() - started < 5
+    assert recorder.batches == [[0, 1, 2, 3]]
+
+
+def test_partial_batch_flushes_when_the_wait_expires():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=64, max_wait_ms=50)
+    started = time.monotonic()
+    assert batcher.run(7, timeout=5) == 70
+    elapsed = time.monotonic() - started
+    assert 0.04 <= elapsed < 5
+    assert recorder.batches == [[7]]
+    assert batcher.stats()['last_batch_size'] == 1
+
+
+def test_items_are_grouped_by_key_and_results_keep_their_order():
+    recorder = Recorder(fn=lambda item: item[1].upper())
+    batcher = MicroBatcher(recorder, max_batch_size=6, max_wait_ms=10_000, group_key=lambda item: item[0])
+    items = [('XR', 'a'), ('CT', 'b'), ('XR', 'c'), ('CT', 'd'), ('XR', 'e'), ('MR', 'f')]
+    futures = [batcher.submit(item) for item in items]
+    assert [future.result(timeout=5) for future in futures] == ['A', 'B', 'C', 'D', 'E', 'F']
+    assert sorted(recorder.batches) == sorted([[('XR', 'a'), ('XR', 'c'), ('XR', 'e')],
+                                               [('CT', 'b'), ('CT', 'd')], [('MR', 'f')]])
+
+
+def test_batch_errors_reach_every_caller_in_the_batch():
+    def fail(items):
+        raise ValueError('model failed')
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_wait_ms=10_000)
+    futures = [batcher.submit(n) for n in range(2)]
+    for future in futures:
+        with pytest.raises(ValueError, match='model failed'):
+            future.result(timeout=5)
+    # The worker keeps serving after a failed batch
+    batcher.batch_fn = Recorder()
+    batcher.max_wait_ms = 0
+    assert batcher.run(1, timeout=5) == 10
+
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=2, max_wait_ms=10_000)
+    futures = [batcher.submit(n) for n in range(2)]
+    with pytest.raises(RuntimeError, match='returned 1 results for 2 items'):
+        futures[0].result(timeout=5)
@@ -0,0 +1,105 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import preprocess
+from preprocess import PreparedImage, reduced_size, reduction_factor
+
+
+def encode(image, fmt, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def gradient_rgb(width, height):
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=-1).astype(np.uint8)
+    return Image.fromarray(pixels, 'RGB')
+
+
+@pytest.mark.parametrize('size, min_side, factor', [
+    ((2048, 1024), 512, 2),
+    ((4096, 3000), 512, 5),
+    ((300, 300), 512, 1),
+    ((2048, 2048), 0, 1),
+    ((2048, 2048), None, 1),
+])
+def test_reduction_factor_keeps_the_shorter_side(size, min_side, factor):
+    assert reduction_factor(size, min_side) == factor
+    if min_side:
+        assert min(reduced_size(size, factor)) >= min(min_side, min(size))
+
+
+def test_reduced_size_rounds_up_like_image_reduce():
+    image = Image.new('L', (1001, 333))
+    assert reduced_size(image.size, 4) == image.reduce(4).size == (251, 84)
+
+
+def test_levels_follow_the_requested_resolution(monkeypatch):
+    monkeypatch.setattr(preprocess, 'FEATURE_RESOLUTION', 256)
+    prepared = PreparedImage.from_bytes(encode(gradient_rgb(1024, 768), 'PNG'))
+    assert prepared.gray().shape == (256, 342)
+    assert prepared.rgb(224).size == (342, 256)
+    assert prepared.rgb().size == (1024, 768)
+
+
+def test_small_images_are_used_exactly_as_decoded():
+    image = gradient_rgb(200, 150)
+    prepared = PreparedImage.from_bytes(encode(image, 'PNG'))
+    assert np.array_equal(prepared.gray(), np.asarray(image.convert('L')))
+
+
+def test_levels_are_reduced_before_the_one_conversion():
+    image = gradient_rgb(1024, 1024)
+    prepared = PreparedImage.from_bytes(encode(image, 'PNG'))
+    expected = np.asarray(image.reduce(2).convert('L'))
+    assert np.array_equal(np.asarray(prepared.level(2, 'L')), expected)
+
+
+def test_levels_are_built_once_and_share_one_decode():
+    prepared = PreparedImage.from_bytes(encode(gradient_rgb(1024, 1024), 'PNG'))
+    gray = prepared.level(2, 'L')
+    assert prepared.level(2, 'L') is gray
+    prepared.level(4, 'RGB')
+    assert list(prepared._bases) == [(1, False)]
+
+
+def test_jpeg_decodes_straight_at_the_reduced_scale():
+    prepared = PreparedImage.from_bytes(encode(gradient_rgb(2048, 2048), 'JPEG', quality=90))
+    gray = prepared.level(4, 'L')
+    assert gray.size == (512, 512) and gray.mode == 'L'
+    assert list(prepared._bases) == [(4, True)]
+
+
+def test_jpeg_gray_draft_is_not_reused_for_rgb():
+    prepared = PreparedImage.from_bytes(encode(gradient_rgb(2048, 2048), 'JPEG', quality=90))
+    prepared.level(4, 'L')
+    rgb = prepared.level(4, 'RGB')
+    assert rgb.size == (512, 512) and rgb.mode == 'RGB'
+    assert (4, False) in prepared._bases
+
+
+def test_finer_level_redecodes_a_drafted_jpeg():
+    prepared = PreparedImage.from_bytes(encode(gradient_rgb(1024, 1024), 'JPEG', quality=90))
+    prepared.level(8, 'RGB')
+    assert prepared.level(2, 'RGB').size == (512, 512)
+    assert min(scale for scale, _ in prepared._bases) <= 2
+
+
+def test_16_bit_png_is_windowed_instead_of_clipped():
+    stored = np.linspace(1000, 5000, 64 * 64).reshape(64, 64).astype(np.uint16)
+    prepared = PreparedImage.from_bytes(encode(Image.fromarray(stored), 'PNG'))
+    gray = prepared.gray()
+    assert gray.dtype == np.uint8
+    assert gray.min() == 0 and gray.max() == 255
+    assert np.all(np.diff(gray.ravel().astype(int)) >= 0)  # monotonic, not saturated
+
+
+def test_features_are_computed_once():
+    prepared = PreparedImage.from_image(gradient_rgb(128, 128))
+    features = prepared.features()
+    assert prepared.features() is features
+    assert 'edges' in features
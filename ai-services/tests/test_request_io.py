@@ -0,0 +1,49 @@
+import base64
+import importlib
+
+import pytest
+
+from request_io import RequestError, decode_base64, image_from_json
+
+
+def test_decodes_str_and_bytes():
+    encoded = base64.b64encode(b'\x89PNG payload')
+    assert decode_base64(encoded) == b'\x89PNG payload'
+    assert decode_base64(encoded.decode('ascii')) == b'\x89PNG payload'
+
+
+@pytest.mark.parametrize('value', ['!!!!', '====', b'  \n'])
+def test_no_base64_characters_is_a_request_error(value):
+    with pytest.raises(RequestError, match='empty or invalid base64 image'):
+        decode_base64(value)
+
+
+@pytest.mark.parametrize('value', [123, ['aGk='], {'data': 'aGk='}])
+def test_non_string_values_are_request_errors(value):
+    with pytest.raises(RequestError, match='Expected a base64 string'):
+        decode_base64(value)
+
+
+@pytest.mark.parametrize('body, message', [
+    ([1], 'Expected a JSON object body'),
+    ({}, "Missing 'image' field"),
+    ({'image': '!!!!'}, 'empty or invalid base64 image'),
+    ({'image': 'abc'}, 'Invalid base64 image'),
+])
+def test_image_from_json_rejects_bad_bodies(body, message):
+    with pytest.raises(RequestError, match=message):
+        image_from_json(body)
+
+
+def test_image_from_json_returns_bytes_and_other_fields():
+    image_bytes, params = image_from_json({'image': 'aGVsbG8=', 'modality': 'CT', 'slice_index': 3})
+    assert image_bytes == b'hello'
+    assert params == {'modality': 'CT', 'slice_index': 3}
+
+
+@pytest.mark.parametrize('server, path', [('medsigclip_server', '/classify'), ('medgemma_server', '/generate-report')])
+def test_endpoints_answer_400_for_undecodable_base64(server, path):
+    app = importlib.import_module(server).app
+    response = app.test_client().post(path, json={'image': '!!!!', 'modality': 'XR'})
+    assert response.status_code == 400
+    assert 'base64' in response.get_json()['error']
@@ -0,0 +1,99 @@
+import os
+
+import result_cache
+from result_cache import ResultCache
+
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(directory) for name in files if name.endswith('.json'))
+
+
+def entry_size(tmp_path):
+    probe = ResultCache(max_entries=0, disk_dir=str(tmp_path / 'probe'))
+    probe.put('0' * 64, {'value': 'x' * 100})
+    return probe.stats()['disk_bytes']
+
+
+def key(n):
+    return f'{n:064x}'
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', {'n': 1})
+    cache.put('b', {'n': 2})
+    assert cache.get('a') == {'n': 1}  # 'a' becomes most recent
+    cache.put('c', {'n': 3})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'n': 1} and cache.get('c') == {'n': 3}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_hits_are_independent_copies():
+    cache = ResultCache(max_entries=4)
+    cache.put('a', {'labels': ['x']})
+    cache.get('a')['labels'].append('y')
+    assert cache.get('a') == {'labels': ['x']}
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    cache = ResultCache(max_entries=4, ttl_seconds=10)
+    cache.put('a', {'n': 1})
+    now[0] += 11
+    assert cache.get('a') is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    ResultCache(max_entries=4, disk_dir=str(tmp_path)).put(key(1), {'n': 1})
+    restarted = ResultCache(max_entries=4, disk_dir=str(tmp_path))
+    assert restarted.get(key(1)) == {'n': 1}
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_disk_tier_evicts_oldest_files_over_budget(tmp_path):
+    size = entry_size(tmp_path)
+    cache = ResultCache(max_entries=0, disk_dir=str(tmp_path / 'cache'), disk_max_bytes=5 * size)
+    for n in range(8):
+        cache.put(key(n), {'value': 'x' * 100})
+        os.utime(cache._path(key(n)), (n, n))  # Distinct mtimes, oldest first
+    assert disk_usage(tmp_path / 'cache') <= 5 * size
+    assert cache.stats()['disk_bytes'] == disk_usage(tmp_path / 'cache')
+    assert cache.get(key(7)) is not None
+    assert cache.get(key(0)) is None
+
+
+def test_shared_disk_tier_rescans_instead_of_trusting_a_stale_index(tmp_path):
+    # Two processes (e.g. gunicorn workers) sharing one directory, each seeing only its own writes
+    size = entry_size(tmp_path)
+    directory = str(tmp_path / 'shared')
+    first = ResultCache(max_entries=0, disk_dir=directory, disk_max_bytes=5 * size)
+    second = ResultCache(max_entries=0, disk_dir=directory, disk_max_bytes=5 * size)
+
+    mtime = 0
+    for cache, keys in ((first, range(0, 4)), (second, range(4, 10))):
+        for n in keys:
+            cache.put(key(n), {'value': 'x' * 100})
+            mtime += 1
+            os.utime(cache._path(key(n)), (mtime, mtime))
+
+    # second went over budget by its own count, saw first's files too and evicted the oldest
+    assert second.stats()['disk_rescans'] >= 1
+    assert disk_usage(directory) <= 5 * size * result_cache.DISK_LOW_WATER
+    assert second.stats()['disk_bytes'] == disk_usage(directory)
+    assert first.get(key(0)) is None  # Evicted by the other process: a clean miss
+    assert first.get(key(9)) == {'value': 'x' * 100}  # Written by the other process: a disk hit
+
+    # first's index still lists files second deleted; its next over-budget write resyncs it
+    for n in range(10, 13):
+        first.put(key(n), {'value': 'x' * 100})
+    assert first.stats()['disk_bytes'] == disk_usage(directory)
+    assert disk_usage(directory) <= 5 * size
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache(max_entries=0)
+    cache.put('a', {'n': 1})
+    assert not cache.enabled and cache.get('a') is None
@@ -0,0 +1,90 @@
+import base64
+import io
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import medgemma_server
+import medsigclip_server
+from series import SeriesSummary
+
+
+def png_b64(seed, size=48):
+    pixels = np.random.default_rng(seed).integers(0, 256, (size, size), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'L').save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def frames_body(count, **extra):
+    return {'frames': [{'image': png_b64(n), 'slice_index': n} for n in range(count)], 'modality': 'CT', **extra}
+
+
+@pytest.fixture
+def report_client():
+    return medgemma_server.app.test_client()
+
+
+def test_summary_counts_labels_and_abnormal_slices():
+    summary = SeriesSummary(normal_labels=('normal', 'clear'))
+    for slice_index, label, confidence in [(0, 'normal', 0.9), (1, 'mass', 0.7), (2, 'Clear', 0.8), (3, 'mass', 0.95)]:
+        summary.add(slice_index, label, confidence)
+    result = summary.to_dict()
+    assert result['overall'] == 'abnormal'
+    assert result['abnormal_slices'] == [1, 3] and result['normal_frames'] == 2
+    assert result['primary_finding'] == {'label': 'mass', 'confidence': 0.95, 'slice_index': 3}
+
+
+def test_unlabeled_series_is_summarized_from_its_own_reports(report_client):
+    response = report_client.post('/generate-report-series', json=frames_body(20))
+    assert response.status_code == 200
+    body = response.get_json()
+    findings = [frame['finding'] for frame in body['frames']]
+    abnormal = [frame['slice_index'] for frame in body['frames'] if frame['finding'] != 'normal']
+    assert abnormal, 'demo reports vary by slice; 20 slices include abnormal ones'
+    summary = body['summary']
+    assert summary['frames_analyzed'] == 20
+    assert summary['abnormal_slices'] == abnormal
+    assert summary['overall'] == 'abnormal'
+    assert sum(summary['label_counts'].values()) == len(findings)
+
+
+def test_supplied_classifications_still_drive_the_summary(report_client):
+    labels = ['normal'] * 4
+    body = report_client.post('/generate-report-series', json=frames_body(4, classifications=labels)).get_json()
+    assert body['summary']['overall'] == 'normal'
+    assert [frame['classification'] for frame in body['frames']] == labels
+
+
+def test_report_label_reads_real_model_impressions():
+    assert medgemma_server.report_label({'impression': 'No acute cardiopulmonary abnormality.'}) == 'normal'
+    assert medgemma_server.report_label({'impression': 'Right lower lobe consolidation.'}) == 'abnormal'
+    assert medgemma_server.report_label({'impression': 'Abnormal enhancement in the left lobe.'}) == 'abnormal'
+
+
+@pytest.mark.parametrize('extra', [
+    {'sample_rate': 'abc'},
+    {'sample_rate': [2]},
+    {'sample_rate': True},
+    {'classifications': 'normal'},
+    {'classifications': [5]},
+])
+@pytest.mark.parametrize('query', ['', '?stream=ndjson'])
+def test_bad_series_parameters_are_rejected_before_streaming(report_client, extra, query):
+    response = report_client.post(f'/generate-report-series{query}', json=frames_body(2, **extra))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_classify_series_rejects_bad_sample_rate():
+    client = medsigclip_server.app.test_client()
+    response = client.post('/classify-series?stream=ndjson', json=frames_body(2, sample_rate='abc'))
+    assert response.status_code == 400
+
+
+def test_numeric_string_sample_rate_is_accepted(report_client):
+    response = report_client.post('/generate-report-series?stream=ndjson', json=frames_body(4, sample_rate='2'))
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['data']['slice_index'] for record in records if record['type'] == 'frame'] == [0, 2]
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+class Gate:
+    """fn for the leader that blocks until every follower has joined"""
+
+    def __init__(self, flight, key, followers, result=None, error=None):
+        self.flight = flight
+        self.key = key
+        self.followers = followers
+        self.result = result
+        self.error = error
+        self.started = threading.Event()
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        while self.flight.stats()['coalesced'] < self.followers:
+            time.sleep(0.001)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run_concurrently(flight, gate, followers):
+    """Leader first, then followers once the leader is computing; returns every outcome"""
+    def call(fn):
+        try:
+            return flight.do(gate.key, fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=followers + 1) as pool:
+        leader = pool.submit(call, gate)
+        assert gate.started.wait(5)
+        rest = [pool.submit(call, lambda: pytest.fail('follower computed')) for _ in range(followers)]
+        return leader.result(timeout=5), [future.result(timeout=5) for future in rest]
+
+
+def test_concurrent_duplicates_share_one_call():
+    flight = SingleFlight()
+    gate = Gate(flight, 'k', followers=3, result={'finding': 'normal'})
+    leader, followers = run_concurrently(flight, gate, 3)
+    assert gate.calls == 1
+    assert leader == ({'finding': 'normal'}, False)
+    assert all(result == ({'finding': 'normal'}, True) for result in followers)
+    assert flight.stats() == {'enabled': True, 'in_flight': 0, 'leaders': 1, 'coalesced': 3}
+
+
+def test_followers_get_their_own_copy():
+    flight = SingleFlight()
+    gate = Gate(flight, 'k', followers=2, result={'labels': []})
+    leader, followers = run_concurrently(flight, gate, 2)
+    followers[0][0]['labels'].append('edited')
+    assert leader[0] == {'labels': []}
+    assert followers[1][0] == {'labels': []}
+
+
+def test_leader_error_reaches_every_follower():
+    flight = SingleFlight()
+    error = ValueError('upstream failed')
+    gate = Gate(flight, 'k', followers=3, error=error)
+    leader, followers = run_concurrently(flight, gate, 3)
+    assert leader is error
+    assert all(result is error for result in followers)
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_key_is_free_again_after_an_error():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do('k', lambda: {}['missing'])
+    assert flight.do('k', lambda: 42) == (42, False)
+    assert flight.stats()['leaders'] == 2
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
+    assert flight.stats()['coalesced'] == 0
+
+
+def test_disabled_always_computes():
+    flight = SingleFlight(enabled=False)
+    assert flight.do('k', lambda: 1) == (1, False)
+    assert flight.stats()['leaders'] == 0
+
+
+def test_async_followers_share_result_and_error():
+    flight = SingleFlight()
+
+    async def scenario(error):
+        release = asyncio.Event()
+
+        async def leader():
+            await release.wait()
+            if error is not None:
+                raise error
+            return {'ok': True}
+
+        async def follower():
+            raise AssertionError('follower computed')
+
+        tasks = [asyncio.ensure_future(flight.do_async('k', leader))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(flight.do_async('k', follower)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert asyncio.run(scenario(None)) == [({'ok': True}, False), ({'ok': True}, True), ({'ok': True}, True)]
+    error = RuntimeError('boom')
+    assert asyncio.run(scenario(error)) == [error, error, error]
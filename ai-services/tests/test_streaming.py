@@ -0,0 +1,63 @@
+import json
+
+from flask import Flask
+
+from structured_logging import bind_request_id, current_request_id, install_request_ids, reset_request_id
+from streaming import collect_records, stream_response
+
+
+def make_app(records_fn):
+    app = Flask(__name__)
+    install_request_ids(app)
+
+    @app.route('/stream')
+    def stream():
+        return stream_response(records_fn(), 'ndjson')
+
+    return app
+
+
+def read_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_generator_steps_see_the_request_id_after_it_is_unbound():
+    def records():
+        for n in range(3):
+            yield 'frame', {'n': n, 'request_id': current_request_id()}
+
+    app = Flask(__name__)
+    with app.test_request_context('/stream'):
+        token = bind_request_id('req-42')
+        response = stream_response(records(), 'ndjson')
+        reset_request_id(token)  # gone by the time the body is produced
+        lines = read_lines(response)
+    assert [line['data']['request_id'] for line in lines] == ['req-42'] * 3
+    assert current_request_id() is None
+
+
+def test_streamed_request_id_matches_the_response_header():
+    def records():
+        yield 'frame', {'request_id': current_request_id()}
+
+    response = make_app(records).test_client().get('/stream', headers={'X-Request-ID': 'req-7'})
+    assert response.headers['X-Request-ID'] == 'req-7'
+    assert read_lines(response)[0]['data']['request_id'] == 'req-7'
+
+
+def test_error_while_streaming_becomes_a_final_record():
+    def records():
+        yield 'frame', {'n': 0}
+        raise RuntimeError('decoder failed')
+
+    client = make_app(records).test_client()
+    lines = read_lines(client.get('/stream'))
+    assert lines == [
+        {'type': 'frame', 'data': {'n': 0}},
+        {'type': 'error', 'data': {'error': 'decoder failed'}}
+    ]
+
+
+def test_collect_records_gathers_items_next_to_the_summary():
+    records = [('frame', {'n': 0}), ('frame', {'n': 1}), ('summary', {'count': 2})]
+    assert collect_records(records) == {'frames': [{'n': 0}, {'n': 1}], 'count': 2}
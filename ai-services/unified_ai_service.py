@@ -0,0 +1,261 @@
+"""
+Unified AI Service - MedSigLIP classification and MedGemma reporting in one process
+/analyze decodes the image once and feeds the classification straight into the report stage
+"""
+
+from flask import Flask, jsonify
+from flask_cors import CORS
+import logging
+import time
+import os
+
+import medsigclip_server as medsigclip
+import medgemma_server as medgemma
+from preprocess import PreparedImage
+from request_io import RequestError, read_image_request
+from load_simulation import LoadSimulator
+from profiling_hook import RequestProfiler
+from metrics import instrument_app
+from structured_logging import get_request_logger, install_request_ids, setup_logging
+
+app = Flask(__name__)
+CORS(app)  # Enable CORS for all routes
+
+# JSON logs written by a background thread; hot-path request logs sampled (LOG_SAMPLE)
+setup_logging()
+install_request_ids(app)
+log = logging.getLogger('unified')
+request_log = get_request_logger('unified')
+
+# Configuration
+PORT = int(os.getenv('PORT', 5003))
+MODE = os.getenv('AI_MODE', 'demo')  # 'real', 'cloud', or 'demo'
+SERVICE_VERSION = '1.0.0-demo'
+
+# Per-stage latency, in-flight and fallback metrics on /metrics
+instrument_app(app, 'unified', MODE)
+
+# Optional injected latency/errors for capacity testing (LOAD_SIMULATION)
+LOAD_SIMULATOR = LoadSimulator.from_env()
+LOAD_SIMULATOR.install(app)
+
+# On-demand cProfile of single requests into a bounded ring (PROFILE_TOKEN)
+PROFILER = RequestProfiler.from_env('unified')
+PROFILER.install(app)
+
+# Compatibility routes: same handlers (and caches) as the standalone services
+COMPATIBILITY_ROUTES = [
+    ('/classify', medsigclip.classify),
+    ('/classify-batch', medsigclip.classify_batch),
+    ('/classify-series', medsigclip.classify_series),
+    ('/generate-report', medgemma.generate_report),
+    ('/generate-report/stream', medgemma.generate_report_stream),
+    ('/generate-report-series', medgemma.generate_report_series)
+]
+for rule, view in COMPATIBILITY_ROUTES:
+    app.add_url_rule(rule, endpoint=view.__name__, view_func=view, methods=['POST'])
+
+print(f"🚀 Starting Unified AI Service")
+print(f"   Mode: {MODE.upper()}")
+print(f"   Port: {PORT}")
+print(f"   Backends: classify {medsigclip.INFERENCE_BACKEND.upper()}, report {medgemma.INFERENCE_BACKEND.upper()}")
+
+
+class DecodedImage:
+    """One uploaded image, decoded and analyzed at most once for every stage that needs it"""
+
+    def __init__(self, image_bytes, frame_index, modality):
+        self.image_bytes = image_bytes
+        self.frame_index = frame_index
+        self.modality = modality
+        self.timings = {}
+        self._image = None
+        self._features = None
+
+    @property
+    def image(self):
+        """PreparedImage; pixel levels are decoded as the stages ask for them"""
+        if self._image is None:
+            start = time.time()
+            self._image = PreparedImage.from_bytes(self.image_bytes, self.frame_index, self.modality)
+            self.timings['decode'] = time.time() - start
+        return self._image
+
+    @property
+    def features(self):
+        if self._features is None:
+            image = self.image
+            start = time.time()
+            image.gray()
+            self.timings['decode'] += time.time() - start
+            start = time.time()
+            self._features = image.features()
+            self.timings['features'] = time.time() - start
+        return self._features
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'healthy',
+        'mode': MODE,
+        'services': {
+            'medsigclip': medsigclip.health().get_json(),
+            'medgemma': medgemma.health().get_json()
+        },
+        'profiling': PROFILER.stats(),
+        'load_simulation': LOAD_SIMULATOR.stats()
+    })
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until both services are loaded and warmed up"""
+    services = {
+        'medsigclip': medsigclip.READINESS.stats(),
+        'medgemma': medgemma.READINESS.stats()
+    }
+    is_ready = all(stats['ready'] for stats in services.values())
+    return jsonify({'ready': is_ready, 'services': services}), 200 if is_ready else 503
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    """Classify an image and generate its report in one request
+
+    Accepts the same bodies as /classify and /generate-report. The
+    classification and report are each served from (and stored in) the
+    same caches their standalone routes use.
+    """
+    try:
+        image_bytes, data = read_image_request()
+        modality = data.get('modality')
+        patient_context = data.get('patientContext', {})
+        slice_index = data.get('slice_index', 0)
+        frame_index = data.get('frame_index', 0)
+
+        request_log.info('analyze request', extra={'modality': modality, 'slice_index': slice_index})
+
+        start_time = time.time()
+        decoded = DecodedImage(image_bytes, frame_index, modality)
+
+        classification = classify_stage(decoded, modality or 'unknown', slice_index)
+        label = classification.get('classification')
+        report = report_stage(decoded, modality or 'XR', patient_context, label, slice_index)
+
+        processing_time = time.time() - start_time
+        request_log.info('analyze result', extra={'classification': label, 'processing_time': processing_time})
+
+        return jsonify({
+            'classification': classification,
+            'report': report,
+            'modality': modality,
+            'slice_index': slice_index,
+            'mode': MODE,
+            'processing_time': processing_time,
+            'timings': decoded.timings
+        })
+
+    except RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception('analyze failed')
+        return jsonify({'error': str(e)}), 500
+
+def shared_features(decoded):
+    """Features both demo stages read; real/cloud paths do not need them"""
+    return decoded.features if MODE == 'demo' else None
+
+def classify_stage(decoded, modality, slice_index):
+    """MedSigLIP result for the decoded image (cached like /classify)"""
+    start_time = time.time()
+    cache_key = medsigclip.make_cache_key(decoded.image_bytes, modality, slice_index, decoded.frame_index)
+    cached = medsigclip.RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        cached['processing_time'] = time.time() - start_time
+        cached['cached'] = True
+        return cached
+
+    def compute():
+        result = medsigclip.classify_image(
+            decoded.image, decoded.image_bytes, modality, slice_index, features=shared_features(decoded)
+        )
+        result['processing_time'] = time.time() - start_time
+        result['mode'] = MODE
+        medsigclip.cache_result(cache_key, result)
+        return result
+
+    # Shares in-flight work with identical /classify and /analyze requests
+    result, shared = medsigclip.CLASSIFY_FLIGHTS.do(cache_key, compute)
+    if shared:
+        result['processing_time'] = time.time() - start_time
+        result['coalesced'] = True
+    decoded.timings['classify'] = result['processing_time']
+    return result
+
+def report_stage(decoded, modality, patient_context, classification, slice_index):
+    """MedGemma report for the decoded image, conditioned on the classification (cached like /generate-report)"""
+    start_time = time.time()
+    cache_key = medgemma.make_cache_key(
+        decoded.image_bytes, modality, slice_index, classification, patient_context, decoded.frame_index
+    )
+    cached = medgemma.RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        cached['processing_time'] = time.time() - start_time
+        cached['cached'] = True
+        return cached
+
+    def compute():
+        result = medgemma.generate_report_for_image(
+            decoded.image, decoded.image_bytes, modality, patient_context, start_time,
+            classification, slice_index, features=shared_features(decoded)
+        )
+        # Only cache real reports in real/cloud mode, never their demo fallbacks
+        if MODE == 'demo' or not result.get('demo_mode'):
+            medgemma.RESULT_CACHE.put(cache_key, result)
+        return result
+
+    # Shares in-flight work with identical /generate-report and /analyze requests
+    result, shared = medgemma.REPORT_FLIGHTS.do(cache_key, compute)
+    if shared:
+        result['processing_time'] = time.time() - start_time
+        result['coalesced'] = True
+    decoded.timings['report'] = time.time() - start_time
+    return result
+
+@app.route('/', methods=['GET'])
+def index():
+    return jsonify({
+        'service': 'Unified AI Service (MedSigLIP + MedGemma)',
+        'version': SERVICE_VERSION,
+        'endpoints': {
+            '/health': 'GET - Check service health',
+            '/metrics': 'GET - Prometheus metrics',
+            '/ready': 'GET - Readiness and warm-up progress of both services (503 while warming)',
+            '/analyze': 'POST - Classify and generate a report in one request (base64 JSON, octet-stream or multipart)',
+            '/classify': 'POST - Compatibility route (MedSigLIP)',
+            '/classify-batch': 'POST - Compatibility route (MedSigLIP)',
+            '/classify-series': 'POST - Compatibility route (MedSigLIP)',
+            '/generate-report': 'POST - Compatibility route (MedGemma)',
+            '/generate-report/stream': 'POST - Compatibility route (MedGemma)',
+            '/generate-report-series': 'POST - Compatibility route (MedGemma)'
+        }
+    })
+
+def load_models():
+    """Load models the same way the standalone services do"""
+    medsigclip.load_models()
+    medgemma.load_models()
+
+def start_background_startup(load=True):
+    """Load and warm up both services in parallel on background threads"""
+    medsigclip.start_background_startup(load)
+    medgemma.start_background_startup(load)
+
+if __name__ == '__main__':
+    # Load in the background so the port is open (and /ready reports progress) right away
+    start_background_startup()
+
+    print(f"\n✅ Unified AI Service running on http://localhost:{PORT}")
+    print(f"   Mode: {MODE.upper()}")
+    print(f"   Test with: curl http://localhost:{PORT}/health\n")
+
+    app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
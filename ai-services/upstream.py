@@ -0,0 +1,145 @@
+"""
+Upstream HTTP - Pooled clients for the remote inference APIs
+One keep-alive requests.Session per process for the WSGI servers and one
+shared httpx.AsyncClient per event loop for the ASGI server
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import BreakerOpen
+from metrics import stage
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+HF_API_URL = 'https://api-inference.huggingface.co/models'
+
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 5))
+POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 32))                    # Sync keep-alive connections per host
+MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', 1000))      # Async in-flight connections
+MAX_KEEPALIVE = int(os.getenv('UPSTREAM_MAX_KEEPALIVE', 100))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_async_client = None
+
+
+def http_session():
+    """Process-wide keep-alive session (recreated after a fork)"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+def async_client():
+    """Shared pooled AsyncClient; create and use it from one event loop"""
+    global _async_client
+    if not HTTPX_AVAILABLE:
+        raise RuntimeError('httpx is required for the async server')
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            timeout=httpx.Timeout(60.0, connect=CONNECT_TIMEOUT)
+        )
+    return _async_client
+
+
+async def aclose():
+    """Close the shared AsyncClient (server shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+class UpstreamCall:
+    """One prepared POST to a remote API, sendable from sync or async code
+
+    Both send() and asend() return a response with status_code, json() and
+    text, so the same parse function handles either.
+    """
+
+    def __init__(self, url, timeout, headers=None, data=None, json=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.data = data
+        self.json = json
+
+    def send(self):
+        return http_session().post(
+            self.url,
+            headers=self.headers,
+            data=self.data,
+            json=self.json,
+            timeout=(CONNECT_TIMEOUT, self.timeout)
+        )
+
+    async def asend(self):
+        return await async_client().post(
+            self.url,
+            headers=self.headers,
+            content=self.data,
+            json=self.json,
+            timeout=httpx.Timeout(self.timeout, connect=CONNECT_TIMEOUT)
+        )
+
+
+def call_remote(build, parse, fallback, breaker=None):
+    """Build an UpstreamCall, send it and parse the response; fallback(error) on any exception
+
+    With a CircuitBreaker, an open circuit goes straight to the fallback
+    and every sent call's status and latency are recorded.
+    """
+    permit = breaker.allow() if breaker is not None else None
+    if breaker is not None and not permit:
+        return fallback(BreakerOpen(f"circuit '{breaker.name}' is open"))
+    try:
+        call = build()
+    except Exception as e:
+        if breaker is not None:
+            breaker.release(permit)
+        return fallback(e)
+
+    started = time.perf_counter()
+    try:
+        with stage('remote'):
+            response = call.send()
+    except Exception as e:
+        if breaker is not None:
+            breaker.record(True, elapsed_ms(started), permit)
+        return fallback(e)
+    if breaker is not None:
+        breaker.record_response(response.status_code, elapsed_ms(started), permit)
+
+    try:
+        return parse(response)
+    except Exception as e:
+        return fallback(e)
+
+
+def elapsed_ms(started):
+    return (time.perf_counter() - started) * 1000.0
+
+
+def hf_headers():
+    """Authorization header for the Hugging Face Inference API (none without a token)"""
+    token = os.getenv('HUGGINGFACE_TOKEN', '')
+    return {"Authorization": f"Bearer {token}"} if token else {}
@@ -85,7 +85,8 @@ class AIAnalysisOrchestrator {
           sex: metadata?.patientSex,
           clinicalHistory: metadata?.studyDescription
         },
-        studyInstanceUID
+        studyInstanceUID,
+        analysisId
       );
 
       // Check if AI services were actually used
@@ -395,14 +396,44 @@ class AIAnalysisOrchestrator {
     return await Study.findOne({ studyInstanceUID });
   }
 
+  /**
+   * Classify and report in one request via the unified AI service's /analyze
+   * Returns null (so the caller falls back to the two separate services)
+   * when AI_UNIFIED_URL is not set or the call fails
+   */
+  async callUnifiedAnalyze(imageBase64, modality, patientContext, requestId) {
+    const unifiedUrl = process.env.AI_UNIFIED_URL;
+    if (!unifiedUrl) {
+      return null;
+    }
+
+    const axios = require('axios');
+    try {
+      console.log(`🧠 Calling unified AI service: ${unifiedUrl}/analyze`);
+      const response = await axios.post(`${unifiedUrl}/analyze`, {
+        image: imageBase64,
+        modality: modality,
+        patientContext: patientContext
+      }, { timeout: 60000, headers: { 'X-Request-ID': requestId } });
+
+      console.log(`✅ Unified analysis: ${response.data.classification?.classification} + report`);
+      return response.data;
+    } catch (unifiedError) {
+      console.error(`❌ Unified AI service failed: ${unifiedError.message}`);
+      return null;
+    }
+  }
+
   /**
    * Call both AI models together for integrated analysis
    * This ensures MedSigLIP and MedGemma work together for 100% accuracy
+   * requestId is sent as X-Request-ID so the AI services' logs correlate with ours
    */
-  async callBothAIModelsIntegrated(imageBuffer, modality, patientContext, studyUID) {
+  async callBothAIModelsIntegrated(imageBuffer, modality, patientContext, studyUID, requestId = uuidv4()) {
     const axios = require('axios');
+    const requestHeaders = { 'X-Request-ID': requestId };
 
-    console.log('🤖 Calling BOTH AI models for integrated analysis...');
+    console.log(`🤖 Calling BOTH AI models for integrated analysis (request ${requestId})...`);
     console.log(`   MedSigLIP: http://localhost:5001/classify`);
     console.log(`   MedGemma: http://localhost:5002/generate-report`);
 
@@ -413,40 +444,49 @@ class AIAnalysisOrchestrator {
     try {
       const imageBase64 = imageBuffer.toString('base64');
 
-      // Step 1: Call MedSigLIP for classification
-      try {
-        console.log('📊 Calling MedSigLIP...');
-        const classificationResponse = await axios.post('http://localhost:5001/classify', {
-          image: imageBase64,
-          modality: modality
-        }, { timeout: 30000 });
-
-        classificationData = classificationResponse.data;
-        servicesUsed.push('MedSigLIP');
-        console.log(`✅ MedSigLIP: ${classificationData.classification} (${(classificationData.confidence * 100).toFixed(1)}%)`);
-      } catch (medsiglipError) {
-        console.error(`❌ MedSigLIP failed: ${medsiglipError.message}`);
-        if (medsiglipError.code === 'ECONNREFUSED') {
-          console.error('   → MedSigLIP service not running on port 5001');
+      // Step 0: One round-trip to the unified service when configured
+      // (decodes the image once and feeds the classification into the report)
+      const unifiedData = await this.callUnifiedAnalyze(imageBase64, modality, patientContext, requestId);
+      if (unifiedData) {
+        classificationData = unifiedData.classification;
+        reportData = unifiedData.report;
+        servicesUsed.push('MedSigLIP', 'MedGemma');
+      } else {
+        // Step 1: Call MedSigLIP for classification
+        try {
+          console.log('📊 Calling MedSigLIP...');
+          const classificationResponse = await axios.post('http://localhost:5001/classify', {
+            image: imageBase64,
+            modality: modality
+          }, { timeout: 30000, headers: requestHeaders });
+
+          classificationData = classificationResponse.data;
+          servicesUsed.push('MedSigLIP');
+          console.log(`✅ MedSigLIP: ${classificationData.classification} (${(classificationData.confidence * 100).toFixed(1)}%)`);
+        } catch (medsiglipError) {
+          console.error(`❌ MedSigLIP failed: ${medsiglipError.message}`);
+          if (medsiglipError.code === 'ECONNREFUSED') {
+            console.error('   → MedSigLIP service not running on port 5001');
+          }
         }
-      }
 
-      // Step 2: Call MedGemma for report
-      try {
-        console.log('📝 Calling MedGemma...');
-        const reportResponse = await axios.post('http://localhost:5002/generate-report', {
-          image: imageBase64,
-          modality: modality,
-          patientContext: patientContext
-        }, { timeout: 60000 });
-
-        reportData = reportResponse.data;
-        servicesUsed.push('MedGemma');
-        console.log(`✅ MedGemma: Report generated`);
-      } catch (medgemmaError) {
-        console.error(`❌ MedGemma failed: ${medgemmaError.message}`);
-        if (medgemmaError.code === 'ECONNREFUSED') {
-          console.error('   → MedGemma service not running on port 5002');
+        // Step 2: Call MedGemma for report
+        try {
+          console.log('📝 Calling MedGemma...');
+          const reportResponse = await axios.post('http://localhost:5002/generate-report', {
+            image: imageBase64,
+            modality: modality,
+            patientContext: patientContext
+          }, { timeout: 60000, headers: requestHeaders });
+
+          reportData = reportResponse.data;
+          servicesUsed.push('MedGemma');
+          console.log(`✅ MedGemma: Report generated`);
+        } catch (medgemmaError) {
+          console.error(`❌ MedGemma failed: ${medgemmaError.message}`);
+          if (medgemmaError.code === 'ECONNREFUSED') {
+            console.error('   → MedGemma service not running on port 5002');
+          }
         }
       }
 